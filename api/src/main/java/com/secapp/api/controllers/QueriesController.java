@@ -1,11 +1,24 @@
 package com.secapp.api.controllers;
 
+import com.secapp.api.dto.BatchQueryRequest;
+import com.secapp.api.dto.JobStatus;
 import com.secapp.api.dto.QueryRequest;
 import com.secapp.api.dto.WorkerResponse;
+import com.secapp.api.services.JobService;
+import com.secapp.api.services.QueryJob;
 import com.secapp.api.services.QueriesService;
 import jakarta.validation.Valid;
+import org.springframework.http.HttpStatus;
+import org.springframework.http.MediaType;
 import org.springframework.http.ResponseEntity;
 import org.springframework.web.bind.annotation.*;
+import org.springframework.web.servlet.mvc.method.annotation.SseEmitter;
+
+import java.util.Map;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.RejectedExecutionException;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.TimeoutException;
 
 @RestController
 @RequestMapping("/queries")
@@ -13,9 +26,11 @@ import org.springframework.web.bind.annotation.*;
 public class QueriesController {
 
   private final QueriesService service;
+  private final JobService jobs;
 
-  public QueriesController(QueriesService service) {
+  public QueriesController(QueriesService service, JobService jobs) {
     this.service = service;
+    this.jobs = jobs;
   }
 
   @GetMapping("/health")
@@ -23,10 +38,81 @@ public class QueriesController {
     return "OK";
   }
 
+  /** Blocking variant kept for existing clients; still goes through the bounded job queue. */
   @PostMapping
-  public ResponseEntity<WorkerResponse> create(@Valid @RequestBody QueryRequest req) {
+  public ResponseEntity<WorkerResponse> create(@Valid @RequestBody QueryRequest req)
+      throws InterruptedException, ExecutionException {
     System.out.println("Received POST /queries with prompt: " + req.getPrompt()); // Add this line
-    WorkerResponse resp = service.runPrompt(req);
-    return ResponseEntity.ok(resp);
+    QueryJob job = jobs.submit(req.getPrompt());
+    try {
+      return ResponseEntity.ok(job.getDone().get(7, TimeUnit.MINUTES));
+    } catch (TimeoutException e) {
+      jobs.cancel(job.getId());
+      return ResponseEntity.ok(service.error("Worker timed out"));
+    }
+  }
+
+  /**
+   * Streaming variant of POST /queries: queues a job and pushes its events as Server-Sent Events
+   * ("job" with the id first, then stage/citations/token/retry, ending with "result").
+   */
+  @PostMapping(path = "/stream", produces = MediaType.TEXT_EVENT_STREAM_VALUE)
+  public SseEmitter stream(@Valid @RequestBody QueryRequest req) {
+    System.out.println("Received POST /queries/stream with prompt: " + req.getPrompt());
+    return jobs.subscribe(jobs.submit(req.getPrompt()));
+  }
+
+  /**
+   * Many prompts answered by one worker, which ingests the filings they share once and retrieves
+   * for all of them together. Streams Server-Sent Events: "job", stage events, one "item" per prompt
+   * as it completes, then "result" with every item in prompt order. Also pollable via /jobs/{id}.
+   */
+  @PostMapping(path = "/batch", produces = MediaType.TEXT_EVENT_STREAM_VALUE)
+  public SseEmitter batch(@Valid @RequestBody BatchQueryRequest req) {
+    System.out.println("Received POST /queries/batch with " + req.getPrompts().size() + " prompts");
+    return jobs.subscribe(jobs.submitBatch(req.getPrompts()));
+  }
+
+  /** Queues a query and returns its job id straight away. */
+  @PostMapping("/jobs")
+  public ResponseEntity<JobStatus> submitJob(@Valid @RequestBody QueryRequest req) {
+    System.out.println("Received POST /queries/jobs with prompt: " + req.getPrompt());
+    QueryJob job = jobs.submit(req.getPrompt());
+    return ResponseEntity.status(HttpStatus.ACCEPTED).body(job.toStatus());
+  }
+
+  @GetMapping("/jobs/{id}")
+  public ResponseEntity<JobStatus> getJob(@PathVariable String id) {
+    return jobs.get(id)
+        .map(job -> ResponseEntity.ok(job.toStatus()))
+        .orElse(ResponseEntity.notFound().build());
+  }
+
+  @GetMapping(path = "/jobs/{id}/events", produces = MediaType.TEXT_EVENT_STREAM_VALUE)
+  public ResponseEntity<SseEmitter> jobEvents(@PathVariable String id) {
+    return jobs.get(id)
+        .map(job -> ResponseEntity.ok(jobs.subscribe(job)))
+        .orElse(ResponseEntity.notFound().build());
+  }
+
+  /** Cancels a queued or running job and kills its worker process. */
+  @DeleteMapping("/jobs/{id}")
+  public ResponseEntity<JobStatus> cancelJob(@PathVariable String id) {
+    if (jobs.get(id).isEmpty()) return ResponseEntity.notFound().build();
+    if (!jobs.cancel(id)) return ResponseEntity.status(HttpStatus.CONFLICT).body(jobs.get(id).get().toStatus());
+    return ResponseEntity.ok(jobs.get(id).get().toStatus());
+  }
+
+  @GetMapping("/jobs/stats")
+  public Map<String, Object> jobStats() {
+    return Map.of("running", jobs.runningCount(), "queued", jobs.queuedCount(), "prefetch", jobs.prefetchStats());
+  }
+
+  /** Queue full: tell the client to back off instead of starting yet another worker. */
+  @ExceptionHandler(RejectedExecutionException.class)
+  public ResponseEntity<WorkerResponse> queueFull(RejectedExecutionException e) {
+    return ResponseEntity.status(HttpStatus.TOO_MANY_REQUESTS)
+        .header("Retry-After", "30")
+        .body(service.error("Too many queries in progress, please retry shortly"));
   }
 }
@@ -0,0 +1,16 @@
+package com.secapp.api.dto;
+
+import jakarta.validation.constraints.NotBlank;
+import jakarta.validation.constraints.NotEmpty;
+import jakarta.validation.constraints.Size;
+
+import java.util.List;
+
+public class BatchQueryRequest {
+  @NotEmpty
+  @Size(max = 500)
+  private List<@NotBlank @Size(min = 2, max = 500) String> prompts;
+
+  public List<String> getPrompts() { return prompts; }
+  public void setPrompts(List<String> prompts) { this.prompts = prompts; }
+}
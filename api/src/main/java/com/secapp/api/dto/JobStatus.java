@@ -0,0 +1,25 @@
+package com.secapp.api.dto;
+
+import java.time.Instant;
+
+public class JobStatus {
+  private String jobId;
+  private String status;
+  private Instant createdAt;
+  private Instant startedAt;
+  private Instant finishedAt;
+  private WorkerResponse result;
+
+  public String getJobId() { return jobId; }
+  public void setJobId(String jobId) { this.jobId = jobId; }
+  public String getStatus() { return status; }
+  public void setStatus(String status) { this.status = status; }
+  public Instant getCreatedAt() { return createdAt; }
+  public void setCreatedAt(Instant createdAt) { this.createdAt = createdAt; }
+  public Instant getStartedAt() { return startedAt; }
+  public void setStartedAt(Instant startedAt) { this.startedAt = startedAt; }
+  public Instant getFinishedAt() { return finishedAt; }
+  public void setFinishedAt(Instant finishedAt) { this.finishedAt = finishedAt; }
+  public WorkerResponse getResult() { return result; }
+  public void setResult(WorkerResponse result) { this.result = result; }
+}
@@ -1,12 +1,22 @@
 package com.secapp.api.dto;
 
+import com.fasterxml.jackson.annotation.JsonIgnoreProperties;
+import com.fasterxml.jackson.annotation.JsonInclude;
+
 import java.util.List;
+import java.util.Map;
 
+@JsonIgnoreProperties(ignoreUnknown = true) // stream-mode result lines also carry "event"
 public class WorkerResponse {
   private boolean ok;
   private String answer;
   private List<String> citations;
   private String error;
+  // per-stage timing summary from the worker: {"total_ms": .., "stages": {name: {count, ms, max_ms, bytes, nodes, *_tokens}}}
+  private Map<String, Object> timings;
+  // batch runs only (run_batch.py): one {index, prompt, ok, answer, citations, passing | error} per prompt
+  @JsonInclude(JsonInclude.Include.NON_NULL)
+  private List<Map<String, Object>> items;
 
   public boolean isOk() { return ok; }
   public void setOk(boolean ok) { this.ok = ok; }
@@ -16,4 +26,8 @@ public class WorkerResponse {
   public void setCitations(List<String> citations) { this.citations = citations; }
   public String getError() { return error; }
   public void setError(String error) { this.error = error; }
+  public Map<String, Object> getTimings() { return timings; }
+  public void setTimings(Map<String, Object> timings) { this.timings = timings; }
+  public List<Map<String, Object>> getItems() { return items; }
+  public void setItems(List<Map<String, Object>> items) { this.items = items; }
 }
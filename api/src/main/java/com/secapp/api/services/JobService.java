@@ -0,0 +1,275 @@
+package com.secapp.api.services;
+
+import com.fasterxml.jackson.core.JsonProcessingException;
+import com.fasterxml.jackson.databind.JsonNode;
+import com.fasterxml.jackson.databind.ObjectMapper;
+import com.secapp.api.dto.WorkerResponse;
+import io.micrometer.core.instrument.Gauge;
+import jakarta.annotation.PreDestroy;
+import org.springframework.beans.factory.annotation.Value;
+import org.springframework.stereotype.Service;
+import org.springframework.web.servlet.mvc.method.annotation.SseEmitter;
+
+import java.io.BufferedReader;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.nio.charset.StandardCharsets;
+import java.time.Duration;
+import java.time.Instant;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Locale;
+import java.util.Map;
+import java.util.Optional;
+import java.util.concurrent.*;
+
+/**
+ * Runs worker queries as jobs on a bounded pool: at most {@code worker.max-concurrency}
+ * python processes at once and at most {@code worker.queue-capacity} jobs waiting.
+ * Submissions beyond that are rejected so the controller can answer 429 instead of piling up.
+ * Identical prompts (after normalization) submitted while one is in flight attach to that job
+ * instead of starting another worker.
+ *
+ * <p>With {@code worker.prefetch.enabled}, an idle pool (nothing running or queued for
+ * {@code worker.prefetch.idle-seconds}) is used to drain the worker's speculative prefetch queue,
+ * and any new submission makes that run stop after its current filing.
+ */
+@Service
+public class JobService {
+
+  private final QueriesService queries;
+  private final WorkerMetrics metrics;
+  private final ObjectMapper mapper = new ObjectMapper();
+  private final ThreadPoolExecutor executor;
+  private final ScheduledExecutorService scheduler = Executors.newSingleThreadScheduledExecutor();
+  private final Map<String, QueryJob> jobs = new ConcurrentHashMap<>();
+  // normalized prompt -> job still queued or running for it
+  private final Map<String, QueryJob> inFlight = new ConcurrentHashMap<>();
+  private final Duration timeout;
+  private final Duration batchTimeout;
+  private final Duration retention;
+  private final boolean prefetchEnabled;
+  private final int prefetchBudget;
+  private final Duration prefetchIdle;
+  private volatile Process prefetch;              // running prefetch.py, if any
+  private volatile JsonNode lastPrefetch;         // summary line of the last finished prefetch run
+  private volatile Instant lastSubmit = Instant.now();
+
+  public JobService(QueriesService queries,
+                    WorkerMetrics metrics,
+                    @Value("${worker.max-concurrency:2}") int maxConcurrency,
+                    @Value("${worker.queue-capacity:16}") int queueCapacity,
+                    @Value("${worker.timeout-minutes:6}") long timeoutMinutes,
+                    @Value("${worker.batch-timeout-minutes:60}") long batchTimeoutMinutes,
+                    @Value("${worker.job-retention-minutes:60}") long retentionMinutes,
+                    @Value("${worker.prefetch.enabled:false}") boolean prefetchEnabled,
+                    @Value("${worker.prefetch.budget:4}") int prefetchBudget,
+                    @Value("${worker.prefetch.idle-seconds:30}") long prefetchIdleSeconds) {
+    this.queries = queries;
+    this.metrics = metrics;
+    this.timeout = Duration.ofMinutes(timeoutMinutes);
+    this.batchTimeout = Duration.ofMinutes(batchTimeoutMinutes);
+    this.retention = Duration.ofMinutes(retentionMinutes);
+    this.prefetchEnabled = prefetchEnabled;
+    this.prefetchBudget = prefetchBudget;
+    this.prefetchIdle = Duration.ofSeconds(prefetchIdleSeconds);
+    this.executor = new ThreadPoolExecutor(
+        maxConcurrency, maxConcurrency, 0L, TimeUnit.MILLISECONDS,
+        new ArrayBlockingQueue<>(queueCapacity),
+        new ThreadPoolExecutor.AbortPolicy());
+    Gauge.builder("worker.jobs.running", executor, ThreadPoolExecutor::getActiveCount).register(metrics.getRegistry());
+    Gauge.builder("worker.jobs.queued", executor, e -> e.getQueue().size()).register(metrics.getRegistry());
+    // drop finished jobs once nobody is likely to poll them any more
+    scheduler.scheduleAtFixedRate(this::evictFinished, 1, 1, TimeUnit.MINUTES);
+    if (prefetchEnabled) {
+      scheduler.scheduleWithFixedDelay(this::maybePrefetch, prefetchIdleSeconds, prefetchIdleSeconds, TimeUnit.SECONDS);
+    }
+  }
+
+  /**
+   * Queues a job, or joins the in-flight job for the same normalized prompt.
+   * Throws RejectedExecutionException when a new job is needed and the queue is full.
+   */
+  public QueryJob submit(String prompt) {
+    lastSubmit = Instant.now();
+    yieldPrefetch();
+    String key = normalize(prompt);
+    while (true) {
+      QueryJob existing = inFlight.get(key);
+      if (existing != null) {
+        if (existing.join()) {
+          System.out.println("[jobs] coalesced prompt onto job " + existing.getId());
+          return existing;
+        }
+        inFlight.remove(key, existing); // finished between lookup and join
+        continue;
+      }
+      QueryJob job = new QueryJob(prompt);
+      if (inFlight.putIfAbsent(key, job) != null) continue; // lost the race, join the winner
+      jobs.put(job.getId(), job);
+      job.getDone().whenComplete((r, err) -> inFlight.remove(key, job));
+      try {
+        job.setFuture(executor.submit(() -> execute(job)));
+      } catch (RejectedExecutionException e) {
+        inFlight.remove(key, job);
+        jobs.remove(job.getId());
+        throw e;
+      }
+      return job;
+    }
+  }
+
+  /**
+   * Queues a batch of prompts as one job (one worker for all of them, see QueriesService.runBatch).
+   * Batches are not coalesced. Throws RejectedExecutionException when the queue is full.
+   */
+  public QueryJob submitBatch(List<String> prompts) {
+    lastSubmit = Instant.now();
+    yieldPrefetch();
+    QueryJob job = new QueryJob(prompts);
+    jobs.put(job.getId(), job);
+    try {
+      job.setFuture(executor.submit(() -> execute(job)));
+    } catch (RejectedExecutionException e) {
+      jobs.remove(job.getId());
+      throw e;
+    }
+    return job;
+  }
+
+  static String normalize(String prompt) {
+    return prompt.trim().toLowerCase(Locale.ROOT).replaceAll("\\s+", " ");
+  }
+
+  public Optional<QueryJob> get(String id) {
+    return Optional.ofNullable(jobs.get(id));
+  }
+
+  /**
+   * Cancels a queued or running job, killing its worker process. A coalesced job is only
+   * stopped once every request attached to it has cancelled. Returns false if it had already finished.
+   */
+  public boolean cancel(String id) {
+    QueryJob job = jobs.get(id);
+    if (job == null || job.isTerminal()) return false;
+    if (job.leave() > 0) return true; // others still waiting on it
+    return stop(job, QueryJob.Status.CANCELLED, "Job cancelled");
+  }
+
+  public SseEmitter subscribe(QueryJob job) {
+    SseEmitter emitter = new SseEmitter(timeoutFor(job).plusMinutes(1).toMillis());
+    job.subscribe(emitter);
+    return emitter;
+  }
+
+  public int queuedCount() { return executor.getQueue().size(); }
+  public int runningCount() { return executor.getActiveCount(); }
+
+  public Map<String, Object> prefetchStats() {
+    Map<String, Object> stats = new LinkedHashMap<>();
+    stats.put("enabled", prefetchEnabled);
+    Process p = prefetch;
+    stats.put("running", p != null && p.isAlive());
+    stats.put("last", lastPrefetch); // includes hit_rate as reported by prefetch.py
+    return stats;
+  }
+
+  /** Starts a prefetch run if the pool has been idle long enough and none is running. */
+  private void maybePrefetch() {
+    Process running = prefetch;
+    if (running != null && running.isAlive()) return;
+    if (runningCount() > 0 || queuedCount() > 0) return;
+    if (Instant.now().isBefore(lastSubmit.plus(prefetchIdle))) return;
+    try {
+      Process p = queries.startPrefetch(prefetchBudget);
+      prefetch = p;
+      Thread reader = new Thread(() -> collectPrefetch(p));
+      reader.setDaemon(true);
+      reader.start();
+    } catch (IOException e) {
+      System.out.println("[prefetch] could not start: " + e.getMessage());
+    }
+  }
+
+  private void collectPrefetch(Process p) {
+    String last = null;
+    try (BufferedReader br = new BufferedReader(new InputStreamReader(p.getInputStream(), StandardCharsets.UTF_8))) {
+      String line;
+      while ((line = br.readLine()) != null) {
+        if (!line.isBlank()) last = line.trim();
+      }
+      if (!p.waitFor(timeout.toMillis(), TimeUnit.MILLISECONDS)) p.destroyForcibly();
+      if (last != null) {
+        lastPrefetch = mapper.readTree(last);
+        System.out.println("[prefetch] finished: " + last);
+      }
+    } catch (Exception e) {
+      System.out.println("[prefetch] failed: " + e.getMessage());
+      p.destroyForcibly();
+    }
+  }
+
+  /** Interactive work arrived: ask a running prefetch to stop after its current filing. */
+  private void yieldPrefetch() {
+    Process p = prefetch;
+    if (p != null && p.isAlive()) {
+      System.out.println("[prefetch] yielding to interactive work");
+      p.destroy(); // SIGTERM, handled by prefetch.py
+    }
+  }
+
+  private void execute(QueryJob job) {
+    if (!job.markRunning()) return; // cancelled while queued
+    Instant started = Instant.now();
+    ScheduledFuture<?> watchdog = scheduler.schedule(
+        () -> stop(job, QueryJob.Status.FAILED, "Worker timed out"), timeoutFor(job).toMillis(), TimeUnit.MILLISECONDS);
+    try {
+      QueriesService.WorkerListener listener = new QueriesService.WorkerListener() {
+        @Override public void onStart(Process process) { job.attach(process); }
+        @Override public void onEvent(String event, String json) { job.publish(event, json); }
+      };
+      WorkerResponse r = job.isBatch()
+          ? queries.runBatch(job.getBatch(), listener)
+          : queries.runStreaming(job.getPrompt(), listener);
+      job.finish(r.isOk() ? QueryJob.Status.SUCCEEDED : QueryJob.Status.FAILED, r, toJson(r));
+      metrics.recordTimings(r.getTimings());
+    } finally {
+      watchdog.cancel(false);
+      metrics.recordJob(job.getStatus().name().toLowerCase(Locale.ROOT), Duration.between(started, Instant.now()));
+    }
+  }
+
+  private Duration timeoutFor(QueryJob job) {
+    return job.isBatch() ? batchTimeout : timeout;
+  }
+
+  private boolean stop(QueryJob job, QueryJob.Status status, String message) {
+    WorkerResponse r = queries.error(message);
+    if (!job.finish(status, r, toJson(r))) return false;
+    Future<?> f = job.getFuture();
+    if (f instanceof Runnable queued) executor.remove(queued); // frees the queue slot if it never started
+    return true;
+  }
+
+  private void evictFinished() {
+    Instant cutoff = Instant.now().minus(retention);
+    jobs.values().removeIf(j -> j.isTerminal() && j.getFinishedAt() != null && j.getFinishedAt().isBefore(cutoff));
+  }
+
+  private String toJson(WorkerResponse r) {
+    try {
+      return mapper.writeValueAsString(r);
+    } catch (JsonProcessingException e) {
+      return "{\"ok\":false,\"error\":\"unserializable result\"}";
+    }
+  }
+
+  @PreDestroy
+  public void shutdown() {
+    jobs.values().forEach(j -> stop(j, QueryJob.Status.CANCELLED, "Server shutting down"));
+    Process p = prefetch;
+    if (p != null) p.destroyForcibly();
+    executor.shutdownNow();
+    scheduler.shutdownNow();
+  }
+}
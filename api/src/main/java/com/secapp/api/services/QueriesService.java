@@ -2,13 +2,13 @@ package com.secapp.api.services;
 
 import com.fasterxml.jackson.databind.JsonNode;
 import com.fasterxml.jackson.databind.ObjectMapper;
-import com.secapp.api.dto.QueryRequest;
 import com.secapp.api.dto.WorkerResponse;
 import org.springframework.stereotype.Service;
 
 import java.io.BufferedReader;
 import java.io.IOException;
 import java.io.InputStreamReader;
+import java.io.OutputStream;
 import java.nio.charset.StandardCharsets;
 import java.nio.file.Files;
 import java.nio.file.Path;
@@ -21,90 +21,154 @@ import java.util.List;
 public class QueriesService {
   private final ObjectMapper mapper = new ObjectMapper();
 
-  public WorkerResponse runPrompt(QueryRequest req) {
-      try {
-          Path apiDir = Paths.get("").toAbsolutePath();                 // .../SECapp/api
-          Path workerDir = apiDir.getParent().resolve("worker_py");     // .../SECapp/worker_py
-
-          Path venvPy = workerDir.resolve(".venv/bin/python");
-          String python = Files.isExecutable(venvPy) ? venvPy.toString() : "python3";
-
-          List<String> cmd = new ArrayList<>();
-          cmd.add(python);
-          cmd.add("app/run_query.py");
-          cmd.add("--prompt");
-          cmd.add(req.getPrompt());
-
-          System.out.println("[worker] Running: " + String.join(" ", cmd));
-          ProcessBuilder pb = new ProcessBuilder(cmd);
-          pb.directory(workerDir.toFile());
-          pb.redirectErrorStream(false); // keep stdout (JSON) separate from stderr (logs)
-
-          Process p = pb.start();
-
-          // Drain stderr (logs) in background so the process can't block
-          Thread errThread = new Thread(() -> {
-              try (BufferedReader er = new BufferedReader(
-                      new InputStreamReader(p.getErrorStream(), StandardCharsets.UTF_8))) {
-                  String line;
-                  while ((line = er.readLine()) != null) {
-                      System.out.println("[worker stderr] " + line);
-                  }
-              } catch (IOException ignored) {}
-          });
-          errThread.setDaemon(true);
-          errThread.start();
+  private static final Duration WORKER_TIMEOUT = Duration.ofMinutes(6);
+
+  /** Callbacks for a running worker: the process handle once started, then each JSON-lines event. */
+  public interface WorkerListener {
+      void onStart(Process process);
+      void onEvent(String event, String json);
+  }
+
+  /**
+   * Runs the worker in --stream mode, passing every JSON line it prints to the listener
+   * (event name taken from the line's "event" field). The final "result" line is parsed
+   * and returned instead of forwarded. Blocks until the worker closes stdout (normally on exit).
+   */
+  public WorkerResponse runStreaming(String prompt, WorkerListener listener) {
+      return stream(() -> startWorker(prompt, "--stream"), listener);
+  }
+
+  /**
+   * Runs a batch of prompts in one worker (app/run_batch.py). The prompts go to its stdin as a
+   * JSON list; each prompt's answer arrives as an "item" event as soon as it is done, and the
+   * returned result carries all of them in prompt order.
+   */
+  public WorkerResponse runBatch(List<String> prompts, WorkerListener listener) {
+      return stream(() -> {
+          Process p = startScript("app/run_batch.py", List.of("--stream"));
+          try (OutputStream in = p.getOutputStream()) {
+              in.write(mapper.writeValueAsBytes(prompts));
+          } catch (IOException e) {
+              p.destroyForcibly();
+              throw e;
+          }
+          return p;
+      }, listener);
+  }
 
-          // Read ONLY stdout (should be a single JSON object)
-          String out;
+  private interface WorkerStarter {
+      Process start() throws IOException;
+  }
+
+  private WorkerResponse stream(WorkerStarter starter, WorkerListener listener) {
+      Process p = null;
+      try {
+          p = starter.start();
+          listener.onStart(p);
+          WorkerResponse result = null;
           try (BufferedReader br = new BufferedReader(
                   new InputStreamReader(p.getInputStream(), StandardCharsets.UTF_8))) {
-              StringBuilder sb = new StringBuilder();
               String line;
-              while ((line = br.readLine()) != null) sb.append(line);
-              out = sb.toString();
+              while ((line = br.readLine()) != null) {
+                  String trimmed = line.trim();
+                  if (trimmed.isEmpty()) continue;
+                  JsonNode node;
+                  try {
+                      node = mapper.readTree(trimmed);
+                  } catch (IOException notJson) {
+                      continue; // stray non-JSON output, skip it
+                  }
+                  String event = node.hasNonNull("event") ? node.get("event").asText() : "result";
+                  if ("result".equals(event)) {
+                      result = mapper.treeToValue(node, WorkerResponse.class);
+                  } else {
+                      listener.onEvent(event, trimmed);
+                  }
+              }
           }
-
-          boolean finished = p.waitFor(Duration.ofMinutes(6).toMillis(),
+          if (result != null && p.isAlive()) {
+              // the worker detached stdout after the result to run sampled faithfulness
+              // audits (run_query.py --audit-rate); don't hold the answer for them
+              reapLater(p);
+              return result;
+          }
+          boolean finished = p.waitFor(WORKER_TIMEOUT.toMillis(),
                   java.util.concurrent.TimeUnit.MILLISECONDS);
-          int exitCode = p.exitValue();
-          System.out.println("[worker] Python exited with code: " + exitCode);
-
           if (!finished) {
               p.destroyForcibly();
               return error("Worker timed out");
           }
-
-          String trimmed = out.trim();
-          if (trimmed.isEmpty()) return error("Worker returned empty output");
-
-          System.out.println("[worker stdout] " +
-                  (trimmed.length() > 400 ? trimmed.substring(0, 400) + "..." : trimmed));
-
-          char first = trimmed.charAt(0);
-          if (first == '{') {
-              return mapper.readValue(trimmed, WorkerResponse.class);
-          } else if (first == '[') {
-              // Fallback: if the worker ever prints an array, wrap as citations
-              JsonNode arr = mapper.readTree(trimmed);
-              WorkerResponse r = new WorkerResponse();
-              r.setOk(true);
-              if (arr.isArray()) {
-                  List<String> cites = new ArrayList<>();
-                  for (JsonNode n : arr) if (n.isTextual()) cites.add(n.asText());
-                  r.setCitations(cites.isEmpty() ? null : cites);
-              }
-              return r;
-          } else {
-              return error("Worker did not return JSON (starts with: " + first + ")");
-          }
+          System.out.println("[worker] Python exited with code: " + p.exitValue());
+          return result != null ? result : error("Worker returned empty output");
       } catch (Exception e) {
+          // don't leave the python process behind
+          if (p != null) p.destroyForcibly();
           e.printStackTrace();
           return error("Worker failed: " + e.getMessage());
       }
   }
 
-  private WorkerResponse error(String msg) {
+  private void reapLater(Process p) {
+      p.onExit()
+              .orTimeout(WORKER_TIMEOUT.toMillis(), java.util.concurrent.TimeUnit.MILLISECONDS)
+              .whenComplete((proc, err) -> {
+                  if (err != null) {
+                      p.destroyForcibly();
+                  } else {
+                      System.out.println("[worker] Python exited with code: " + proc.exitValue() + " (after result)");
+                  }
+              });
+  }
+
+  private Process startWorker(String prompt, String... extraArgs) throws IOException {
+      List<String> args = new ArrayList<>(List.of("--prompt", prompt));
+      args.addAll(List.of(extraArgs));
+      return startScript("app/run_query.py", args);
+  }
+
+  /**
+   * Starts a prefetch run (worker_py/app/prefetch.py) that ingests up to {@code budget} queued
+   * filings. It prints one JSON summary line on stdout and stops early on SIGTERM (Process.destroy()).
+   */
+  public Process startPrefetch(int budget) throws IOException {
+      return startScript("app/prefetch.py", List.of("--budget", String.valueOf(budget)));
+  }
+
+  private Process startScript(String script, List<String> args) throws IOException {
+      Path apiDir = Paths.get("").toAbsolutePath();                 // .../SECapp/api
+      Path workerDir = apiDir.getParent().resolve("worker_py");     // .../SECapp/worker_py
+
+      Path venvPy = workerDir.resolve(".venv/bin/python");
+      String python = Files.isExecutable(venvPy) ? venvPy.toString() : "python3";
+
+      List<String> cmd = new ArrayList<>();
+      cmd.add(python);
+      cmd.add(script);
+      cmd.addAll(args);
+
+      System.out.println("[worker] Running: " + String.join(" ", cmd));
+      ProcessBuilder pb = new ProcessBuilder(cmd);
+      pb.directory(workerDir.toFile());
+      pb.redirectErrorStream(false); // keep stdout (JSON) separate from stderr (logs)
+
+      Process p = pb.start();
+
+      // Drain stderr (logs) in background so the process can't block
+      Thread errThread = new Thread(() -> {
+          try (BufferedReader er = new BufferedReader(
+                  new InputStreamReader(p.getErrorStream(), StandardCharsets.UTF_8))) {
+              String line;
+              while ((line = er.readLine()) != null) {
+                  System.out.println("[worker stderr] " + line);
+              }
+          } catch (IOException ignored) {}
+      });
+      errThread.setDaemon(true);
+      errThread.start();
+      return p;
+  }
+
+  public WorkerResponse error(String msg) {
     WorkerResponse r = new WorkerResponse();
     r.setOk(false);
     r.setError(msg);
@@ -0,0 +1,154 @@
+package com.secapp.api.services;
+
+import com.secapp.api.dto.JobStatus;
+import com.secapp.api.dto.WorkerResponse;
+import org.springframework.web.servlet.mvc.method.annotation.SseEmitter;
+
+import java.io.IOException;
+import java.time.Instant;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.UUID;
+import java.util.concurrent.CompletableFuture;
+import java.util.concurrent.Future;
+
+/**
+ * One queued/running worker invocation. Keeps the events the worker has emitted so
+ * late SSE subscribers get a full replay, plus the process handle for cancellation.
+ */
+public class QueryJob {
+
+  public enum Status { QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED }
+
+  private final String id = UUID.randomUUID().toString();
+  private final String prompt;
+  private final List<String> batch; // null for a single prompt
+  private final Instant createdAt = Instant.now();
+  private final CompletableFuture<WorkerResponse> done = new CompletableFuture<>();
+
+  private Status status = Status.QUEUED;
+  private Instant startedAt;
+  private Instant finishedAt;
+  private WorkerResponse result;
+  private Process process;
+  private Future<?> future;
+  // requests attached to this job (> 1 when identical prompts were coalesced)
+  private int attached = 1;
+
+  // (event name, json data) in emission order, for replay
+  private final List<String[]> events = new ArrayList<>();
+  private final List<SseEmitter> subscribers = new ArrayList<>();
+
+  QueryJob(String prompt) {
+    this.prompt = prompt;
+    this.batch = null;
+  }
+
+  /** A batch job: all prompts answered by one worker (POST /queries/batch). */
+  QueryJob(List<String> prompts) {
+    this.prompt = "batch of " + prompts.size() + " prompts";
+    this.batch = List.copyOf(prompts);
+  }
+
+  public String getId() { return id; }
+  public String getPrompt() { return prompt; }
+  public List<String> getBatch() { return batch; }
+  public boolean isBatch() { return batch != null; }
+  public CompletableFuture<WorkerResponse> getDone() { return done; }
+
+  public synchronized Status getStatus() { return status; }
+  public synchronized Instant getFinishedAt() { return finishedAt; }
+
+  public synchronized boolean isTerminal() {
+    return status != Status.QUEUED && status != Status.RUNNING;
+  }
+
+  /** Attaches another request to this job; false if it already finished. */
+  synchronized boolean join() {
+    if (isTerminal()) return false;
+    attached++;
+    return true;
+  }
+
+  /** Detaches one request; returns how many are still attached. */
+  synchronized int leave() {
+    return --attached;
+  }
+
+  synchronized void setFuture(Future<?> future) { this.future = future; }
+  synchronized Future<?> getFuture() { return future; }
+
+  /** Moves QUEUED -> RUNNING; false if the job was cancelled while it waited. */
+  synchronized boolean markRunning() {
+    if (status != Status.QUEUED) return false;
+    status = Status.RUNNING;
+    startedAt = Instant.now();
+    publish("status", "{\"status\":\"RUNNING\"}");
+    return true;
+  }
+
+  /** Called once the worker process exists; kills it straight away if we were cancelled meanwhile. */
+  synchronized void attach(Process p) {
+    this.process = p;
+    if (isTerminal()) p.destroyForcibly();
+  }
+
+  synchronized void publish(String event, String json) {
+    events.add(new String[]{event, json});
+    subscribers.removeIf(emitter -> !send(emitter, event, json));
+  }
+
+  /** Records the final state (first call wins), kills the worker if still alive and closes subscribers. */
+  synchronized boolean finish(Status finalStatus, WorkerResponse response, String resultJson) {
+    if (isTerminal()) return false;
+    status = finalStatus;
+    result = response;
+    finishedAt = Instant.now();
+    if (process != null && process.isAlive()) process.destroyForcibly();
+    publish("result", resultJson);
+    List<SseEmitter> open = new ArrayList<>(subscribers);
+    subscribers.clear();
+    open.forEach(SseEmitter::complete);
+    done.complete(response);
+    return true;
+  }
+
+  /** Replays everything emitted so far, then keeps the emitter for live events unless the job is over. */
+  synchronized void subscribe(SseEmitter emitter) {
+    send(emitter, "job", "{\"jobId\":\"" + id + "\"}");
+    for (String[] e : events) {
+      if (!send(emitter, e[0], e[1])) return;
+    }
+    if (isTerminal()) {
+      emitter.complete();
+    } else {
+      subscribers.add(emitter);
+      emitter.onCompletion(() -> unsubscribe(emitter));
+      emitter.onTimeout(() -> unsubscribe(emitter));
+    }
+  }
+
+  private synchronized void unsubscribe(SseEmitter emitter) {
+    subscribers.remove(emitter);
+  }
+
+  private static boolean send(SseEmitter emitter, String event, String json) {
+    try {
+      emitter.send(SseEmitter.event().name(event).data(json));
+      return true;
+    } catch (IOException | IllegalStateException gone) {
+      return false; // client disconnected; the job keeps running
+    }
+  }
+
+  public synchronized JobStatus toStatus() {
+    JobStatus s = new JobStatus();
+    s.setJobId(id);
+    s.setStatus(status.name());
+    s.setCreatedAt(createdAt);
+    s.setStartedAt(startedAt);
+    s.setFinishedAt(finishedAt);
+    s.setResult(result);
+    return s;
+  }
+}
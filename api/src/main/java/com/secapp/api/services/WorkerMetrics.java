@@ -0,0 +1,83 @@
+package com.secapp.api.services;
+
+import io.micrometer.core.instrument.DistributionSummary;
+import io.micrometer.core.instrument.MeterRegistry;
+import io.micrometer.core.instrument.Timer;
+import org.springframework.stereotype.Component;
+
+import java.time.Duration;
+import java.util.Map;
+import java.util.concurrent.TimeUnit;
+
+/**
+ * Turns the worker's per-query timing summary into Micrometer histograms
+ * (exported at /actuator/prometheus):
+ *   worker_stage_duration_seconds{stage}      time a query spent in each stage
+ *   worker_stage_bytes{stage}                 bytes downloaded/decoded per stage
+ *   worker_stage_nodes{stage}                 nodes built/embedded/retrieved per stage
+ *   worker_stage_tokens{stage,kind}           prompt/completion/embedding tokens per stage
+ *   worker_job_duration_seconds{status}       end-to-end job time, queue wait excluded
+ */
+@Component
+public class WorkerMetrics {
+
+  private static final Map<String, String> TOKEN_KINDS = Map.of(
+      "prompt_tokens", "prompt", "completion_tokens", "completion", "embedding_tokens", "embedding");
+
+  private final MeterRegistry registry;
+
+  public WorkerMetrics(MeterRegistry registry) {
+    this.registry = registry;
+  }
+
+  public MeterRegistry getRegistry() { return registry; }
+
+  public void recordJob(String status, Duration duration) {
+    Timer.builder("worker.job.duration")
+        .tag("status", status)
+        .publishPercentileHistogram()
+        .register(registry)
+        .record(duration);
+  }
+
+  /** Records the "stages" of a worker result's timings; a missing or malformed summary is ignored. */
+  @SuppressWarnings("unchecked")
+  public void recordTimings(Map<String, Object> timings) {
+    if (timings == null || !(timings.get("stages") instanceof Map<?, ?> stages)) return;
+    for (Map.Entry<?, ?> e : stages.entrySet()) {
+      if (!(e.getValue() instanceof Map<?, ?> raw)) continue;
+      String stage = String.valueOf(e.getKey());
+      Map<String, Object> stats = (Map<String, Object>) raw;
+
+      if (stats.get("ms") instanceof Number ms) {
+        Timer.builder("worker.stage.duration")
+            .tag("stage", stage)
+            .publishPercentileHistogram()
+            .register(registry)
+            .record((long) (ms.doubleValue() * 1000), TimeUnit.MICROSECONDS);
+      }
+      if (stats.get("bytes") instanceof Number bytes) {
+        summary("worker.stage.bytes", "bytes", stage).record(bytes.doubleValue());
+      }
+      if (stats.get("nodes") instanceof Number nodes) {
+        summary("worker.stage.nodes", null, stage).record(nodes.doubleValue());
+      }
+      for (Map.Entry<String, String> kind : TOKEN_KINDS.entrySet()) {
+        if (stats.get(kind.getKey()) instanceof Number tokens) {
+          DistributionSummary.builder("worker.stage.tokens")
+              .tag("stage", stage)
+              .tag("kind", kind.getValue())
+              .publishPercentileHistogram()
+              .register(registry)
+              .record(tokens.doubleValue());
+        }
+      }
+    }
+  }
+
+  private DistributionSummary summary(String name, String unit, String stage) {
+    DistributionSummary.Builder b = DistributionSummary.builder(name).tag("stage", stage).publishPercentileHistogram();
+    if (unit != null) b.baseUnit(unit);
+    return b.register(registry);
+  }
+}
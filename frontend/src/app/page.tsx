@@ -8,14 +8,58 @@ type WorkerResponse = {
   error?: string | null;
 };
 
+type StreamEvent = {
+  event: 'job' | 'status' | 'stage' | 'citations' | 'token' | 'retry' | 'result';
+  jobId?: string;
+  stage?: string;
+  ticker?: string;
+  citations?: string[];
+  text?: string;
+} & Partial<WorkerResponse>;
+
 const BASE = process.env.NEXT_PUBLIC_API_URL ?? 'http://localhost:8080';
 
+const STAGE_LABELS: Record<string, string> = {
+  extracting: 'Reading your question…',
+  cache_hit: 'Found a recent answer…',
+  ingesting: 'Fetching filings…',
+  retrieving: 'Searching filings…',
+  summarizing: 'Writing answer…',
+  evaluating: 'Checking answer against sources…',
+};
+
+// Parses a text/event-stream body (POST, so EventSource can't be used) and
+// calls onEvent with each decoded JSON payload.
+async function readEventStream(res: Response, onEvent: (e: StreamEvent) => void) {
+  const reader = res.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.search(/\r?\n\r?\n/)) >= 0) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep).replace(/^\r?\n\r?\n/, '');
+      const data = frame
+        .split(/\r?\n/)
+        .filter((l) => l.startsWith('data:'))
+        .map((l) => l.slice(5).replace(/^ /, ''))
+        .join('\n');
+      if (data) onEvent(JSON.parse(data) as StreamEvent);
+    }
+  }
+}
+
 export default function Home() {
   const [prompt, setPrompt] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [data, setData] = useState<WorkerResponse | null>(null);
   const [health, setHealth] = useState<string>('checking…');
+  const [stage, setStage] = useState<string | null>(null);
+  const [jobId, setJobId] = useState<string | null>(null);
 
   useEffect(() => {
     (async () => {
@@ -34,32 +78,66 @@ export default function Home() {
     setLoading(true);
     setError(null);
     setData(null);
+    setStage(null);
     try {
-      const res = await fetch(`${BASE}/queries`, {
+      const res = await fetch(`${BASE}/queries/stream`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream, application/json' },
         body: JSON.stringify({ prompt }),
       });
-
-      // handle non-JSON errors gracefully
-      let json: WorkerResponse | { error?: string };
-      try {
-        json = await res.json();
-      } catch {
-        throw new Error(`API returned ${res.status}, and the body wasn’t JSON`);
+      if (res.status === 429) {
+        throw new Error('The server is busy with other queries, please try again in a moment');
       }
-
-      if (!res.ok || !(json as WorkerResponse).ok) {
-        throw new Error((json as any)?.error || `API error (${res.status})`);
+      if (!res.ok || !res.body) {
+        throw new Error(`API error (${res.status})`);
       }
-      setData(json as WorkerResponse);
+
+      let finished = false;
+      await readEventStream(res, (ev) => {
+        switch (ev.event) {
+          case 'job':
+            setJobId(ev.jobId ?? null);
+            setStage('Waiting for a free worker…');
+            break;
+          case 'status':
+            setStage('Starting…');
+            break;
+          case 'stage':
+            setStage(ev.ticker ? `${STAGE_LABELS[ev.stage!] ?? ev.stage} (${ev.ticker})` : STAGE_LABELS[ev.stage!] ?? ev.stage!);
+            break;
+          case 'citations':
+            setData((d) => ({ ok: true, answer: d?.answer ?? '', citations: ev.citations ?? [] }));
+            break;
+          case 'token':
+            setData((d) => ({ ok: true, answer: (d?.answer ?? '') + (ev.text ?? ''), citations: d?.citations ?? null }));
+            break;
+          case 'retry':
+            // the previous attempt failed the faithfulness check; its tokens are discarded
+            setData(null);
+            break;
+          case 'result':
+            finished = true;
+            if (!ev.ok) throw new Error(ev.error || 'Worker error');
+            setData({ ok: true, answer: ev.answer ?? null, citations: ev.citations ?? null });
+            break;
+        }
+      });
+      if (!finished) throw new Error('Stream ended before the answer was complete');
     } catch (e: any) {
       setError(e?.message || 'Request failed');
     } finally {
       setLoading(false);
+      setStage(null);
+      setJobId(null);
     }
   }
 
+  async function cancel() {
+    if (!jobId) return;
+    // the stream then ends with a "Job cancelled" result
+    await fetch(`${BASE}/queries/jobs/${jobId}`, { method: 'DELETE' }).catch(() => {});
+  }
+
   function onKeyDown(e: React.KeyboardEvent<HTMLTextAreaElement>) {
     if ((e.metaKey || e.ctrlKey) && e.key === 'Enter') {
       e.preventDefault();
@@ -94,6 +172,11 @@ export default function Home() {
           >
             {loading ? 'Asking…' : 'Ask (⌘/Ctrl+Enter)'}
           </button>
+          {loading && jobId && (
+            <button onClick={cancel} className="rounded border px-3 py-2 hover:bg-gray-50">
+              Cancel
+            </button>
+          )}
           <a
             href={`${BASE}/swagger-ui/index.html`}
             target="_blank"
@@ -104,6 +187,8 @@ export default function Home() {
         </div>
       </div>
 
+      {loading && stage && <p className="text-sm text-gray-600">{stage}</p>}
+
       {error && <p className="text-red-600">Error: {error}</p>}
 
       {data?.answer && (
@@ -1,21 +1,18 @@
 # FilingParserAgent.py
 
-import os
 import re
-import csv
-import chardet
-import pandas as pd
-from bs4 import BeautifulSoup
-from edgar import set_identity
+# chardet, bs4 and edgar are imported where they're used: only parsing needs them.
+# The coordinator imports this module only when it ingests a filing (PARSE_VERSION is in constants.py)
 
-from llama_index.core import Document, StorageContext, VectorStoreIndex, load_index_from_storage
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core.schema import TextNode
+from llama_index.core import Document
 
-import threading
+import time
 
-from llama_index.core.settings import Settings
+from tracing import span, tracer
+from clients import get_embed_model
+from table_chunker import TableNodeParser
+from table_format import table_cells, to_compact_markdown
+from stream_parser import parse_filing
 
 # Define financial keywords used to identify financial tables.
 FINANCIAL_KEYWORDS = [
@@ -25,26 +22,35 @@ FINANCIAL_KEYWORDS = [
     "number of shares", "tax rate", "gross margin", "cash equivalents", "depreciation", "amortization"
 ]
 
+# token budget per table chunk, repeated header rows included
+TABLE_CHUNK_TOKENS = 1024
+
 class FilingParserAgent:
-    def __init__(self, file_path, identity, download_folder="./10k10q", persist_dir="./store10k10q", storage_context=None, index=None):
+    def __init__(self, file_path, identity, download_folder="./10k10q", persist_dir="./store10k10q", storage_context=None, index=None,
+                 compact_tables=True, low_memory=False):
         """
         Initialize the agent with the path to a filing, EDGAR identity, and optional folders.
+        compact_tables=False renders tables cell-for-cell (to_markdown_from_table) instead of table_format's compact form.
+        low_memory=True parses with stream_parser (chunked, no BeautifulSoup tree) so peak memory stays
+        near the size of the parsed tables; sections then carry no raw HTML.
         """
         self.file_path = file_path
         print(f"Processing file: {self.file_path}")
         self.download_folder = download_folder
         self.persist_dir = persist_dir
         # Set the EDGAR identity
+        from edgar import set_identity
         set_identity(identity)
         # Placeholders for parsed sections and documents
         self.sections = {}
         self.narrative_documents = []
         self.table_documents = []
           # You may pass additional parameters if needed.
-        Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
-        self.embed_model = Settings.embed_model
+        self.embed_model = get_embed_model()
         self.storage_context = storage_context
         self.index = index
+        self.compact_tables = compact_tables
+        self.low_memory = low_memory
 
     # -------------------------------
     # Parsing Utilities
@@ -55,8 +61,8 @@ class FilingParserAgent:
             cols = row.find_all(['td', 'th'])
             current_row = []
             for col in cols:
-                # The fix: join stripped strings without extra spaces
-                text = ''.join(col.stripped_strings).replace('\xa0', ' ').strip()
+                # space-joined so words split across tags ("Total net" <br> "sales") stay apart
+                text = ' '.join(' '.join(col.stripped_strings).replace('\xa0', ' ').split())
                 current_row.append(text)
             rows.append(current_row)
         return rows
@@ -107,16 +113,9 @@ class FilingParserAgent:
     #fix method call here, maybe use static method, etc.
     def table_to_text(self, table, note=""):
         """Turn structured table into a readable text chunk."""
-        import pandas as pd
-        if isinstance(table, pd.DataFrame):
-            table_str = table.to_string(index=False)
-        elif isinstance(table, dict):  # convert dict to string
-            table_str = "\n".join([", ".join(map(str, row)) for row in table.get("rows", [])])
-        else:
-            table_str = str(table)
-
-        table_str = self.to_markdown_from_table(table)
-        return f"{table_str}" 
+        if self.compact_tables:
+            return to_compact_markdown(table)
+        return self.to_markdown_from_table([[c[0] if isinstance(c, tuple) else c for c in row] for row in table])
 
     # -------------------------------
     # Main Parsing Functionality
@@ -126,14 +125,21 @@ class FilingParserAgent:
         Parses the 10-K/10-Q filing (HTML file) into sections,
         extracting narrative text and financial tables.
         """
-        with open(self.file_path, "rb") as f:
-            raw = f.read()
-        print("FILE PATH")
-        print(self.file_path)
-        print("FILE")
-        print(raw[:100])
-        encoding = chardet.detect(raw)["encoding"] or "utf-8"
-        html = raw.decode(encoding, errors="replace")
+        if self.low_memory:
+            return self.parse_10k_financial_tables_streaming()
+        import chardet
+        from bs4 import BeautifulSoup
+        with span("decode") as s:
+            with open(self.file_path, "rb") as f:
+                raw = f.read()
+            print("FILE PATH")
+            print(self.file_path)
+            print("FILE")
+            print(raw[:100])
+            encoding = chardet.detect(raw)["encoding"] or "utf-8"
+            html = raw.decode(encoding, errors="replace")
+            s["bytes"] = len(raw)
+        parse_started = time.perf_counter()
         soup = BeautifulSoup(html, "html.parser")
 
         # New item pattern capturing trailing text (similar to bp.py)
@@ -172,6 +178,7 @@ class FilingParserAgent:
                             tables_by_note.append({
                                 "note_number": note_number,
                                 "parsed": parsed,
+                                "cells": table_cells(table),  # with colspans, for the compact serialization
                                 "html": str(table)
                             })
                         table.decompose()
@@ -241,6 +248,43 @@ class FilingParserAgent:
                     sections[section_for_table]["tables"].append(parsed)
                     sections[section_for_table]["tables_html"].append(str(table))
 
+        self.sections = sections
+        tracer.record("parse", time.perf_counter() - parse_started, sections=len(sections),
+                      tables=sum(len(v.get("tables", [])) for v in sections.values()))
+        return sections
+
+    def parse_10k_financial_tables_streaming(self):
+        """
+        Bounded-memory version of parse_10k_financial_tables (see stream_parser.py). Tables are
+        converted as their </table> closes and only their cells are kept. The sections have the
+        same layout, without "html"/"tables_html".
+        """
+        sections = {}
+
+        def section(key):
+            if key not in sections:
+                sections[key] = {"filename": self.file_path, "section": key, "text": "",
+                                 "tables": [], "tables_html": [], "tables_by_note": []}
+            return sections[key]
+
+        def on_table(entry):
+            if not self.is_financial_table(entry["parsed"]):
+                return
+            sec = section(entry["section"])
+            sec["tables"].append(entry["parsed"])
+            sec["tables_by_note"].append({"note_number": entry["note_number"], "parsed": entry["parsed"],
+                                          "cells": entry["cells"]})
+
+        with span("parse") as s:
+            result = parse_filing(self.file_path, on_table)
+            for key, text in result["sections"].items():
+                section(key)["text"] = text
+            for sec in sections.values():
+                sec.update(result["meta"])
+            s["bytes"] = result["bytes"]
+            s["sections"] = len(sections)
+            s["tables"] = result["tables"]
+        print(f"Parsed {self.file_path} ({result['encoding']}): {len(sections)} sections, {result['tables']} tables")
         self.sections = sections
         return sections
 
@@ -265,7 +309,7 @@ class FilingParserAgent:
             }
             self.narrative_documents.append(Document(text=doc_text, metadata=metadata))
             for table_entry in meta.get("tables_by_note", []):
-                table_text = self.table_to_text(table_entry["parsed"], table_entry.get("note", ""))
+                table_text = self.table_to_text(table_entry.get("cells") or table_entry["parsed"], table_entry.get("note", ""))
                 table_metadata = metadata.copy()
                 table_metadata["type"] = "table"
                 table_metadata["footnote"] = table_entry["note_number"]
@@ -273,21 +317,33 @@ class FilingParserAgent:
         print(f"Built {len(self.narrative_documents)} narrative documents and {len(self.table_documents)} table documents.")
         return self.narrative_documents, self.table_documents
 
-    # trying 8192 chunk size change
-    def build_index(self, chunk_size=4096, chunk_overlap=0, index_id="10k10q"):
+    def build_nodes(self, chunk_size=TABLE_CHUNK_TOKENS, chunk_overlap=0):
         """
-        Builds the embedding index from the narrative and table documents and persists it.
+        Builds the documents and splits them into the nodes that go into the index (not embedded yet).
+        Tables are split between rows with their header rows repeated in every chunk (TableNodeParser);
+        chunk_overlap is tokens of trailing rows carried into the next chunk.
         """
-        self.build_documents() #this will be handled in InitialQueryAgent.py
-        parser_sentence = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        # Use SentenceSplitter for both narrative and table documents
-        #commented out nodes_narrative
-        #nodes_narrative = parser_sentence.get_nodes_from_documents(self.narrative_documents)
-        nodes_table = parser_sentence.get_nodes_from_documents(self.table_documents)
+        with span("build_nodes") as s:
+            self.build_documents() #this will be handled in InitialQueryAgent.py
+            parser_table = TableNodeParser(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            #commented out nodes_narrative
+            #parser_sentence = SentenceSplitter(chunk_size=4096, chunk_overlap=0)
+            #nodes_narrative = parser_sentence.get_nodes_from_documents(self.narrative_documents)
+            nodes_table = parser_table.get_nodes_from_documents(self.table_documents)
+            s["nodes"] = len(nodes_table)
         #print("nodes_table")
         #print(nodes_table)
         #all_nodes = nodes_narrative + nodes_table
-        all_nodes = nodes_table
+        return nodes_table
+
+    # trying 8192 chunk size change
+    def build_index(self, chunk_size=TABLE_CHUNK_TOKENS, chunk_overlap=0, index_id="10k10q"):
+        """
+        Builds the embedding index from the narrative and table documents and persists it.
+        QueryCoordinatorAgent commits build_nodes() through its SnapshotStore instead; this
+        writes straight into the given index/persist_dir.
+        """
+        all_nodes = self.build_nodes(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         #this part will be handled in InitialQueryAgent.py
 
         if self.storage_context != None:
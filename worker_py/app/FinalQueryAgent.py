@@ -1,38 +1,172 @@
 # FinalQueryAgent.py
 
 import os, re
-from datetime import datetime
-
-from llama_index.core import VectorStoreIndex, get_response_synthesizer, StorageContext, load_index_from_storage
+import json
+import random
+import asyncio
+import logging
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
 from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, FilterOperator
-from llama_index.llms.openai import OpenAI
 from llama_index.core.evaluation import FaithfulnessEvaluator
-from llama_index.core import PromptTemplate
-from llama_index.core.response_synthesizers import Refine
 from llama_index.core.postprocessor import LLMRerank
 from llama_index.core.query_pipeline import QueryPipeline
 from llama_index.core.query_pipeline.components import FnComponent
+from llama_index.core.base.query_pipeline.query import validate_and_convert_stringable
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core.llms import ChatMessage
-from llama_index.core.settings import Settings
-from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.core.response_synthesizers import TreeSummarize
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.retrievers import BaseRetriever
+
+from llama_index.core.schema import QueryBundle
+
+from tracing import span
+from grounding import check_grounding, node_texts
+from context_pruner import prune_nodes
+from clients import get_llm, get_embed_model
+from shard_store import LEGACY
+
+NO_DATA_RESPONSE = "I don't have the data: no indexed filings match this query."
+
+# How answers are checked before they're returned (see verify):
+#   numeric - deterministic grounding of figures/periods against the retrieved tables (default)
+#   llm     - the LLM FaithfulnessEvaluator, one extra LLM call per attempt
+#   both    - must pass both
+VERIFIERS = ("numeric", "llm", "both")
+
+# Branch name -> node "type" metadata it retrieves
+PIPELINE_BRANCHES = {"narrative": "narrative", "table": "table"}
+# candidates each branch retrieves before LLMRerank cuts them to RERANK_TOP_N
+BRANCH_TOP_K = {"narrative": 5, "table": 25}
+RERANK_TOP_N = 5
+# comparison mode (adecomposed_query): per (company, period) sub-query candidates and reranked keep,
+# and how long a sub-query may take before the synthesis goes ahead without it
+SUBQUERY_TOP_K = {"narrative": 3, "table": 10}
+SUBQUERY_TOP_N = 3
+SUBQUERY_TIMEOUT_S = 90
+
+
+class ShardRetriever(BaseRetriever):
+    """
+    Queries several index shards (one per company, see shard_store.py) and keeps the overall
+    top k by similarity. The query is embedded once and the embedding handed to every shard.
+    """
+
+    def __init__(self, retrievers: List, similarity_top_k: int, embed_model) -> None:
+        super().__init__()
+        self.retrievers = retrievers
+        self.similarity_top_k = similarity_top_k
+        self.embed_model = embed_model
+
+    def _embed(self, query_bundle) -> None:
+        if query_bundle.embedding is None and query_bundle.embedding_strs:
+            query_bundle.embedding = self.embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+
+    def _top(self, results) -> List:
+        merged = [n for nodes in results for n in nodes]
+        return sorted(merged, key=lambda n: n.score or 0.0, reverse=True)[: self.similarity_top_k]
+
+    def _retrieve(self, query_bundle):
+        self._embed(query_bundle)
+        return self._top([r.retrieve(query_bundle) for r in self.retrievers])
+
+    async def _aretrieve(self, query_bundle):
+        self._embed(query_bundle)
+        return self._top(await asyncio.gather(*(r.aretrieve(query_bundle) for r in self.retrievers)))
+
 
 class FinalQueryAgent:
-    def __init__(self, persist_dir: str, strategy: str, storage = None, index = None):
+    def __init__(self, persist_dir: str, strategy: str, indexes: Optional[Dict] = None,
+                 on_event: Optional[Callable[[Dict], None]] = None,
+                 verifier: str = "numeric", audit_rate: float = 0.0):
         """
         Initialize the query agent with the storage persistence directory and strategy (index ID).
+        indexes maps shard key -> loaded index for the shards this query may read (see set_indexes).
+        If on_event is given, the summarizer streams and progress/citation/token events are sent to it.
+        verifier picks the answer check (see VERIFIERS); with the numeric verifier, audit_rate of the
+        answers are also marked for the LLM faithfulness judge, which the caller runs later by
+        handing them to run_audits().
         """
+        if verifier not in VERIFIERS:
+            raise ValueError(f"verifier must be one of {VERIFIERS}, got {verifier!r}")
         self.persist_dir = persist_dir
         self.strategy = strategy
         # Build storage context from persisted index
         #self.storage_context = StorageContext.from_defaults(persist_dir=self.persist_dir)  #load this once in InitialQueryAgent.py
-        self.storage_context = storage
-        self.index = index
-        Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
-        # Create an LLM handle with the updated model settings
-        self.llm = OpenAI(model="gpt-4-turbo", temperature=0) #set temperature to 1
+        self.indexes = dict(indexes or {})
+        # shared with the coordinator (see clients.py); the embed model is also Settings.embed_model
+        self.embed_model = get_embed_model()
+        self.llm = get_llm() #set temperature to 1
         self.citation = []
+        self.log = logging.getLogger("FinalQueryAgent")
+        # (docstore size, stats) so stats are only recomputed after inserts
+        self._stats_cache = None
+        self.on_event = on_event
+        self.verifier = verifier
+        self.audit_rate = audit_rate
+        # shard key -> (index, {node type: (vector store rows, nodes)}) for retrieve_batch
+        self._type_rows = {}
+        # QUERY_PRUNE_CONTEXT=0 hands the summarizer whole reranked tables (see prune)
+        self.prune_context = os.getenv("QUERY_PRUNE_CONTEXT", "1") == "1"
+
+    def set_indexes(self, indexes: Dict) -> None:
+        """Switch to another set of shard snapshots (see QueryCoordinatorAgent.refresh_index)."""
+        self.indexes = dict(indexes)
+        self._stats_cache = None
+        self._type_rows = {k: v for k, v in self._type_rows.items() if k in self.indexes}
+
+    def emit(self, event: str, **data) -> None:
+        if self.on_event is not None:
+            self.on_event({"event": event, **data})
+
+    def _streamed_response(self, response, text: str) -> Response:
+        # the evaluator and callers expect a plain Response once the tokens are out
+        return Response(response=text, source_nodes=getattr(response, "source_nodes", []),
+                        metadata=getattr(response, "metadata", None))
+
+    def drain_stream(self, response):
+        """
+        Forward the summarizer's tokens as "token" events and return the completed Response.
+        Non-streaming responses are returned unchanged.
+        """
+        gen = getattr(response, "response_gen", None)
+        if gen is None:
+            return response
+        parts = []
+        # time from first to last summarizer token (the summarize span only covers starting the stream)
+        with span("stream") as s:
+            for token in gen:
+                parts.append(token)
+                self.emit("token", text=token)
+            s["chunks"] = len(parts)
+        return self._streamed_response(response, "".join(parts))
+
+    async def adrain_stream(self, response):
+        """
+        Async version of drain_stream; handles both sync and async token generators.
+        """
+        if hasattr(response, "async_response_gen"):
+            gen = response.async_response_gen()
+        else:
+            gen = getattr(response, "response_gen", None)
+        if gen is None:
+            return response
+        parts = []
+        with span("stream") as s:
+            if hasattr(gen, "__aiter__"):
+                async for token in gen:
+                    parts.append(token)
+                    self.emit("token", text=token)
+            else:
+                for token in gen:
+                    parts.append(token)
+                    self.emit("token", text=token)
+            s["chunks"] = len(parts)
+        return self._streamed_response(response, "".join(parts))
 
     def input_mapper_fn(self, query_str: str):
         return {"query_str": query_str}
@@ -67,166 +201,520 @@ class FinalQueryAgent:
 
 
     
-    def build_pipeline_query(self, prompt_str: str, query_str: str):
+    @staticmethod
+    def _norm_cik(cik) -> Optional[str]:
+        # metadata CIKs come from regexes over the filing text, so padding varies
+        if cik is None:
+            return None
+        s = str(cik).strip()
+        return str(int(s)) if s.isdigit() else s
+
+    def index_stats(self) -> Dict[str, Counter]:
         """
-        Builds and runs the query pipeline:
-          - Loads the prebuilt index from storage.
-          - Detects the form type from the query.
-          - Creates separate retrievers for narrative and table documents using updated filters.
-          - Sets up prompt rewriting, LLM-based reranking, node merging with citation printing, and summarization.
-          - Runs the query and evaluates the response.
+        Count indexed nodes by type, cik, form_type, and by (type, cik, form_type) partition.
+        """
+        shards = {key: index.docstore.docs for key, index in self.indexes.items()}
+        sizes = sorted((key, len(docs)) for key, docs in shards.items())
+        if self._stats_cache and self._stats_cache[0] == sizes:
+            return self._stats_cache[1]
+        stats = {"type": Counter(), "cik": Counter(), "form_type": Counter(), "partition": Counter()}
+        for node in (n for docs in shards.values() for n in docs.values()):
+            md = node.metadata or {}
+            node_type, cik, form_type = md.get("type"), self._norm_cik(md.get("cik")), md.get("form_type")
+            stats["type"][node_type] += 1
+            stats["cik"][cik] += 1
+            stats["form_type"][form_type] += 1
+            stats["partition"][(node_type, cik, form_type)] += 1
+        self._stats_cache = (sizes, stats)
+        return stats
+
+    def plan_query(self, ciks: Optional[List[str]] = None, form_types: Optional[List[str]] = None) -> Dict:
+        """
+        Decide which pipeline branches can return results, based on the index statistics.
+        A branch is live if some partition of its node type matches the requested CIKs / form types.
+        Nodes with no cik/form_type metadata are treated as possible matches.
+        """
+        stats = self.index_stats()
+        wanted_ciks = {self._norm_cik(c) for c in ciks if c} if ciks else None
+        wanted_forms = {f.upper() for f in form_types if f} if form_types else None
+
+        counts = {}
+        for branch, node_type in PIPELINE_BRANCHES.items():
+            counts[branch] = sum(
+                n for (t, cik, form), n in stats["partition"].items()
+                if t == node_type
+                and (wanted_ciks is None or cik is None or cik in wanted_ciks)
+                and (wanted_forms is None or form is None or form.upper() in wanted_forms)
+            )
+        plan = {
+            "branches": {branch: n > 0 for branch, n in counts.items()},
+            "candidate_nodes": counts,
+            "ciks": sorted(wanted_ciks) if wanted_ciks else None,
+            "form_types": sorted(wanted_forms) if wanted_forms else None,
+            "index_nodes": sum(stats["type"].values()),
+            "nodes_by_type": {str(k): v for k, v in stats["type"].items()},
+        }
+        # one JSON line per decision so plans can be grepped out of the worker logs
+        self.log.info("query plan %s", json.dumps(plan, sort_keys=True))
+        return plan
+
+    def make_retriever(self, similarity_top_k: int, filters: MetadataFilters):
+        """A retriever over the loaded shards: the shard's own when there is one, else a ShardRetriever."""
+        retrievers = [index.as_retriever(similarity_top_k=similarity_top_k, filters=filters)
+                      for _, index in sorted(self.indexes.items())]
+        if len(retrievers) == 1:
+            return retrievers[0]
+        return ShardRetriever(retrievers, similarity_top_k, self.embed_model)
+
+    def rerank_component(self, reranker: LLMRerank) -> FnComponent:
+        """
+        Wrap an LLMRerank so the async pipeline can run both rerank branches at the same time.
+        LLMRerank has no native async path, so the blocking call is pushed onto a worker thread.
+        """
+        def rerank(nodes, query_str):
+            return reranker.postprocess_nodes(nodes, query_str=validate_and_convert_stringable(query_str))
+
+        async def arerank(nodes, query_str):
+            return await asyncio.to_thread(rerank, nodes, query_str)
+
+        return FnComponent(fn=rerank, async_fn=arerank, output_keys=["nodes"])
+
+    @staticmethod
+    def table_citation(node) -> str:
+        return (f"Table cited from: {node.metadata.get('filename', '')} "
+                f"{node.metadata.get('form_type', '')} "
+                f"{node.metadata.get('section', '')} "
+                f"footnote: {node.metadata.get('footnote', '')}")
+
+    def prune(self, nodes: List, question: Optional[str]) -> List:
+        """
+        Cut reranked table nodes to the rows and period columns `question` asks about
+        (context_pruner.py) so the summarizer reads less. Citations are taken before this.
+        """
+        if not self.prune_context or not question or not nodes:
+            return nodes
+        with span("prune") as s:
+            nodes, stats = prune_nodes(nodes, question)
+            s.update(stats)
+        return nodes
+
+    def _shard_rows(self, key: str, index):
+        """{node type: (store rows, nodes)} of a loaded shard, built once per snapshot."""
+        cached = self._type_rows.get(key)
+        if cached is not None and cached[0] is index:
+            return cached[1]
+        docs = index.docstore.docs
+        store = index.vector_store  # QuantizedVectorStore (see index_store.py)
+        by_type = {}
+        for row in store.live_rows():
+            node = docs.get(store.node_id(row))
+            if node is not None:
+                rows, nodes = by_type.setdefault((node.metadata or {}).get("type"), ([], []))
+                rows.append(row)
+                nodes.append(node)
+        entry = {t: (np.asarray(rows, dtype=np.int64), nodes) for t, (rows, nodes) in by_type.items()}
+        self._type_rows[key] = (index, entry)
+        return entry
+
+    def retrieve_batch(self, embeddings: List[List[float]], shard_keys: List[List[str]]) -> List[Dict[str, List]]:
+        """
+        Retrieval for many queries at once (run_batch.py): per shard and branch, one search of every
+        query that reads the shard against the nodes of that type (vector_codec.py: compact scan,
+        full-precision rescore), then the overall top k per branch, as the pipeline retrievers would.
+        Returns [{branch: [NodeWithScore]}].
+        """
+        results = [{branch: [] for branch in PIPELINE_BRANCHES} for _ in embeddings]
+        if not embeddings:
+            return results
+        with span("batch_retrieve") as s:
+            queries = np.asarray(embeddings, dtype=np.float32)
+            searched = 0
+            for key, index in sorted(self.indexes.items()):
+                wanted = [qi for qi, keys in enumerate(shard_keys) if key in keys]
+                if not wanted:
+                    continue
+                by_type = self._shard_rows(key, index)
+                for branch, node_type in PIPELINE_BRANCHES.items():
+                    if node_type not in by_type:
+                        continue
+                    rows, nodes = by_type[node_type]
+                    position = {row: i for i, row in enumerate(rows.tolist())}
+                    best, scores = index.vector_store.search(queries[wanted], BRANCH_TOP_K[branch], rows)
+                    for qi, top, top_scores in zip(wanted, best, scores):
+                        results[qi][branch].extend(NodeWithScore(node=nodes[position[r]], score=float(sc))
+                                                   for r, sc in zip(top.tolist(), top_scores))
+                    searched += len(rows)
+            for branches in results:
+                for branch, hits in branches.items():
+                    branches[branch] = sorted(hits, key=lambda n: n.score, reverse=True)[:BRANCH_TOP_K[branch]]
+            s["queries"] = len(embeddings)
+            s["nodes"] = searched
+        return results
+
+    async def aanswer_nodes(self, query_str: str, branch_nodes: Dict[str, List]):
+        """
+        Rerank, summarize and check nodes retrieved by retrieve_batch. Keeps no per-query state on
+        the agent (citations are returned, not collected on self.citation), so many can run at once.
+        Returns (response, passing, citations).
+        """
+        live = [nodes for branch, nodes in branch_nodes.items() if nodes and branch in PIPELINE_BRANCHES]
+        if not live:
+            return Response(response=NO_DATA_RESPONSE), True, []
+
+        def rerank(nodes):
+            return LLMRerank(llm=self.llm, top_n=RERANK_TOP_N).postprocess_nodes(nodes, query_str=query_str)
+
+        with span("rerank") as s:
+            reranked = await asyncio.gather(*(asyncio.to_thread(rerank, nodes) for nodes in live))
+            merged = [n for nodes in reranked for n in nodes]
+            s["nodes"] = len(merged)
+        citations = [self.table_citation(n) for n in merged if n.metadata.get("type") == "table"]
+        merged = self.prune(merged, query_str)
+        with span("summarize"):
+            summarizer = TreeSummarize(llm=self.llm, use_async=True)
+            response = await summarizer.asynthesize(self.build_query_str(query_str), merged)
+        return response, await self.averify(response), citations
+
+    def subquery_retriever(self, shard_keys: List[str], node_type: str, top_k: int, cik=None):
+        """
+        Retriever for one company: its own shards need only the node type filter; the pre-shard
+        legacy index mixes companies, so there the CIK is filtered too (padded or not).
+        """
+        retrievers = []
+        for key in shard_keys:
+            if key not in self.indexes:
+                continue
+            filters = [MetadataFilter(key="type", value=node_type, operator=FilterOperator.EQ)]
+            if key == LEGACY and cik:
+                norm = self._norm_cik(cik)
+                variants = list(dict.fromkeys([norm, norm.zfill(10) if norm.isdigit() else norm]))
+                filters.append(MetadataFilter(key="cik", value=variants, operator=FilterOperator.IN))
+            retrievers.append(self.indexes[key].as_retriever(similarity_top_k=top_k,
+                                                             filters=MetadataFilters(filters=filters)))
+        if not retrievers:
+            return None
+        return retrievers[0] if len(retrievers) == 1 else ShardRetriever(retrievers, top_k, self.embed_model)
+
+    async def _run_subquery(self, query_str: str, sub: Dict) -> List:
+        sub_query = f"{query_str} (for {sub['label']})"
+        with span("subquery") as s:
+            bundle = QueryBundle(query_str=sub_query, embedding=await self.embed_model.aget_query_embedding(sub_query))
+            branches = [self.subquery_retriever(sub["shards"], node_type, SUBQUERY_TOP_K[branch], sub.get("cik"))
+                        for branch, node_type in PIPELINE_BRANCHES.items()]
+            retrieved = await asyncio.gather(*(r.aretrieve(bundle) for r in branches if r is not None))
+
+            def rerank(nodes):
+                return LLMRerank(llm=self.llm, top_n=SUBQUERY_TOP_N).postprocess_nodes(nodes, query_str=sub_query)
+
+            reranked = await asyncio.gather(*(asyncio.to_thread(rerank, nodes) for nodes in retrieved if nodes))
+            nodes = [n for branch in reranked for n in branch]
+            s["nodes"] = len(nodes)
+        return nodes
+
+    async def adecomposed_query(self, query_str: str, subqueries: List[Dict]):
+        """
+        Comparison mode: instead of one top-25 retrieval across every company (where one company's
+        tables can crowd out the other's), run a retrieve + rerank per (company, period) sub-query
+        concurrently, each restricted to that company's shards, and summarize the union once.
+        subqueries are [{"label", "cik", "shards"}] (see QueryCoordinatorAgent.subqueries_for). A
+        sub-query slower than SUBQUERY_TIMEOUT_S is dropped. Returns (response, passing, citations).
         """
         try:
-            # Load the prebuilt index using the given strategy (index ID)
-            #index = load_index_from_storage(self.storage_context, index_id=self.strategy)
-            index = self.index
             self.citation = []
-            # Helper function to detect form type from the query.
-            def detect_form_type(query: str) -> str:
-                        q = query.lower()         
-                        if "annual" in q or "fiscal year" in q or "year ending" in q:  ####
-                            return "10-K"
-                        elif re.search(r'q[1-4]|quarter|quarterly|march|june|september|december|10q|10-q', q):
-                            print("QQQQQ")
-                            print(q)
-                            print("WHYYYY")
-                            return "10-Q"
-                        else:
-                            return "10-K"  # fallback to 10-K
- 
-
-            form_type = "10-K"
-            print(f"Form type to retrieve similarity from: {form_type}")
-
-            # Define filters using the detected form type
-            filters_table = MetadataFilters(filters=[
-                MetadataFilter(key="type", value="table", operator=FilterOperator.EQ),
-                #MetadataFilter(key="form_type", value=[form_type], operator=FilterOperator.IN)
-            ])
-            filters_narrative = MetadataFilters(filters=[
-                MetadataFilter(key="type", value="narrative", operator=FilterOperator.EQ),
-                #MetadataFilter(key="form_type", value=[form_type], operator=FilterOperator.EQ)
-            ])
-
-            retriever_narrative = index.as_retriever(similarity_top_k=5, filters=filters_narrative)
-            retriever_table = index.as_retriever(similarity_top_k=25, filters=filters_table)
-
-            # Set up LLM-based rerankers
-            reranker_narrative = LLMRerank(llm=self.llm, top_n=5)
-            reranker_table = LLMRerank(llm=self.llm, top_n=5)
-
-            # Use the Refine summarizer
-            #summarizer = Refine(llm=self.llm) 
-            #try this
+            self.emit("stage", stage="retrieving", subqueries=len(subqueries))
+            results = await asyncio.gather(
+                *(asyncio.wait_for(self._run_subquery(query_str, sub), SUBQUERY_TIMEOUT_S) for sub in subqueries),
+                return_exceptions=True)
+            merged, seen = [], set()
+            for sub, nodes in zip(subqueries, results):
+                if isinstance(nodes, BaseException):
+                    self.log.warning("Sub-query for %s failed: %r", sub["label"], nodes)
+                    continue
+                for node in nodes:
+                    if node.node.node_id not in seen:
+                        seen.add(node.node.node_id)
+                        merged.append(node)
+            if not merged:
+                return Response(response=NO_DATA_RESPONSE), True, []
+
+            self.citation = [self.table_citation(n) for n in merged if n.metadata.get("type") == "table"]
+            self.emit("citations", citations=list(self.citation))
+            self.emit("stage", stage="summarizing")
+            merged = self.prune(merged, query_str)
+            synthesis_query = (self.build_query_str(query_str) + " Give the figures for each of: "
+                               + "; ".join(sub["label"] for sub in subqueries) + ".")
+            with span("summarize"):
+                summarizer = TreeSummarize(llm=self.llm, use_async=True, streaming=self.on_event is not None)
+                response = await summarizer.asynthesize(synthesis_query, merged)
+            response = await self.adrain_stream(response)
+            return response, await self.averify(response), self.citation
 
-    
-   
-
-            # 2) Pass the PromptTemplate to Refine
-           # summarizer = Refine(
-           #     llm=self.llm
-           # )
-            
-            summarizer = TreeSummarize(llm=self.llm)
- 
-
-
-            # Prompt rewriting template and component
-            template = PromptTemplate("{query_str}.")
-            def apply_prompt(query_str):
-                prompt_text = template.format(query_str=query_str)
-                return [ChatMessage(role="user", content=prompt_text)]
-            prompt_tmpl = FnComponent(fn=apply_prompt, output_keys=["messages"])
-
-            # Input mapper component
-            input_mapper = FnComponent(fn=lambda query_str: {"query_str": query_str}, output_keys=["query_str"])
-
-            # Define a merge component that prints citation details and merges nodes
-            def capture_nodes(nodes1, nodes2):
-                merged = nodes1 + nodes2
-                print("\n🔍 Merged Nodes:")
-                for i, node in enumerate(merged):
+        except Exception as e:
+            self.log.exception("Error in adecomposed_query: %s", e)
+            return None, False, []
+
+    def build_pipeline(self, use_async: bool = False, plan: Optional[Dict] = None,
+                       question: Optional[str] = None) -> QueryPipeline:
+        """
+        Builds the query pipeline:
+          - Uses the shard indexes set by the coordinator (set_indexes).
+          - Creates separate retrievers for narrative and table documents using updated filters.
+          - Sets up prompt rewriting, LLM-based reranking, node merging with citation printing, and summarization.
+        With use_async=True the rerankers and summarizer are set up for concurrent execution under p.arun.
+        Only the branches marked live in `plan` (see plan_query) are added to the graph. Given the
+        user's `question`, merged nodes are pruned to it (see prune) before the summarizer.
+        """
+        plan = plan or self.plan_query()
+        live = plan["branches"]
+        self.citation = []
+
+        filters_table = MetadataFilters(filters=[
+            MetadataFilter(key="type", value="table", operator=FilterOperator.EQ),
+        ])
+        filters_narrative = MetadataFilters(filters=[
+            MetadataFilter(key="type", value="narrative", operator=FilterOperator.EQ),
+        ])
+
+        retriever_narrative = self.make_retriever(similarity_top_k=BRANCH_TOP_K["narrative"], filters=filters_narrative)
+        retriever_table = self.make_retriever(similarity_top_k=BRANCH_TOP_K["table"], filters=filters_table)
+
+        # Set up LLM-based rerankers
+        reranker_narrative = LLMRerank(llm=self.llm, top_n=RERANK_TOP_N)
+        reranker_table = LLMRerank(llm=self.llm, top_n=RERANK_TOP_N)
+
+        # use_async lets TreeSummarize fire its per-chunk LLM calls concurrently
+        # streaming only when someone is listening for tokens
+        summarizer = TreeSummarize(llm=self.llm, use_async=use_async, streaming=self.on_event is not None)
+
+        # Prompt rewriting template and component
+        template = PromptTemplate("{query_str}.")
+        def apply_prompt(query_str):
+            prompt_text = template.format(query_str=query_str)
+            return [ChatMessage(role="user", content=prompt_text)]
+        prompt_tmpl = FnComponent(fn=apply_prompt, output_keys=["messages"])
+
+        # Input mapper component
+        input_mapper = FnComponent(fn=lambda query_str: {"query_str": query_str}, output_keys=["query_str"])
+
+        # Define a merge component that collects citations and merges nodes
+        # (the node/citation dump is debug-level: stdout is the JSON-lines event channel)
+        def capture_nodes(nodes1=None, nodes2=None):
+            merged = (nodes1 or []) + (nodes2 or [])
+            debug = self.log.isEnabledFor(logging.DEBUG)
+            if debug:
+                self.log.debug("Merged Nodes: %d", len(merged))
+            for i, node in enumerate(merged):
+                if debug:
                     content_preview = node.node.get_content()[:200] if hasattr(node, "node") else node.text[:200]
-                    print(f"[{i}] {content_preview}...\n")
-                    print(f"--- Citation {i+1} ---")
-                    if node.metadata.get('type') == 'table':
-                        print("node.text: ")
-                        print(node.text)
-                        citation = (f"Table cited from: {node.metadata.get('filename', '')} "
-                                    f"{node.metadata.get('form_type', '')} "
-                                    f"{node.metadata.get('section', '')} "
-                                    f"footnote: {node.metadata.get('footnote', '')}")
-                        #save citation here, output in the final response
-                        print("\n📊 " + citation + "\n")
-                        self.citation.append(citation)
-                    elif node.metadata.get('type') == 'narrative':
-                        citation = (f"Text cited from: {node.metadata.get('filename', '')} "
-                                    f"{node.metadata.get('form_type', '')} "
-                                    f"{node.metadata.get('section', '')}")
-                        print(citation)
-                return merged
-
-            merge_reranked = FnComponent(fn=capture_nodes, output_keys=["nodes"])
-
-            # Build the query pipeline
-            print("Starting the RAG Query Pipeline...")
-            p = QueryPipeline(verbose=True)
-            
-            
+                    self.log.debug("[%d] %s...", i, content_preview)
+                if node.metadata.get('type') == 'table':
+                    citation = self.table_citation(node)
+                    #save citation here, output in the final response
+                    self.citation.append(citation)
+                    if debug:
+                        self.log.debug("--- Citation %d ---\n%s\n%s", i + 1, node.text, citation)
+                elif node.metadata.get('type') == 'narrative' and debug:
+                    self.log.debug("--- Citation %d --- Text cited from: %s %s %s", i + 1,
+                                   node.metadata.get('filename', ''), node.metadata.get('form_type', ''),
+                                   node.metadata.get('section', ''))
+            self.emit("citations", citations=list(self.citation))
+            self.emit("stage", stage="summarizing")
+            return merged
+
+        merge_reranked = FnComponent(fn=capture_nodes, output_keys=["nodes"])
+        prune_context = FnComponent(fn=lambda nodes: self.prune(nodes, question), output_keys=["nodes"])
+
+        # Build the query pipeline
+        self.log.debug("Starting the RAG Query Pipeline...")
+        p = QueryPipeline(verbose=self.log.isEnabledFor(logging.DEBUG))
+        
+        
+        p.add_modules({
+            "input": input_mapper,
+            "llm": self.llm,
+            "prompt_tmpl": prompt_tmpl,
+            "merge_reranked": merge_reranked,
+            "prune_context": prune_context,
+            "summarizer": summarizer,
+        })
+        branches = {
+            "narrative": (retriever_narrative, reranker_narrative, "nodes1"),
+            "table": (retriever_table, reranker_table, "nodes2"),
+        }
+        for branch, (retriever, reranker, _) in branches.items():
+            if not live.get(branch):
+                # nothing indexed for this branch, don't pay for a retrieve + rerank that returns nothing
+                self.log.debug("Skipping %s branch (no matching nodes in index)", branch)
+                continue
             p.add_modules({
-                "input": input_mapper,
-                "llm": self.llm,
-                "prompt_tmpl": prompt_tmpl,
-                "retriever_narrative": retriever_narrative,
-                "retriever_table": retriever_table,
-                "merge_reranked": merge_reranked,
-                "summarizer": summarizer,
-                "reranker_narrative": reranker_narrative,
-                "reranker_table": reranker_table,
+                f"retriever_{branch}": retriever,
+                f"reranker_{branch}": self.rerank_component(reranker) if use_async else reranker,
             })
-            
-
-            # Link modules to form the processing graph
-
-            
-            p.add_link("input", "prompt_tmpl")
-            p.add_link("prompt_tmpl", "llm", dest_key="messages")
-            p.add_link("llm", "retriever_narrative")
-            p.add_link("llm", "retriever_table")
-
-            p.add_link("retriever_narrative", "reranker_narrative", dest_key="nodes")
-            p.add_link("llm", "reranker_narrative", dest_key="query_str")
-            p.add_link("retriever_table", "reranker_table", dest_key="nodes")
-            p.add_link("llm", "reranker_table", dest_key="query_str")
-            
-            p.add_link("reranker_narrative", "merge_reranked", dest_key="nodes1")
-            p.add_link("reranker_table", "merge_reranked", dest_key="nodes2")
-            p.add_link("merge_reranked", "summarizer", dest_key="nodes")
-            p.add_link("llm", "summarizer", dest_key="query_str")
-            
-        
 
 
-            
+        # Link modules to form the processing graph
 
-            print("Summarizer input keys:", summarizer.as_query_component().input_keys)
-            print("Pipeline input keys:", p.input_keys)
+        
+        p.add_link("input", "prompt_tmpl")
+        p.add_link("prompt_tmpl", "llm", dest_key="messages")
+        for branch, (_, _, merge_key) in branches.items():
+            if not live.get(branch):
+                continue
+            p.add_link("llm", f"retriever_{branch}")
+            p.add_link(f"retriever_{branch}", f"reranker_{branch}", dest_key="nodes")
+            p.add_link("llm", f"reranker_{branch}", dest_key="query_str")
+            p.add_link(f"reranker_{branch}", "merge_reranked", dest_key=merge_key)
+        p.add_link("merge_reranked", "prune_context", dest_key="nodes")
+        p.add_link("prune_context", "summarizer", dest_key="nodes")
+        p.add_link("llm", "summarizer", dest_key="query_str")
+        
+    
 
-            # Run the pipeline
-            response = p.run(query_str=query_str)
 
+        
+
+        self.log.debug("Summarizer input keys: %s", summarizer.as_query_component().input_keys)
+        self.log.debug("Pipeline input keys: %s", p.input_keys)
+        return p
+
+    def ground(self, response) -> Dict:
+        """Deterministic numeric/period check of the answer against its source nodes (see check_grounding)."""
+        with span("grounding") as s:
+            result = check_grounding(getattr(response, "response", "") or "",
+                                     node_texts(getattr(response, "source_nodes", None)))
+            s["checked"] = result["checked"]
+            s["unsupported"] = len(result["unsupported"]) + len(result["missing_periods"])
+            s["passing"] = int(result["passing"])
+        if not result["passing"]:
+            self.log.warning("Grounding failed, unsupported: %s periods: %s", result["unsupported"], result["missing_periods"])
+        return result
+
+    def _check(self, response) -> bool:
+        """
+        Numeric grounding (unless verifier="llm"). The report goes on the response itself, as
+        metadata "grounding", with "audit" set when it is sampled for run_audits: many queries may
+        share this agent (QueryCoordinatorAgent.arun_batch), so nothing is kept here.
+        """
+        if self.verifier == "llm":
+            return True
+        result = self.ground(response)
+        meta = {"grounding": result}
+        if self.verifier == "numeric" and self.audit_rate and random.random() < self.audit_rate:
+            meta["audit"] = True
+        response.metadata = {**(response.metadata or {}), **meta}
+        return result["passing"]
+
+    def verify(self, response) -> bool:
+        grounded = self._check(response)
+        if self.verifier == "numeric":
+            return grounded
+        if not grounded:
+            return False  # "both": no point paying for the judge
+        self.emit("stage", stage="evaluating")
+        with span("evaluate") as s:
             evaluator = FaithfulnessEvaluator(llm=self.llm)
             eval_result = evaluator.evaluate_response(response=response)
-            return response, eval_result.passing, self.citation
+            s["passing"] = int(bool(eval_result.passing))
+        return grounded and bool(eval_result.passing)
+
+    async def averify(self, response) -> bool:
+        grounded = self._check(response)
+        if self.verifier == "numeric":
+            return grounded
+        if not grounded:
+            return False  # "both": no point paying for the judge
+        self.emit("stage", stage="evaluating")
+        with span("evaluate") as s:
+            evaluator = FaithfulnessEvaluator(llm=self.llm)
+            eval_result = await evaluator.aevaluate_response(response=response)
+            s["passing"] = int(bool(eval_result.passing))
+        return grounded and bool(eval_result.passing)
+
+    @staticmethod
+    def audit_sampled(response) -> bool:
+        return bool(((getattr(response, "metadata", None) or {}).get("audit")))
+
+    def run_audits(self, responses: List) -> List[Dict]:
+        """
+        Run the LLM faithfulness judge on the responses sampled for it (see audit_sampled). Meant
+        to be called after the answer has been returned, so it only costs tokens, not latency;
+        disagreements with the numeric check are logged so the two can be compared over time.
+        """
+        results = []
+        evaluator = FaithfulnessEvaluator(llm=self.llm)
+        for response in responses:
+            if not self.audit_sampled(response):
+                continue
+            grounded = response.metadata["grounding"]["passing"]
+            with span("audit") as s:
+                try:
+                    faithful = bool(evaluator.evaluate_response(response=response).passing)
+                except Exception as e:
+                    print("Faithfulness audit failed:", e)
+                    continue
+                s["passing"] = int(faithful)
+                s["disagree"] = int(faithful != grounded)
+            results.append({"faithful": faithful, "grounded": grounded})
+            print(f"Faithfulness audit: llm={faithful} grounding={grounded}")
+        return results
+
+    def build_pipeline_query(self, prompt_str: str, query_str: str, ciks: Optional[List[str]] = None,
+                             form_types: Optional[List[str]] = None):
+        """
+        Builds and runs the query pipeline, then checks the response (see verify).
+        """
+        try:
+            plan = self.plan_query(ciks=ciks, form_types=form_types)
+            if not any(plan["branches"].values()):
+                # skip every LLM call when the index can't answer this query
+                self.citation = []
+                return Response(response=NO_DATA_RESPONSE), True, []
+            p = self.build_pipeline(plan=plan, question=prompt_str)
+
+            # Run the pipeline
+            self.emit("stage", stage="retrieving")
+            response = self.drain_stream(p.run(query_str=query_str))
+            return response, self.verify(response), self.citation
 
         except Exception as e:
-            print("Error in build_pipeline_query:", e)
+            self.log.exception("Error in build_pipeline_query: %s", e)
+            return None, False, []
+
+    async def abuild_pipeline_query(self, prompt_str: str, query_str: str, ciks: Optional[List[str]] = None,
+                                    form_types: Optional[List[str]] = None):
+        """
+        Async version of build_pipeline_query. The narrative and table branches (retrieve -> rerank)
+        run concurrently, so latency tracks the slowest branch instead of the sum of both.
+        """
+        try:
+            plan = self.plan_query(ciks=ciks, form_types=form_types)
+            if not any(plan["branches"].values()):
+                # skip every LLM call when the index can't answer this query
+                self.citation = []
+                return Response(response=NO_DATA_RESPONSE), True, []
+            p = self.build_pipeline(use_async=True, plan=plan, question=prompt_str)
+
+            # Run the pipeline
+            self.emit("stage", stage="retrieving")
+            response = await self.adrain_stream(await p.arun(query_str=query_str))
+            return response, await self.averify(response), self.citation
+
+        except Exception as e:
+            self.log.exception("Error in abuild_pipeline_query: %s", e)
             return None, False, []
     
     #Note: try to save citations and have response in the final response
-    def run(self, prompt_str: str, query_str: str):
+    def run(self, prompt_str: str, query_str: str, ciks: Optional[List[str]] = None,
+            form_types: Optional[List[str]] = None):
         """
         Run the complete query pipeline with the given prompt and query strings.
+        `ciks` / `form_types` (what the query is about) narrow the plan to the matching index partitions.
+        """
+        return self.build_pipeline_query(prompt_str, self.build_query_str(query_str), ciks=ciks, form_types=form_types)
+
+    def build_query_str(self, query_str: str) -> str:
+        """
+        Wrap the user question with the analyst instructions sent down the pipeline.
         """
         '''
         topic_instruction = ". Now here are more instructions: Use only the retrieved information that is tabular data in markdown format. Carefully compare rows and columns in order to answer the questions. "
@@ -263,8 +751,14 @@ class FinalQueryAgent:
             "You need to answer this question: " + query_str + " "
             + topic_instruction
         )
+        return query_str
 
-        return self.build_pipeline_query(prompt_str, query_str)
+    async def arun(self, prompt_str: str, query_str: str, ciks: Optional[List[str]] = None,
+                   form_types: Optional[List[str]] = None):
+        """
+        Async counterpart of run(); independent branches and LLM calls run concurrently.
+        """
+        return await self.abuild_pipeline_query(prompt_str, self.build_query_str(query_str), ciks=ciks, form_types=form_types)
 
 # -------------------------------
 # Example Usage
@@ -1,25 +1,30 @@
 # QueryCoordinatorAgent.py
 
 import os
+import sys
 import json
-from typing import List, Dict
-import requests
-import openai
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Dict, Optional
 import datetime
 import threading
 
-# Import your previously defined agents
-from FilingParserAgent import FilingParserAgent
-from FinalQueryAgent import FinalQueryAgent
+# Import your previously defined agents. FinalQueryAgent (query pipeline, evaluators, rerankers)
+# is imported when the first uncached query needs it, so cache hits and early errors skip it.
+from constants import PARSE_VERSION
 from htmDownloader import SECFetchHTM  # our downloader class
 from sec_resolver import TickerResolver
+from answer_cache import AnswerCache, normalize_entities
+from single_flight import FileSingleFlight
+from shard_store import ShardedStore, shard_key
+from filing_catalog import FilingCatalog, file_sha256
+from prefetch import Prefetcher
+from retention import RetentionManager
+from tracing import span, install_llama_callbacks
+from clients import get_llm, get_embed_model
 
-# Import the LLM from llama_index (same as used in FinalQueryAgent)
-from llama_index.llms.openai import OpenAI as LlamaOpenAI
-from llama_index.core.prompts import PromptTemplate
-from llama_index.core import StorageContext, load_index_from_storage, VectorStoreIndex
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core.settings import Settings
+if TYPE_CHECKING:
+    from llama_index.core.prompts import PromptTemplate
 
 class QueryCoordinatorAgent:
     """
@@ -32,47 +37,102 @@ class QueryCoordinatorAgent:
                  edgar_identity: str,
                  download_folder: str = "./10k10q",
                  persist_dir: str = "./store10k10q",
-                 openai_api_key: str = None):
+                 openai_api_key: str = None,
+                 answer_cache_path: str = "./.answer_cache.sqlite",
+                 on_event: Optional[Callable[[Dict], None]] = None,
+                 prefetch: bool = True,
+                 verifier: str = "numeric",
+                 audit_rate: float = 0.0,
+                 max_resident_shards: Optional[int] = None,
+                 decompose: bool = True):
         self.sec_api_key = sec_api_key
         self.edgar_identity = edgar_identity
         self.download_folder = download_folder
         self.persist_dir = persist_dir
         self.formToFile = {}
+        # progress callback for streaming mode (see run_query.py --stream)
+        self.on_event = on_event
+        # spans + token counts for every llama_index call made from here on (see tracing.py)
+        install_llama_callbacks()
         self.resolver = TickerResolver(user_agent=self.edgar_identity)
-        self.resolver.load()
+        with span("resolve_load"):
+            self.resolver.load()
         
         if openai_api_key:
+            import openai
             openai.api_key = openai_api_key
         # Instantiate the final query agent (assumes index already built or will be built by parsing)
         #fetcher for SEC API
         self.htmDownloader = SECFetchHTM(api_key=sec_api_key, download_folder=download_folder)
-        # Create an LLM instance similar to what FinalQueryAgent uses.
-        self.llm = LlamaOpenAI(model="gpt-4-turbo", temperature=0)
-        # ---- CENTRALIZE INDEX LOADING/CREATION HERE ----
-        Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
-        self.embed_model = Settings.embed_model
+        # Same LLM/embedding handles FinalQueryAgent and FilingParserAgent use (clients.py)
+        self.llm = get_llm()
+        self.embed_model = get_embed_model()
         self.lock = threading.Lock()
-        try:
-            # Attempt to load an existing index
-            self.storage_context = StorageContext.from_defaults(persist_dir=self.persist_dir)
-            self.index = load_index_from_storage(self.storage_context, index_id="10k10q")
-            print("Loaded existing index from storage.")
-        except Exception as e:
-            # If it doesn't exist, create a new one
-            print("No existing index found, creating a new one. Error details:", e)
-            self.index = VectorStoreIndex([], embed_model=self.embed_model, persist_dir=self.persist_dir)
-            self.index.set_index_id("10k10q")
-            self.storage_context = self.index.storage_context
-            self.storage_context.persist(self.persist_dir)
-            
-        self.final_query_agent = FinalQueryAgent(persist_dir=self.persist_dir, strategy="10k10q", storage = self.storage_context, index = self.index)
+        # running totals of what this agent has committed (used by ingest_bulk.py for throughput)
+        self.ingest_stats = {"filings": 0, "nodes": 0}
+        # PARSE_LOW_MEMORY=1: stream-parse filings (stream_parser.py) so more parses fit in memory at once
+        self.low_memory_parse = os.getenv("PARSE_LOW_MEMORY", "0") == "1"
+        # one versioned snapshot store (single writer) per company, loaded on demand with at most
+        # max_resident_shards kept in memory, so concurrent workers can share persist_dir safely
+        # vectors are stored as EMBED_DTYPE, cut to EMBED_DIMENSIONS (vector_codec.py)
+        self.store = ShardedStore(self.persist_dir, embed_model=self.embed_model, index_id="10k10q",
+                                  max_resident=max_resident_shards or int(os.getenv("INDEX_MAX_RESIDENT_SHARDS", "8")))
+        # ---- CENTRALIZE INDEX LOADING/CREATION HERE ----
+        # shards the current query reads (see refresh_index); answer-cache hits load none
+        self.active_shards = []
+        # per-filing ingestion is coalesced across threads and worker processes, keyed by (CIK, form, period)
+        self.ingest_flight = FileSingleFlight(os.path.join(self.persist_dir, ".ingest_flights"))
+        # durable record of what's already embedded (by accession number), shared by every worker process
+        self.catalog = FilingCatalog(os.path.join(self.persist_dir, ".catalog.sqlite"))
+        # queue adjacent periods after answering; drained separately by prefetch.py when the API is idle
+        self.prefetcher = Prefetcher(self, self.catalog) if prefetch else None
+        # RETENTION_MAX_HTML_MB / RETENTION_MAX_NODES: evict cold filings after ingesting (retention.py)
+        self.retention = RetentionManager.from_env(self.store, self.catalog, self.download_folder)
+        # FinalQueryAgent settings; the agent itself is built on first use (see final_query_agent)
+        self.verifier = verifier
+        # comparisons across companies/periods get one retrieve + rerank per entity (see subqueries_for)
+        self.decompose = decompose
+        self.audit_rate = audit_rate
+        # answers of this run sampled for the faithfulness audit (see queue_audit / run_audits)
+        self.pending_audits = []
+        self._final_query_agent = None
+        # answers keyed by query embedding + entities + index version; pass answer_cache_path=None to disable
+        self.answer_cache = AnswerCache(path=answer_cache_path) if answer_cache_path else None
 
-    def get_companies_from_query(self, query: str) -> List[Dict]:
+    @property
+    def final_query_agent(self):
+        if self._final_query_agent is None:
+            from FinalQueryAgent import FinalQueryAgent
+            with span("final_agent_init"):
+                self._final_query_agent = FinalQueryAgent(
+                    persist_dir=self.persist_dir, strategy="10k10q", on_event=self.on_event,
+                    verifier=self.verifier, audit_rate=self.audit_rate)
+        return self._final_query_agent
+
+    def refresh_index(self, ciks: Optional[List[str]] = None) -> None:
         """
-        Use the LLM to extract a list of companies from the user query, along with their corresponding 
-        tickers (or CIKs) and optionally the filing date range.
-        Expected output: a JSON list of objects with "company_name", "ticker" (or "cik"), and "filing_date_range".
+        Point the final agent at the shards of `ciks` (every shard if empty; the last set if None).
+        Shards another writer has published to since we loaded them are reloaded; the rest come
+        from the resident LRU.
         """
+        if ciks is not None:
+            self.active_shards = self.store.keys_for(ciks)
+            self.catalog.touch_ciks(ciks)
+        self.final_query_agent.set_indexes(self.store.indexes(self.active_shards))
+
+    def commit_nodes(self, nodes, replace_ids=None, cik=None) -> None:
+        """Publish nodes as a new snapshot of the company's shard through its single writer."""
+        self.store.commit(cik, nodes, replace_ids=replace_ids)
+        with self.lock:
+            self.ingest_stats["filings"] += 1
+            self.ingest_stats["nodes"] += len(nodes)
+
+    def emit(self, event: str, **data) -> None:
+        if self.on_event is not None:
+            self.on_event({"event": event, **data})
+
+    def companies_prompt(self, query: str) -> "PromptTemplate":
+        from llama_index.core.prompts import PromptTemplate
         prompt_str = (
             "You are an assistant specialized in financial filings. Given the following query, "
             "extract a list of companies mentioned along with their corresponding ticker symbols, CIK, form type, "
@@ -87,10 +147,25 @@ class QueryCoordinatorAgent:
             "One more thing, if you need multiple reports from the same company, create separate JSON entries for each report, just giving a different filing_data_range"
             "The final rule is: if you are going to pull 10k, then don't pull 10q, and vice versa."
         )
-        prompt_template = PromptTemplate(prompt_str)
+        return PromptTemplate(prompt_str)
 
-        response = self.llm.predict(prompt_template)
-        
+    def get_companies_from_query(self, query: str) -> List[Dict]:
+        """
+        Use the LLM to extract a list of companies from the user query, along with their corresponding 
+        tickers (or CIKs) and optionally the filing date range.
+        Expected output: a JSON list of objects with "company_name", "ticker" (or "cik"), and "filing_date_range".
+        """
+        with span("extract"):
+            response = self.llm.predict(self.companies_prompt(query))
+        return self.parse_companies(response)
+
+    async def aget_companies_from_query(self, query: str) -> List[Dict]:
+        with span("extract"):
+            response = await self.llm.apredict(self.companies_prompt(query))
+        return self.parse_companies(response)
+
+    @staticmethod
+    def parse_companies(response: str) -> List[Dict]:
         try:
             companies = json.loads(response) #potentially here, will need to change the filing data to work for 10k and 10q
             return companies
@@ -121,131 +196,315 @@ class QueryCoordinatorAgent:
             print(f"Error determining quarter from period '{period}': {e}")
             return None
                 
+    def company_identifier(self, company: Dict) -> Optional[str]:
+        """
+        CIK for a company entry (its ticker when the resolver can't map it). Ingestion shards,
+        catalogs and searches by it and queries route by it, so both must agree.
+        """
+        return self.resolver.cik_for(company.get("ticker")) or company.get("ticker")
+
+    def partitions_for(self, companies: List[Dict]):
+        """
+        CIKs and form types the extracted companies refer to; used by the query planner.
+        """
+        ciks = [self.company_identifier(c) for c in companies]
+        form_types = [c.get("formType") for c in companies]
+        return [c for c in ciks if c], [f for f in form_types if f]
+
     def process_filings(self, companies: List[Dict]) -> None:
         """
         For each company in the provided list, download the relevant filing, parse it,
-        and update the embedding index.
+        and update the embedding index. Raises ValueError for an incomplete company entry.
         """
         for company in companies:
-            print("form to file right here")
-            print(self.formToFile)
             ticker = company.get("ticker")
-            print("currently on: " + ticker)
             form_type = company.get("formType")
             filing_indicator = company.get("filing_date_range") #format: "2003 Q2" or "2003"
-            form_type = form_type
             if not (ticker and form_type and filing_indicator):
-                print("Incomplete company info:", company)
-                exit(1)
+                raise ValueError(f"Incomplete company info: {company}")
+            print("currently on: " + ticker, file=sys.stderr)
+            self.emit("stage", stage="ingesting", ticker=ticker, filing=filing_indicator)
             
             #check if form is already processed and embedded
             if (ticker, form_type, filing_indicator) in self.formToFile:
                 #we already have this embedded, skip
                 continue
-            else:
-                #process 10q report
-                if form_type.upper() == "10-Q": #process the date to get the quarter -> 3 reports, 1 2 3 become the quarter 1 2 3
-                    parts = filing_indicator.strip().split()
-                    if len(parts) == 2:
-                        target_year, target_quarter = parts[0], parts[1].upper()
-                    else:
-                        target_year, target_quarter = filing_indicator.strip(), None
-                        
-                #process 10k report
-                else:
-                    target_year, target_quarter = filing_indicator.strip(), None
-                    
-                #build a broad historical range: from (target year - 1) to (target year + 1)
-                try:
-                    ty = int(target_year)
-                except Exception:
-                    print(f"Invalid target year: {target_year} for {ticker}")
-                    exit(1)
-                
-                #this can potentially be tweaked, lets tweak this
-                start_date = f"{ty}-02-01"
-                end_date = f"{ty+1}-02-28"
-                
-                #fetch all filings for this company and form type within the broad range
-                # replace filings_list with cik version
-                identifier = self.resolver.cik_for(ticker) or ticker
-                filings_list = self.htmDownloader.get_filing_list(identifier, form_type, start_date, end_date)
-                if not filings_list:
-                    # print(f"No filings found for {ticker} between {start_date} and {end_date}")
-                    print("currently on: " + (identifier if identifier else ""))
-                    continue
-                
-                print("filings list right here")
-                print(filings_list)
-                
-                #this is the string referring to the form we are actually looking for
-                correct_filing = None 
-                
-                #should be all 10-Q reports in the filings_list
-                #at this point, just process all the 10-Q reports
-                if form_type.upper() == "10-Q":
-                    #at this point, just process all the 10Q reports
-                    self.formToFile[(ticker, form_type, filing_indicator)] = filings_list
-                    for filing in filings_list:
-                        parser_agent = FilingParserAgent(
-                            file_path=filing,
-                            identity=self.edgar_identity,
-                            persist_dir=self.persist_dir,
-                            storage_context=self.storage_context,
-                            index = self.index
-                        )
-                        parser_agent.parse_10k_financial_tables()
-                        parser_agent.build_index()
-                    
-                elif form_type.upper() == "10-K":
-                    #get the most recent, because year is already specified
-                    correct_filing = filings_list[0]
-                    self.formToFile[(ticker, form_type, filing_indicator)] = filings_list[0]
-                    for filing in filings_list:
-                        if filing != correct_filing:
-                            os.remove(filing)
-                    if correct_filing == None:
-                        print("No correct filing error")
-                        exit(1)
-                    file_path = correct_filing
-                    '''------------'''
-                #htm files have been saved to 10k10q folder, now need to called FilingParserAgent
-                    print("embedding" + ticker)
-                    parser_agent = FilingParserAgent(
-                        file_path=file_path,
-                        identity=self.edgar_identity,
-                        persist_dir=self.persist_dir,
-                        storage_context=self.storage_context,
-                        index = self.index
-                    )
-                    parser_agent.parse_10k_financial_tables()
-                    parser_agent.build_index()
+
+            # already embedded by an earlier request (any process)? then no search, download or parse
+            with span("resolve"):
+                identifier = self.company_identifier(company)
+            cataloged = self.catalog.embedded_for_request(identifier, form_type, filing_indicator, PARSE_VERSION)
+            if cataloged:
+                print(f"Catalog hit for {ticker} {form_type} {filing_indicator}: {[r['accession_no'] for r in cataloged]}")
+                self.catalog.touch(r["accession_no"] for r in cataloged)
+                if self.catalog.record_prefetch_hit(identifier, form_type, filing_indicator):
+                    print("(prefetched)")
+                paths = [r["path"] for r in cataloged]
+                self.formToFile[(ticker, form_type, filing_indicator)] = paths if form_type.upper() == "10-Q" else paths[0]
+                continue
+
+            # coalesce with any other thread/worker ingesting the same filing right now
+            key = (identifier, form_type.upper(), " ".join(filing_indicator.upper().split()))
+            filings, shared = self.ingest_flight.do(
+                key, lambda: self.ingest_filing(ticker, identifier, form_type, filing_indicator)
+            )
+            if shared:
+                # another worker published it in a newer shard snapshot; refresh_index picks it up
+                print(f"Joined in-flight ingestion for {key}")
+            if filings:
+                self.formToFile[(ticker, form_type, filing_indicator)] = filings if form_type.upper() == "10-Q" else filings[0]
             #persist changes once
         print("Finished processing filings for companies.")
+        self.enforce_retention()
+
+    def enforce_retention(self) -> None:
+        """Evict cold filings past the RETENTION_* budgets, never the ones this agent is answering from."""
+        if self.retention is None:
+            return
+        in_use = []
+        for paths in list(self.formToFile.values()):
+            in_use.extend(paths if isinstance(paths, list) else [paths])
+        report = self.retention.enforce(protect=in_use)
+        if report and (report["html"]["files"] or report["nodes"]["filings"]):
+            print(f"Retention: {report}")
+
+    def ingest_filing(self, ticker: str, identifier: str, form_type: str, filing_indicator: str) -> List[str]:
+        """
+        Search, download, parse and embed the filing(s) for one (company, form, period).
+        Returns the local paths that were ingested (empty if nothing was found).
+        """
+        #process 10q report
+        if form_type.upper() == "10-Q": #process the date to get the quarter -> 3 reports, 1 2 3 become the quarter 1 2 3
+            parts = filing_indicator.strip().split()
+            if len(parts) == 2:
+                target_year, target_quarter = parts[0], parts[1].upper()
+            else:
+                target_year, target_quarter = filing_indicator.strip(), None
+                
+        #process 10k report
+        else:
+            target_year, target_quarter = filing_indicator.strip(), None
+            
+        try:
+            ty = int(target_year)
+        except ValueError:
+            raise ValueError(f"Invalid target year: {target_year} for {ticker}") from None
+
+        # pick the exact filing(s) from search metadata before downloading anything
+        filings_list = self.resolve_filings(identifier, form_type, ty, target_quarter)
+        if not filings_list:
+            print(f"No {form_type} found for {ticker} {filing_indicator}")
+            return []
+
+        print("filings list right here")
+        print([f.get("accessionNo") for f in filings_list])
+
+        paths = [self.ingest_record(ticker, identifier, form_type, filing_indicator, f) for f in filings_list]
+        self.catalog.link_request(identifier, form_type, filing_indicator, [self.accession_of(f) for f in filings_list])
+        return paths
+
+    def resolve_filings(self, identifier: str, form_type: str, year: int, quarter: Optional[str] = None) -> List[Dict]:
+        """
+        Search hits for exactly the requested report, chosen by periodOfReport (period end date):
+          - 10-K year: the annual report whose period ends in that year; retailers whose fiscal
+            year ends in Jan/Feb of the next year are matched by a second, narrow query
+          - 10-Q year + quarter: the one 10-Q whose period end falls in that quarter
+            (determine_filing_quarter_from_data); a bare year returns that year's 10-Qs
+        Falls back to the latest 10-K filed in the old Feb..Feb window if sec-api has no period data.
+        """
+        form = form_type.upper()
+        if quarter not in ("Q1", "Q2", "Q3", "Q4"):
+            quarter = None
+        if form == "10-K":
+            for start, end in ((f"{year}-01-01", f"{year}-12-31"), (f"{year+1}-01-01", f"{year+1}-02-28")):
+                hits = [f for f in self.htmDownloader.search_by_period(identifier, form, start, end, size=1)
+                        if f.get("linkToFilingDetails")]
+                if hits:
+                    return hits
+            legacy = self.htmDownloader.search_filings(identifier, form, f"{year}-02-01", f"{year+1}-02-28",
+                                                       size="1", sort_order="desc").get("filings", []) or []
+            return [f for f in legacy if f.get("linkToFilingDetails")]
+
+        if quarter:
+            q = int(quarter[1])
+            start, end = f"{year}-{3*q-2:02d}-01", f"{year}-{3*q:02d}-{30 if q in (2, 3) else 31}"
+        else:
+            start, end = f"{year}-01-01", f"{year}-12-31"
+        hits = self.htmDownloader.search_by_period(identifier, form, start, end, size=1 if quarter else 4)
+        hits = [f for f in hits if f.get("linkToFilingDetails")]
+        if quarter:
+            hits = [f for f in hits if self.determine_filing_quarter_from_data(str(f.get("periodOfReport"))[:10]) == quarter]
+        return hits
+
+    @staticmethod
+    def accession_of(filing: Dict) -> str:
+        # sec-api.io search hits carry accessionNo; fall back to the document link so the key stays unique
+        return filing.get("accessionNo") or filing.get("id") or filing["linkToFilingDetails"]
+
+    def ingest_record(self, ticker: str, identifier: str, form_type: str, filing_indicator: str, filing: Dict) -> str:
+        """
+        Download, parse and embed one search hit unless the catalog already has it embedded
+        under the current parse version. Returns the local path.
+        """
+        accession = self.accession_of(filing)
+        known = self.catalog.get(accession)
+        if known and self.catalog.is_embedded(accession, PARSE_VERSION):
+            print(f"{accession} already embedded, skipping")
+            self.catalog.touch([accession])
+            return known["path"]
+
+        file_path = self.htmDownloader.download_record(identifier, form_type, filing)
+        self.catalog.upsert(
+            accession,
+            cik=filing.get("cik") or identifier,
+            ticker=filing.get("ticker") or ticker,
+            # sec-api's cik can differ from the identifier we shard by (see company_identifier)
+            shard=shard_key(identifier),
+            form_type=form_type.upper(),
+            fiscal_period=filing_indicator,
+            period_of_report=filing.get("periodOfReport"),
+            filed_at=filing.get("filedAt"),
+            path=file_path,
+            content_hash=file_sha256(file_path),
+            embed_status="pending",
+        )
+
+        #htm files have been saved to 10k10q folder, now need to called FilingParserAgent
+        print("embedding" + ticker)
+        from FilingParserAgent import FilingParserAgent
+        parser_agent = FilingParserAgent(
+            file_path=file_path,
+            identity=self.edgar_identity,
+            persist_dir=self.persist_dir,
+            low_memory=self.low_memory_parse
+        )
+        parser_agent.parse_10k_financial_tables()
+        nodes = parser_agent.build_nodes()
+        # a re-parse (newer PARSE_VERSION) replaces the filing's old nodes in the same snapshot
+        self.commit_nodes(nodes, replace_ids=known["node_ids"] if known else None, cik=identifier)
+        self.catalog.mark_embedded(accession, [n.node_id for n in nodes], PARSE_VERSION)
+        self.catalog.touch([accession])
+        return file_path
+
+    def queue_prefetch(self, companies: List[Dict]) -> None:
+        if self.prefetcher is None:
+            return
+        try:
+            self.prefetcher.enqueue(companies)
+        except Exception as e:
+            # speculative work must never fail the answer
+            print("Could not queue prefetch:", e)
+
+    def check_answer_cache(self, query: str, companies: List[Dict], embedding: Optional[List[float]] = None):
+        """
+        Look the query up in the answer cache against the current index version.
+        Returns ((answer, citations) or None, probe); probe is handed back to save_answer on a miss.
+        Pass `embedding` if the query has already been embedded (run_batch.py).
+        """
+        if self.answer_cache is None:
+            return None, None
+        entities = normalize_entities(companies)
+        if embedding is None:
+            try:
+                embedding = self.embed_model.get_query_embedding(query)
+            except Exception as e:
+                print("Could not embed query for answer cache, exact match only:", e)
+        # keyed by the shards this query reads, so ingesting other companies keeps the entry valid
+        keys = self.store.keys_for(self.partitions_for(companies)[0])
+        probe = (embedding, entities, keys)
+        hit = self.answer_cache.lookup(query, embedding, entities, self.store.version_for(keys))
+        if hit is None:
+            return None, probe
+        answer, citations, match = hit
+        print(f"Answer cache hit ({match})")
+        return (answer, citations), probe
+
+    def save_answer(self, query: str, probe, answer: str, citations: List[str]) -> None:
+        # stored under the post-ingestion index version, which is what the next request will see
+        if self.answer_cache is None or probe is None:
+            return
+        embedding, entities, keys = probe
+        self.answer_cache.store(query, embedding, entities, self.store.version_for(keys), answer, citations)
+
+    def subqueries_for(self, companies: List[Dict]) -> List[Dict]:
+        """
+        One sub-query per distinct (company, form, period) the extraction found, for
+        FinalQueryAgent.adecomposed_query. [] (single retrieval) when there is only one, when
+        decomposition is off, or past QUERY_MAX_SUBQUERIES (keeps the fan-out and its latency bounded).
+        """
+        if not self.decompose:
+            return []
+        subqueries = {}
+        for company in companies:
+            key = self.filing_key(company)
+            if key is None or key in subqueries:
+                continue
+            cik = self.company_identifier(company)
+            label = " ".join(p for p in (company.get("company_name"), f"({key[0]})", key[1], key[2]) if p)
+            subqueries[key] = {"label": label, "cik": cik, "shards": self.store.keys_for([cik] if cik else None)}
+        if len(subqueries) < 2 or len(subqueries) > int(os.getenv("QUERY_MAX_SUBQUERIES", "6")):
+            return []
+        return list(subqueries.values())
+
+    def answer(self, query: str, subqueries: List[Dict], ciks: List[str], form_types: List[str]):
+        """One answer attempt: decomposed when there are sub-queries, else the single query pipeline."""
+        if subqueries:
+            return asyncio.run(self.final_query_agent.adecomposed_query(query, subqueries))
+        return self.final_query_agent.run(prompt_str=query, query_str=query, ciks=ciks, form_types=form_types)
+
+    async def aanswer(self, query: str, subqueries: List[Dict], ciks: List[str], form_types: List[str]):
+        if subqueries:
+            return await self.final_query_agent.adecomposed_query(query, subqueries)
+        return await self.final_query_agent.arun(prompt_str=query, query_str=query, ciks=ciks, form_types=form_types)
+
+    def queue_audit(self, response) -> None:
+        """Keep a returned answer the final agent sampled for the LLM faithfulness audit."""
+        if response is not None and self._final_query_agent is not None \
+                and self._final_query_agent.audit_sampled(response):
+            self.pending_audits.append(response)
+
+    def audits_pending(self) -> bool:
+        return bool(self.pending_audits)
+
+    def run_audits(self):
+        """Sampled LLM faithfulness audits (see FinalQueryAgent.run_audits); call once the answer is out."""
+        if self._final_query_agent is None:
+            return []
+        responses, self.pending_audits = self.pending_audits, []
+        return self._final_query_agent.run_audits(responses)
 
     def run(self, initial_query: str):
         try:
+            self.emit("stage", stage="extracting")
             companies = self.get_companies_from_query(initial_query)
+            cached, probe = self.check_answer_cache(initial_query, companies)
+            if cached:
+                self.emit("stage", stage="cache_hit")
+                self.queue_prefetch(companies)
+                return cached
             self.process_filings(companies)
+            ciks, form_types = self.partitions_for(companies)
+            # load only the shards of the companies asked about
+            self.refresh_index(ciks)
+            subqueries = self.subqueries_for(companies)
             
-            response_obj, passing, citation_list = self.final_query_agent.run(
-                prompt_str=initial_query, 
-                query_str=initial_query
-            )
+            response_obj, passing, citation_list = self.answer(initial_query, subqueries, ciks, form_types)
             
             # If you have logic that might fail again:
             count = 0
             while passing is False and count < 2:
-                response_obj, passing, citation_list = self.final_query_agent.run(
-                    prompt_str=initial_query, 
-                    query_str=initial_query
-                )
+                # tells streaming clients to discard the tokens of the failed attempt
+                self.emit("retry", attempt=count + 1)
+                response_obj, passing, citation_list = self.answer(initial_query, subqueries, ciks, form_types)
                 count += 1
 
+            self.queue_audit(response_obj)
             # Print or return the results
             print(f"Final Query Response: {response_obj.response}")
             print(f"Citation: {citation_list}")
-             
+            if passing:
+                self.save_answer(initial_query, probe, response_obj.response, citation_list)
+            self.queue_prefetch(companies)
             
             return response_obj.response, citation_list
 
@@ -255,6 +514,159 @@ class QueryCoordinatorAgent:
             # Possibly log it or return some default / user-friendly message
             return "Sorry, something went wrong. Please try again later.", []
 
+    async def arun(self, initial_query: str):
+        """
+        Async version of run(). Entity extraction and ingestion stay sequential, but the final
+        query pipeline runs its narrative/table branches and LLM calls concurrently. Extraction
+        uses the LLM's async API, and the blocking cache check (query embedding) and ingestion run
+        in threads, so concurrent arun() calls on one event loop overlap.
+        """
+        try:
+            self.emit("stage", stage="extracting")
+            companies = await self.aget_companies_from_query(initial_query)
+            cached, probe = await asyncio.to_thread(self.check_answer_cache, initial_query, companies)
+            if cached:
+                self.emit("stage", stage="cache_hit")
+                self.queue_prefetch(companies)
+                return cached
+            await asyncio.to_thread(self.process_filings, companies)
+            ciks, form_types = self.partitions_for(companies)
+            # load only the shards of the companies asked about
+            self.refresh_index(ciks)
+            subqueries = self.subqueries_for(companies)
+
+            response_obj, passing, citation_list = await self.aanswer(initial_query, subqueries, ciks, form_types)
+
+            count = 0
+            while passing is False and count < 2:
+                # tells streaming clients to discard the tokens of the failed attempt
+                self.emit("retry", attempt=count + 1)
+                response_obj, passing, citation_list = await self.aanswer(initial_query, subqueries, ciks, form_types)
+                count += 1
+
+            self.queue_audit(response_obj)
+            print(f"Final Query Response: {response_obj.response}")
+            print(f"Citation: {citation_list}")
+            if passing:
+                self.save_answer(initial_query, probe, response_obj.response, citation_list)
+            self.queue_prefetch(companies)
+
+            return response_obj.response, citation_list
+
+        except Exception as e:
+            print("An error occurred:", e)
+            return "Sorry, something went wrong. Please try again later.", []
+
+
+    @staticmethod
+    def filing_key(company: Dict):
+        """(ticker, form, period) a company entry asks for, normalized; None if incomplete."""
+        ticker, form, period = company.get("ticker"), company.get("formType"), company.get("filing_date_range")
+        if not (ticker and form and period):
+            return None
+        return ticker.upper(), form.upper(), " ".join(str(period).upper().split())
+
+    def ingest_batch(self, companies: List[Dict], workers: int = 4) -> int:
+        """
+        Ingest the distinct filings a whole batch needs, each once, on a small thread pool
+        (same coalescing and catalog checks as process_filings). Returns how many were requested.
+        """
+        wanted = {}
+        for company in companies:
+            key = self.filing_key(company)
+            if key is None:
+                print("Incomplete company info, skipped:", company)
+                continue
+            wanted.setdefault(key, company)
+
+        def ingest_one(company):
+            try:
+                self.process_filings([company])
+            except Exception as e:
+                print(f"Ingestion failed for {self.filing_key(company)}: {e}")
+
+        with span("batch_ingest") as s:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                list(pool.map(ingest_one, wanted.values()))
+            s["requested"] = len(companies)
+            s["filings"] = len(wanted)
+        return len(wanted)
+
+    async def arun_batch(self, prompts: List[str], on_item: Optional[Callable[[Dict], None]] = None,
+                         concurrency: int = 8, ingest_workers: int = 4, retries: int = 2) -> List[Dict]:
+        """
+        Answer many prompts in one process, sharing the work between them:
+          - entity extraction runs concurrently for all prompts
+          - the prompts are embedded in one batch; the embeddings serve the answer cache and retrieval
+          - the filings all uncached prompts need are deduplicated and ingested once (ingest_batch)
+          - retrieval for every prompt is one similarity product (FinalQueryAgent.retrieve_batch)
+          - rerank/summarize/check run concurrently, at most `concurrency` prompts at a time
+        on_item gets each prompt's result as soon as it is done; all results come back in prompt order:
+        {"index", "prompt", "ok", "answer", "citations", "passing"} or {"index", "prompt", "ok": False, "error"}.
+        """
+        limit = asyncio.Semaphore(max(1, concurrency))
+        results: List[Optional[Dict]] = [None] * len(prompts)
+
+        def done(i, **data):
+            results[i] = {"index": i, "prompt": prompts[i], **data}
+            if on_item is not None:
+                on_item(results[i])
+
+        async def extract(prompt):
+            async with limit:
+                try:
+                    return await self.aget_companies_from_query(prompt)
+                except Exception as e:
+                    print("Extraction failed:", e)
+                    return []
+
+        self.emit("stage", stage="extracting", prompts=len(prompts))
+        companies = await asyncio.gather(*(extract(p) for p in prompts))
+
+        # text-embedding-3 embeds queries and documents alike, so the batch endpoint does both jobs
+        with span("embed_batch") as s:
+            embeddings = await self.embed_model.aget_text_embedding_batch(prompts)
+            s["queries"] = len(prompts)
+
+        probes, pending = {}, []
+        for i, prompt in enumerate(prompts):
+            cached, probes[i] = self.check_answer_cache(prompt, companies[i], embedding=embeddings[i])
+            if cached:
+                done(i, ok=True, answer=cached[0], citations=cached[1], passing=True, cached=True)
+            else:
+                pending.append(i)
+
+        if pending:
+            self.emit("stage", stage="ingesting")
+            await asyncio.to_thread(self.ingest_batch, [c for i in pending for c in companies[i]], ingest_workers)
+            ciks = {i: self.partitions_for(companies[i])[0] for i in pending}
+            # one index view for the whole batch; a prompt without companies reads every shard
+            union = [c for i in pending for c in ciks[i]]
+            self.refresh_index(union if all(ciks.values()) else [])
+            self.emit("stage", stage="retrieving")
+            retrieved = self.final_query_agent.retrieve_batch(
+                [embeddings[i] for i in pending], [self.store.keys_for(ciks[i]) for i in pending])
+
+            async def answer(i, branch_nodes):
+                async with limit:
+                    try:
+                        for attempt in range(retries + 1):
+                            response, passing, citations = await self.final_query_agent.aanswer_nodes(
+                                prompts[i], branch_nodes)
+                            if passing:
+                                break
+                    except Exception as e:
+                        print(f"Batch prompt {i} failed:", e)
+                        done(i, ok=False, error=f"Worker exception: {e}")
+                        return
+                if passing:
+                    self.save_answer(prompts[i], probes[i], response.response, citations)
+                done(i, ok=True, answer=response.response, citations=citations, passing=passing)
+
+            await asyncio.gather(*(answer(i, nodes) for i, nodes in zip(pending, retrieved)))
+
+        self.queue_prefetch([c for cs in companies for c in cs])
+        return results
 
 
 # -------------------------------
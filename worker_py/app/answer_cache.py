@@ -0,0 +1,206 @@
+# answer_cache.py
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key           TEXT PRIMARY KEY,
+    query         TEXT,
+    entities      TEXT NOT NULL,
+    index_version TEXT,
+    embedding     BLOB,
+    answer        TEXT,
+    citations     TEXT,
+    created_at    REAL,
+    last_access   REAL
+);
+CREATE INDEX IF NOT EXISTS answers_by_entities ON answers (entities);
+CREATE INDEX IF NOT EXISTS answers_by_access ON answers (last_access);
+"""
+
+
+def index_version(persist_dir: str, recursive: bool = True, exclude: Tuple[str, ...] = ()) -> str:
+    """
+    Fingerprint of a persisted index directory (file names, sizes and mtimes).
+    Any persist into the directory changes the version, which invalidates cached answers.
+    Dot-prefixed entries (lock/bookkeeping files) and names in `exclude` are ignored;
+    recursive=False only looks at the files directly in persist_dir.
+    """
+    h = hashlib.sha1()
+    if os.path.isdir(persist_dir):
+        # walked top-down (not sorted(os.walk(...)), which would list pruned dirs too) with dirs sorted in place
+        for root, dirs, files in os.walk(persist_dir):
+            dirs[:] = sorted(d for d in dirs if recursive and not d.startswith(".") and d not in exclude)
+            for name in sorted(f for f in files if not f.startswith(".") and f not in exclude):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                h.update(f"{os.path.relpath(path, persist_dir)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace for exact-key matching."""
+    q = re.sub(r"[^\w\s]", " ", query.lower())
+    return re.sub(r"\s+", " ", q).strip()
+
+
+def normalize_entities(companies: List[Dict]) -> List[List[str]]:
+    """
+    Reduce the LLM-extracted company list to a canonical, order-independent form
+    ([cik or ticker, form type, period] triples), so two phrasings of the same question compare equal.
+    """
+    out = set()
+    for c in companies or []:
+        ident = str(c.get("CIK") or c.get("ticker") or "").strip().upper()
+        if ident.isdigit():
+            ident = str(int(ident))
+        form = str(c.get("formType") or "").strip().upper()
+        period = re.sub(r"\s+", " ", str(c.get("filing_date_range") or "")).strip().upper()
+        out.add((ident, form, period))
+    return [list(t) for t in sorted(out)]
+
+
+def _unit(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+    if embedding is None:
+        return None
+    v = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else None
+
+
+class AnswerCache:
+    """
+    SQLite cache of (query embedding, extracted entities, index version) -> (answer, citations).
+
+    Lookup order:
+      1. exact key: normalized query text + entities + index version
+      2. semantic: same entities + index version, query embedding cosine >= similarity_threshold
+    Entries expire after ttl_seconds, the least recently used ones are evicted past max_entries,
+    and an entry for the same entities written against another index version is dropped on lookup.
+    The version is whatever the caller reads from (the shards of the query's companies), so
+    entries for other companies are untouched by it.
+
+    A lookup only reads the rows of its own entities (indexed) and scores their embeddings,
+    stored as float32 unit vectors, with one dot product; a hit updates just its access stamp
+    and a plain miss writes nothing. Worker processes share the database (WAL, like the filing
+    catalog), so concurrent stores don't drop each other's entries.
+    """
+
+    def __init__(
+        self,
+        path: str = "./.answer_cache.sqlite",
+        *,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: float = 24 * 3600,
+        max_entries: int = 500,
+    ) -> None:
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @staticmethod
+    def make_key(query: str, entities: List[List[str]], version: str) -> str:
+        raw = json.dumps([normalize_query(query), entities, version])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    @contextmanager
+    def _connect(self):
+        # one short-lived connection per operation keeps this safe across threads (see filing_catalog.py)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, hit: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(
+        self, query: str, embedding: Optional[List[float]], entities: List[List[str]], version: str
+    ) -> Optional[Tuple[str, List[str], str]]:
+        """
+        Returns (answer, citations, match) where match is "exact" or "semantic", or None on a miss.
+        """
+        key = self.make_key(query, entities, version)
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, index_version, embedding, created_at FROM answers WHERE entities = ?",
+                (json.dumps(entities),),
+            ).fetchall()
+            stale = [r[0] for r in rows if r[1] != version or r[3] < cutoff]
+            if stale:
+                conn.executemany("DELETE FROM answers WHERE key = ?", [(k,) for k in stale])
+            live = [r for r in rows if r[1] == version and r[3] >= cutoff]
+            hit, match = (key if any(r[0] == key for r in live) else None), "exact"
+            query_vec = _unit(embedding) if hit is None else None
+            if query_vec is not None:
+                scored = [r for r in live if r[2] is not None and len(r[2]) == query_vec.nbytes]
+                if scored:
+                    matrix = np.frombuffer(b"".join(r[2] for r in scored), dtype=np.float32).reshape(len(scored), -1)
+                    scores = matrix @ query_vec
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        hit, match = scored[best][0], "semantic"
+            if hit is None:
+                self._count(False)
+                return None
+            conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (time.time(), hit))
+            answer, citations = conn.execute("SELECT answer, citations FROM answers WHERE key = ?", (hit,)).fetchone()
+        self._count(True)
+        return answer, json.loads(citations or "[]"), match
+
+    def store(
+        self,
+        query: str,
+        embedding: Optional[List[float]],
+        entities: List[List[str]],
+        version: str,
+        answer: str,
+        citations: List[str],
+    ) -> None:
+        now = time.time()
+        vec = _unit(embedding)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, query, entities, index_version, embedding, answer, citations, "
+                "created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(query, entities, version), query, json.dumps(entities), version,
+                 None if vec is None else vec.tobytes(), answer, json.dumps(citations), now, now),
+            )
+            conn.execute("DELETE FROM answers WHERE entities = ? AND index_version IS NOT ?",
+                         (json.dumps(entities), version))
+            conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute("DELETE FROM answers WHERE key NOT IN "
+                         "(SELECT key FROM answers ORDER BY last_access DESC LIMIT ?)", (self.max_entries,))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answers")
@@ -0,0 +1,52 @@
+# clients.py
+"""
+Process-wide OpenAI handles, built on first use.
+
+The coordinator, FinalQueryAgent and every FilingParserAgent used to construct their own
+OpenAIEmbedding/OpenAI (each with its own HTTP client), and importing any of them pulled the
+llama_index OpenAI integrations in up front. These return one shared instance per model and
+only import llama_index when one is actually asked for.
+"""
+import os
+import threading
+from typing import Optional
+
+DEFAULT_LLM = "gpt-4-turbo"
+DEFAULT_EMBED_MODEL = "text-embedding-3-large"
+
+_lock = threading.Lock()
+_instances = {}
+
+
+def _shared(key, build):
+    with _lock:
+        if key not in _instances:
+            _instances[key] = build()
+        return _instances[key]
+
+
+def get_llm(model: str = DEFAULT_LLM, temperature: float = 0):
+    """Shared llama_index OpenAI LLM. Call install_llama_callbacks() first so it is traced."""
+    def build():
+        from llama_index.llms.openai import OpenAI
+        from llama_index.core.settings import Settings
+        return OpenAI(model=model, temperature=temperature, callback_manager=Settings.callback_manager)
+    return _shared(("llm", model, temperature), build)
+
+
+def get_embed_model(model: str = DEFAULT_EMBED_MODEL, dimensions: Optional[int] = None):
+    """
+    Shared OpenAIEmbedding; also installed as Settings.embed_model the first time it is built.
+    dimensions (default EMBED_DIMENSIONS) asks the API for shortened vectors, see vector_codec.py.
+    """
+    if dimensions is None and os.getenv("EMBED_DIMENSIONS"):
+        dimensions = int(os.getenv("EMBED_DIMENSIONS"))
+
+    def build():
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        from llama_index.core.settings import Settings
+        embed = OpenAIEmbedding(model=model, dimensions=dimensions, callback_manager=Settings.callback_manager)
+        Settings.embed_model = embed
+        return embed
+    return _shared(("embed", model, dimensions), build)
+
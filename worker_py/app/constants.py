@@ -0,0 +1,10 @@
+# constants.py
+"""
+Versions shared by the ingestion and query paths. Kept free of imports so the coordinator can
+compare catalog rows against them without loading the parser (FilingParserAgent) or llama_index.
+"""
+
+# Bump whenever parsing/chunking output changes; filings embedded under an older version are re-ingested.
+#   2: tables chunked on row boundaries with repeated headers (TableNodeParser)
+#   3: compact table markdown (table_format.py); cell strings joined with spaces
+PARSE_VERSION = 3
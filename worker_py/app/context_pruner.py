@@ -0,0 +1,209 @@
+# context_pruner.py
+"""
+Cut reranked table nodes down to what the question asks about before they reach TreeSummarize.
+
+A reranked table chunk is typically 20-40 line items over three years, of which a question like
+"What was Apple's net income in 2022?" needs one row and one column; the rest is prompt tokens
+the summarizer reads (and, past its context window, an extra tree level). prune_nodes keeps:
+
+  - rows whose label matches a line item in the question, synonyms included ("revenue" also
+    keeps "Net sales" / "Total net revenues"), plus the group heading above a kept row
+    ("Operating expenses:")
+  - columns whose header mentions a requested year (with the prior year for growth questions and
+    every year of a "2019 to 2021" range), plus the label column and columns without a year
+  - every header, unit and caption line ("(in millions)"), always
+
+A table with no matching row, or no requested year among its columns, is left whole for that
+axis: the reranker picked it for a reason the keywords don't see. Pruned nodes keep their id and
+metadata (filename, section, footnote), so citations and grounding still name the original table.
+"""
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+from table_chunker import SEPARATOR_RE, split_table, header_periods
+from grounding import extract_numbers, YEAR_RE
+
+# one group per line item; a question mentioning any phrase keeps rows matching any of them
+SYNONYMS = [
+    ("revenue", "revenues", "net sales", "sales", "total net sales", "net revenues", "turnover"),
+    ("net income", "net earnings", "net profit", "net loss"),
+    ("operating income", "income from operations", "operating profit", "operating loss"),
+    ("gross margin", "gross profit"),
+    ("cost of sales", "cost of revenue", "cost of revenues", "cost of goods sold", "cogs"),
+    ("operating expenses", "total operating expenses", "opex"),
+    ("research and development", "r&d"),
+    ("selling, general and administrative", "sg&a", "general and administrative"),
+    ("earnings per share", "eps", "per share"),
+    ("income taxes", "provision for income taxes", "tax expense", "effective tax rate"),
+    ("cash and cash equivalents", "cash", "cash equivalents"),
+    ("operating activities", "operating cash flow", "cash generated by operating activities",
+     "cash provided by operating activities", "free cash flow"),
+    ("capital expenditures", "capex", "purchases of property and equipment",
+     "payments for acquisition of property, plant and equipment", "free cash flow"),
+    ("total assets", "assets"),
+    ("total liabilities", "liabilities"),
+    ("shareholders' equity", "stockholders' equity", "shareholders’ equity", "stockholders’ equity",
+     "equity", "book value"),
+    ("long-term debt", "debt", "term debt", "borrowings", "notes payable", "commercial paper"),
+    ("inventories", "inventory"),
+    ("accounts receivable", "receivables"),
+    ("accounts payable", "payables"),
+    ("depreciation and amortization", "depreciation", "amortization", "ebitda"),
+    ("share-based compensation", "stock-based compensation"),
+    ("dividends", "dividends paid", "dividends declared"),
+    ("repurchases of common stock", "share repurchases", "buybacks", "repurchased"),
+    ("deferred revenue", "unearned revenue"),
+    ("retained earnings", "accumulated deficit"),
+]
+# question words that don't name a line item
+STOPWORDS = set("""
+a an and are as at be by compare compared comparison did do does during each for from give had has
+have how in is it its last me much of on or over per please provide report reported show tell than
+that the their them these this those to total versus vs was were what which while who with year years
+fiscal quarter quarterly annual annually q1 q2 q3 q4 fy 10-k 10-q form filing filings company companies
+million millions billion billions thousand thousands amount value figure figures number numbers data
+change changed growth grow grew increase increased decrease decreased trend between
+about describe explain discuss list summary summarize overview latest recent most based using
+""".split())
+GROWTH_RE = re.compile(r"\b(growth|grow|grew|change|changed|increase|increased|decrease|decreased|"
+                       r"yoy|year[- ]over[- ]year|compared|versus|vs\.?|trend)\b", re.IGNORECASE)
+RANGE_RE = re.compile(r"\b((?:19|20)\d{2})\s*(?:-|–|—|to|through|until)\s*((?:19|20)\d{2})\b", re.IGNORECASE)
+WORD_RE = re.compile(r"[a-z][a-z&'’\-]+")
+
+
+def _words(text: str) -> List[str]:
+    """Lowercase words, possessives and plural "s" dropped, so "Apple's revenues" ~ "apple revenue"."""
+    text = re.sub(r"['’]s\b", " ", text.lower())
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in WORD_RE.findall(text)]
+
+
+def _has_phrase(words: List[str], phrase: Tuple[str, ...]) -> bool:
+    n = len(phrase)
+    return any(tuple(words[i:i + n]) == phrase for i in range(len(words) - n + 1))
+
+
+class Focus:
+    """Line-item phrases and years a question asks about (see query_focus)."""
+
+    def __init__(self, phrases: Iterable[Tuple[str, ...]], years: Iterable[str]) -> None:
+        self.phrases = [p for p in dict.fromkeys(phrases) if p]
+        self.years: Set[str] = set(years)
+
+    def matches(self, label: str) -> bool:
+        words = _words(label)
+        return any(_has_phrase(words, p) for p in self.phrases)
+
+    def __repr__(self) -> str:
+        return f"Focus(phrases={[' '.join(p) for p in self.phrases]}, years={sorted(self.years)})"
+
+
+def query_focus(question: str) -> Focus:
+    """
+    Phrases: every synonym of each line item the question names, plus its remaining content words
+    ("iPhone", "Greater China"). Years: those mentioned, ranges filled in, and the year before each
+    for growth/comparison questions.
+    """
+    words = _words(question)
+    phrases, used = [], set()
+    for group in SYNONYMS:
+        forms = [tuple(_words(p)) for p in group]
+        hits = [f for f in forms if f and _has_phrase(words, f)]
+        if hits:
+            phrases.extend(forms)
+            used.update(w for f in hits for w in f)
+    stop = set(_words(" ".join(STOPWORDS)))
+    phrases.extend((w,) for w in words if w not in used and w not in stop and len(w) > 2)
+
+    years = set(YEAR_RE.findall(question))
+    for a, b in RANGE_RE.findall(question):
+        lo, hi = sorted((int(a), int(b)))
+        if hi - lo <= 20:
+            years.update(str(y) for y in range(lo, hi + 1))
+    if years and GROWTH_RE.search(question):
+        years.update(str(int(y) - 1) for y in list(years))
+    return Focus(phrases, years)
+
+
+def _cells(line: str) -> List[str]:
+    return [c.strip() for c in line.strip().strip("|").split("|")]
+
+
+def _row(cells: List[str]) -> str:
+    return "| " + " | ".join(cells) + " |"
+
+
+def prune_table(text: str, focus: Focus) -> Optional[str]:
+    """The markdown table `text` cut to `focus`, or None when nothing would be dropped."""
+    preamble, header, rows = split_table(text)
+    if not rows or not header:
+        return None
+
+    keep_rows = list(range(len(rows)))
+    if focus.phrases:
+        matched = [i for i, r in enumerate(rows) if focus.matches(_cells(r)[0])]
+        if matched:
+            keep = set(matched)
+            for i in matched:
+                # the heading row above ("Operating expenses:") says what the item is part of,
+                # unless a "Total ..." row closes that group first
+                for j in range(i - 1, -1, -1):
+                    if _cells(rows[j])[0].lower().startswith("total"):
+                        break
+                    if not extract_numbers(rows[j]):
+                        keep.add(j)
+                        break
+            keep_rows = sorted(keep)
+
+    width = len(_cells(header[0]))
+    keep_cols = list(range(width))
+    if focus.years:
+        col_years = [set() for _ in range(width)]
+        for line in header:
+            for j, cell in enumerate(_cells(line)[:width]):
+                col_years[j].update(YEAR_RE.findall(cell))
+        wanted = [j for j in range(1, width) if col_years[j] & focus.years]
+        if wanted:
+            keep_cols = [j for j in range(width) if j == 0 or j in wanted or not col_years[j]]
+
+    if len(keep_rows) == len(rows) and len(keep_cols) == width:
+        return None
+
+    def cut(line: str) -> str:
+        if SEPARATOR_RE.match(line.strip()):
+            return "|" + "---|" * len(keep_cols)
+        cells = _cells(line)
+        if len(cells) != width:
+            return line  # not on the table grid (captions, ragged rows): keep as is
+        return _row([cells[j] for j in keep_cols])
+
+    lines = preamble + [cut(l) for l in header] + [cut(rows[i]) for i in keep_rows]
+    return "\n".join(lines)
+
+
+def prune_nodes(nodes: List, question: str) -> Tuple[List, dict]:
+    """
+    NodeWithScore list with each table node cut to the question (see prune_table); narrative nodes
+    and tables that wouldn't shrink pass through untouched. Returns (nodes, {"chars_in", "chars_out", "pruned"}).
+    """
+    focus = query_focus(question or "")
+    out, stats = [], {"chars_in": 0, "chars_out": 0, "pruned": 0}
+    for nws in nodes:
+        node = nws.node
+        text = node.get_content()
+        stats["chars_in"] += len(text)
+        pruned = prune_table(text, focus) if node.metadata.get("type") == "table" else None
+        if pruned is None:
+            out.append(nws)
+            stats["chars_out"] += len(text)
+            continue
+        copy = node.model_copy()
+        copy.set_content(pruned)
+        years, _ = header_periods(split_table(pruned)[1])
+        if years:
+            copy.metadata = {**node.metadata, "periods": ", ".join(years)}
+        out.append(type(nws)(node=copy, score=nws.score))
+        stats["chars_out"] += len(pruned)
+        stats["pruned"] += 1
+    return out, stats
@@ -0,0 +1,294 @@
+# filing_catalog.py
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS filings (
+    accession_no     TEXT PRIMARY KEY,
+    cik              TEXT,
+    ticker           TEXT,
+    shard            TEXT,
+    form_type        TEXT,
+    fiscal_period    TEXT,
+    period_of_report TEXT,
+    filed_at         TEXT,
+    path             TEXT,
+    content_hash     TEXT,
+    parse_version    INTEGER,
+    embed_status     TEXT NOT NULL DEFAULT 'pending',
+    node_ids         TEXT,
+    updated_at       REAL,
+    last_access      REAL,
+    access_count     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS filings_by_period ON filings (cik, form_type, fiscal_period);
+
+-- which filings answered a (company, form, requested period) lookup, so the search can be skipped next time
+CREATE TABLE IF NOT EXISTS requests (
+    cik           TEXT NOT NULL,
+    form_type     TEXT NOT NULL,
+    fiscal_period TEXT NOT NULL,
+    accession_no  TEXT NOT NULL,
+    PRIMARY KEY (cik, form_type, fiscal_period, accession_no)
+);
+
+-- queries per company, for retention (see retention.py); per-filing access is on filings
+CREATE TABLE IF NOT EXISTS cik_access (
+    cik           TEXT PRIMARY KEY,
+    last_access   REAL,
+    access_count  INTEGER NOT NULL DEFAULT 0
+);
+
+-- speculative ingestion queue (see prefetch.py): status queued, done (embedded by the prefetch), present
+-- (already embedded when drained) or failed; hits counts later requests served by a done entry
+CREATE TABLE IF NOT EXISTS prefetch (
+    cik           TEXT NOT NULL,
+    ticker        TEXT,
+    form_type     TEXT NOT NULL,
+    fiscal_period TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'queued',
+    queued_at     REAL,
+    done_at       REAL,
+    hits          INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (cik, form_type, fiscal_period)
+);
+"""
+# columns added after the first release: (name, definition) for catalogs created before them
+ADDED_COLUMNS = [
+    ("last_access", "REAL"),
+    ("access_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("shard", "TEXT"),  # index shard the nodes were committed to (shard_store.shard_key of the ingest identifier)
+]
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def normalize_cik(cik) -> str:
+    s = str(cik or "").strip()
+    return str(int(s)) if s.isdigit() else s.upper()
+
+
+def normalize_period(period: str) -> str:
+    return " ".join(str(period or "").upper().split())
+
+
+class FilingCatalog:
+    """
+    Durable SQLite record of every filing the worker has seen, keyed by accession number:
+    CIK, form, fiscal period, filed-at date, local path, content hash, parse version,
+    embedding status and the node ids it produced. Shared by all worker processes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            conn.executescript(SCHEMA)
+            have = {r["name"] for r in conn.execute("PRAGMA table_info(filings)")}
+            for name, definition in ADDED_COLUMNS:
+                if name not in have:
+                    conn.execute(f"ALTER TABLE filings ADD COLUMN {name} {definition}")
+
+    @contextmanager
+    def _connect(self):
+        # one short-lived connection per operation keeps this safe across threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # -------------------------------
+    # Lookups
+    # -------------------------------
+    def get(self, accession_no: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM filings WHERE accession_no = ?", (accession_no,)).fetchone()
+        return self._row(row)
+
+    def is_embedded(self, accession_no: str, parse_version: int) -> bool:
+        """True if the filing's nodes are in the index and were produced by the current parse version."""
+        row = self.get(accession_no)
+        return bool(row) and row["embed_status"] == "embedded" and row["parse_version"] == parse_version
+
+    def embedded_for_request(self, cik, form_type: str, fiscal_period: str, parse_version: int) -> List[Dict]:
+        """
+        Filings previously linked to this (company, form, period) request, if every one of them is
+        still embedded under the current parse version; otherwise [] (the request must be redone).
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                """SELECT f.* FROM requests r JOIN filings f ON f.accession_no = r.accession_no
+                   WHERE r.cik = ? AND r.form_type = ? AND r.fiscal_period = ?""",
+                (normalize_cik(cik), form_type.upper(), normalize_period(fiscal_period)),
+            ).fetchall()
+        rows = [self._row(r) for r in rows]
+        if not rows or any(r["embed_status"] != "embedded" or r["parse_version"] != parse_version for r in rows):
+            return []
+        return rows
+
+    def node_owners(self) -> Dict[str, str]:
+        """node id -> CIK for every embedded filing (used to split a pre-shard index by company)."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT cik, node_ids FROM filings WHERE node_ids IS NOT NULL").fetchall()
+        owners = {}
+        for row in rows:
+            for node_id in json.loads(row["node_ids"] or "[]"):
+                owners[node_id] = row["cik"]
+        return owners
+
+    # -------------------------------
+    # Updates
+    # -------------------------------
+    def upsert(self, accession_no: str, **fields) -> None:
+        fields = {k: v for k, v in fields.items() if v is not None}
+        if "cik" in fields:
+            fields["cik"] = normalize_cik(fields["cik"])
+        if "fiscal_period" in fields:
+            fields["fiscal_period"] = normalize_period(fields["fiscal_period"])
+        if "node_ids" in fields and not isinstance(fields["node_ids"], str):
+            fields["node_ids"] = json.dumps(list(fields["node_ids"]))
+        fields["updated_at"] = time.time()
+        cols = ", ".join(fields)
+        marks = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{k} = excluded.{k}" for k in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO filings (accession_no, {cols}) VALUES (?, {marks}) "
+                f"ON CONFLICT(accession_no) DO UPDATE SET {updates}",
+                (accession_no, *fields.values()),
+            )
+
+    def mark_embedded(self, accession_no: str, node_ids: Iterable[str], parse_version: int) -> None:
+        self.upsert(accession_no, embed_status="embedded", node_ids=list(node_ids), parse_version=parse_version)
+
+    def link_request(self, cik, form_type: str, fiscal_period: str, accession_nos: Iterable[str]) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO requests (cik, form_type, fiscal_period, accession_no) VALUES (?, ?, ?, ?)",
+                [(normalize_cik(cik), form_type.upper(), normalize_period(fiscal_period), a) for a in accession_nos],
+            )
+
+    # -------------------------------
+    # Access tracking / retention
+    # -------------------------------
+    def touch(self, accession_nos: Iterable[str]) -> None:
+        """Record that these filings served a request (LRU/LFU order for retention.py)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE filings SET last_access = ?, access_count = access_count + 1 WHERE accession_no = ?",
+                [(now, a) for a in dict.fromkeys(accession_nos)],
+            )
+
+    def touch_ciks(self, ciks: Iterable) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT INTO cik_access (cik, last_access, access_count) VALUES (?, ?, 1)
+                   ON CONFLICT(cik) DO UPDATE SET last_access = excluded.last_access, access_count = access_count + 1""",
+                [(c, now) for c in dict.fromkeys(normalize_cik(c) for c in ciks if c)],
+            )
+
+    def retention_rows(self) -> List[Dict]:
+        """Every filing with its access stats and its company's (cik_last_access, cik_access_count)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """SELECT f.*, c.last_access AS cik_last_access, COALESCE(c.access_count, 0) AS cik_access_count
+                   FROM filings f LEFT JOIN cik_access c ON c.cik = f.cik"""
+            ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def mark_evicted(self, accession_no: str) -> None:
+        """The filing's nodes were dropped from the index; the next request for it re-ingests."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE filings SET embed_status = 'evicted', node_ids = NULL, updated_at = ? WHERE accession_no = ?",
+                (time.time(), accession_no),
+            )
+
+    def vacuum(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+    # -------------------------------
+    # Prefetch queue
+    # -------------------------------
+    def queue_prefetch(self, cik, ticker: str, form_type: str, fiscal_period: str) -> bool:
+        """Queue a speculative ingestion; False if it is already queued, done or failed."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO prefetch (cik, ticker, form_type, fiscal_period, queued_at) VALUES (?, ?, ?, ?, ?)",
+                (normalize_cik(cik), ticker, form_type.upper(), normalize_period(fiscal_period), time.time()),
+            )
+            return cur.rowcount > 0
+
+    def next_prefetch(self, limit: int) -> List[Dict]:
+        # newest first: the most recent queries are the best predictor of the next ones
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM prefetch WHERE status = 'queued' ORDER BY queued_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def finish_prefetch(self, cik, form_type: str, fiscal_period: str, status: str) -> None:
+        """status: "done" (the prefetch embedded it), "present" (already embedded) or "failed"."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE prefetch SET status = ?, done_at = ? WHERE cik = ? AND form_type = ? AND fiscal_period = ?",
+                (status, time.time(), normalize_cik(cik), form_type.upper(), normalize_period(fiscal_period)),
+            )
+
+    def record_prefetch_hit(self, cik, form_type: str, fiscal_period: str) -> bool:
+        """Called when a request is served from the catalog; True if a prefetch (status "done") embedded it."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE prefetch SET hits = hits + 1 WHERE cik = ? AND form_type = ? AND fiscal_period = ? AND status = 'done'",
+                (normalize_cik(cik), form_type.upper(), normalize_period(fiscal_period)),
+            )
+            return cur.rowcount > 0
+
+    def prefetch_stats(self) -> Dict:
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM prefetch GROUP BY status").fetchall())
+            used, hits = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM prefetch WHERE status = 'done' AND hits > 0"
+            ).fetchone()
+        done = counts.get("done", 0)
+        return {
+            "queued": counts.get("queued", 0),
+            "done": done,
+            "present": counts.get("present", 0),  # already embedded when drained: not the prefetch's doing
+            "failed": counts.get("failed", 0),
+            "used": used,            # prefetched entries a later request actually needed
+            "hits": hits,            # requests served by a prefetched entry
+            "hit_rate": round(used / done, 3) if done else None,
+        }
+
+    @staticmethod
+    def _row(row) -> Optional[Dict]:
+        if row is None:
+            return None
+        d = dict(row)
+        d["node_ids"] = json.loads(d["node_ids"]) if d.get("node_ids") else []
+        return d
@@ -0,0 +1,214 @@
+# grounding.py
+"""
+Deterministic check that the numbers in an answer come from the retrieved filing text.
+
+Every figure in the answer (with its currency/percent sign and scale word such as "billion") is
+matched against the numbers in the source nodes at the scale each source states: a table's
+"(in millions)" caption, a figure's own scale word, else units (narrative text). Rounding to
+the precision the answer states and sign (a "(1,234)" cell vs "a loss of $1.2 billion") are
+allowed for; a wrong unit is not. A figure that isn't in the sources may still be a difference,
+sum or ratio of two that are; a percent change or share only of two on a row the answer cites. Years mentioned in the answer must appear
+somewhere in the sources. No LLM call, so it can gate every answer.
+"""
+from __future__ import annotations
+
+import re
+from itertools import permutations
+from typing import Dict, Iterable, List, Optional
+
+SCALES = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "mn": 1e6, "m": 1e6, "mm": 1e6,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "trillion": 1e12, "tn": 1e12, "t": 1e12,
+}
+
+# optional sign/paren, optional $, the number, optional scale word or percent
+NUMBER_RE = re.compile(
+    r"(?:(?P<neg>[(\-−])\s?)?(?:(?P<cur>\$)\s?)?"
+    r"(?P<num>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+    r"(?:\s?(?P<pct>%|percent\b)|\s?(?P<scale>thousand|million|billion|trillion|bn|mn|mm|tn|[kmbt])\b)?",
+    re.IGNORECASE,
+)
+# a table's unit caption: "(in millions)", "(Dollars in thousands, except per share amounts)"
+UNITS_RE = re.compile(r"\bin\s+(thousands|millions|billions)\b", re.IGNORECASE)
+UNIT_SCALES = {"thousands": 1e3, "millions": 1e6, "billions": 1e9}
+YEAR_RE = re.compile(r"\b(?:FY\s?)?((?:19|20)\d{2})\b")
+# numbers that are labels, not figures: "Note 7", "Item 7A", "10-K", "Q2", "fiscal 2022"
+LABEL_BEFORE_RE = re.compile(r"(?:note|item|part|section|page|footnote|q|fy)\s*$", re.IGNORECASE)
+LABEL_AFTER_RE = re.compile(r"^-?[KQ]\b|^[A-Z]\b")
+
+
+def extract_numbers(text: str, *, skip_years: bool = True) -> List[Dict]:
+    """
+    Figures in `text`: {"raw", "value" (unscaled), "scale", "decimals", "percent", "currency"}.
+    Bare years, small bare counts (< 100) and labels like "Note 7" or "10-K" are skipped.
+    """
+    out = []
+    for m in NUMBER_RE.finditer(text or ""):
+        before = text[max(0, m.start() - 12):m.start()]
+        after = text[m.end():m.end() + 3]
+        if LABEL_BEFORE_RE.search(before) or (not m.group("pct") and LABEL_AFTER_RE.match(after)):
+            continue
+        if before[-1:].isalnum() or before[-1:] in (".", "/"):
+            continue  # inside a token (ids, dates, file names)
+        num = m.group("num")
+        value = float(num.replace(",", ""))
+        decimals = len(num.split(".")[1]) if "." in num else 0
+        percent = bool(m.group("pct"))
+        scale_word = (m.group("scale") or "").lower()
+        currency = bool(m.group("cur"))
+        bare = not (percent or scale_word or currency or "," in num or decimals)
+        if bare and skip_years and 1900 <= value <= 2100:
+            continue
+        if bare and value < 100:
+            continue
+        out.append({
+            "raw": m.group(0).strip(),
+            "value": value,
+            "scale": SCALES.get(scale_word, 1.0),
+            "decimals": decimals,
+            "percent": percent,
+            "currency": currency,
+        })
+    return out
+
+
+def table_scale(text: str) -> float:
+    """
+    What a table's figures are stated in, from the "(in millions)" caption or header above its first
+    data row (TableNodeParser repeats it in every chunk); 1.0 for narrative text and unlabelled tables.
+    """
+    lines = (text or "").splitlines()
+    if not any(l.lstrip().startswith("|") for l in lines):
+        return 1.0
+    for line in lines:
+        if line.lstrip().startswith("|") and extract_numbers(line):
+            break
+        m = UNITS_RE.search(line)
+        if m:
+            return UNIT_SCALES[m.group(1).lower()]
+    return 1.0
+
+
+def _amounts(n: Dict, scale: float) -> List[float]:
+    """A source figure in dollars (or units): its own scale word, else the table's scale."""
+    value = abs(n["value"])
+    if n["scale"] != 1.0:
+        return [value * n["scale"]]
+    if scale != 1.0 and n["decimals"] and value < 1000:
+        # "(in millions, except per share amounts)": per-share figures and ratios are unscaled
+        return [value * scale, value]
+    return [value * scale]
+
+
+def _rows(sources: Iterable[str]) -> List[tuple]:
+    """(label, [amount...], [raw value...]) per line of every source; label is a table row's first cell."""
+    rows = []
+    for text in sources:
+        scale = table_scale(text)
+        for line in text.splitlines():
+            numbers = [n for n in extract_numbers(line, skip_years=False) if not n["percent"]]
+            if not numbers:
+                continue
+            label = ""
+            if line.lstrip().startswith("|"):
+                label = line.strip().strip("|").split("|")[0].strip().lower().rstrip(":")
+                label = re.sub(r"^total\s+", "", label)
+            rows.append((label, [a for n in numbers for a in _amounts(n, scale)], [abs(n["value"]) for n in numbers]))
+    return rows
+
+
+def _pairs(values_per_row: Iterable[List[float]], limit: int = 20_000) -> List[tuple]:
+    """(a, b) pairs of numbers on the same row, e.g. this year's and last year's column."""
+    pairs = []
+    for values in values_per_row:
+        pairs.extend(permutations(values, 2))
+        if len(pairs) >= limit:
+            return pairs[:limit]
+    return pairs
+
+
+def _combinations(pairs: Iterable[tuple], percent: bool) -> List[float]:
+    combos = []
+    for a, b in pairs:
+        if percent:
+            if b:
+                combos += [a / b * 100, abs(a - b) / b * 100]
+        else:
+            combos += [abs(a - b), a + b] + ([a / b] if b else [])
+    return combos
+
+
+def _matches(target: float, tolerance: float, candidates: Iterable[float]) -> bool:
+    return any(abs(c - target) <= tolerance for c in candidates)
+
+
+def check_grounding(answer: str, sources: Iterable[str]) -> Dict:
+    """
+    Returns {"passing", "checked", "grounded", "derived", "unsupported": [raw...], "missing_periods": [year...]}.
+    An answer with no figures passes (there is nothing to contradict).
+    """
+    sources = [s for s in sources if s]
+    source_text = "\n".join(sources)
+    rows = _rows(sources)
+    amounts = sorted({a for _, row, _ in rows for a in row})
+    # percentages are compared as stated: "44.1%" against a "44.1" or "44.1%" cell
+    percents = sorted({abs(n["value"]) for s in sources for n in extract_numbers(s, skip_years=False)})
+
+    grounded, derived, unsupported, pending = [], [], [], []
+    for n in extract_numbers(answer):
+        if n["percent"]:
+            target = abs(n["value"])
+            tolerance = 0.5 * 10 ** (-n["decimals"]) * 1.0001
+        else:
+            target = abs(n["value"]) * n["scale"]
+            # rounding: "99.8 billion" covers anything that rounds to it at one decimal
+            tolerance = 0.5 * 10 ** (-n["decimals"]) * n["scale"] * 1.0001
+        if _matches(target, tolerance, percents if n["percent"] else amounts):
+            grounded.append((n, target, tolerance))
+        else:
+            pending.append((n, target, tolerance))
+
+    if pending:
+        # figures computed from two grounded ones or two cells on the same row: differences, sums,
+        # ratios; percent changes and shares only from rows the answer talks about (by label, or
+        # because one of its figures came from there), not from every pair in the sources
+        stated = [t for n, t, _ in grounded if not n["percent"]]
+        text = (answer or "").lower()
+        cited = [row for label, row, _ in rows
+                 if (len(label) >= 4 and label in text)
+                 or any(_matches(t, tol, row) for n, t, tol in grounded if not n["percent"])]
+        amount_combos = _combinations(permutations(stated, 2), percent=False)
+        amount_combos += _combinations(_pairs(row for _, row, _ in rows), percent=False)
+        percent_combos = _combinations(permutations(stated, 2), percent=True)
+        percent_combos += _combinations(_pairs(cited), percent=True)
+    for n, target, tolerance in pending:
+        if _matches(target, tolerance, percent_combos if n["percent"] else amount_combos):
+            derived.append(n)
+        else:
+            unsupported.append(n["raw"])
+
+    missing_periods = sorted({y for y in YEAR_RE.findall(answer or "") if y not in source_text})
+    return {
+        "passing": not unsupported and not missing_periods,
+        "checked": len(grounded) + len(pending),
+        "grounded": len(grounded),
+        "derived": len(derived),
+        "unsupported": unsupported,
+        "missing_periods": missing_periods,
+    }
+
+
+def node_texts(source_nodes: Optional[Iterable]) -> List[str]:
+    """Content plus metadata (filing date, section, period headers) of retrieved nodes."""
+    texts = []
+    for sn in source_nodes or []:
+        node = getattr(sn, "node", sn)
+        try:
+            texts.append(node.get_content())
+        except Exception:
+            texts.append(getattr(node, "text", "") or "")
+        meta = getattr(node, "metadata", None) or {}
+        texts.append(" ".join(str(v) for v in meta.values()))
+    return texts
@@ -8,6 +8,7 @@ import logging
 from typing import Dict, List, Iterable, Optional, Tuple
 
 import requests
+from tracing import span
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
@@ -20,11 +21,14 @@ class SECFetchHTM:
       - search_filings(ticker, form_type, start_date, end_date, from_index="0", size="1", sort_order="desc") -> dict
       - get_latest_filing(ticker, form_type, start_date, end_date) -> str (local file path)
       - get_filing_list(ticker, form_type, start_date, end_date) -> list[str] (local file paths)
+      - download_record(ticker, form_type, filing) -> str | None (local file path for one search hit)
+      - search_by_period(ticker, form_type, period_start, period_end, size=...) -> list[dict] (search hits only)
       - download_filing(filing_url, filename) -> str (local file path)
     """
 
-    BASE_API_URL = "https://api.sec-api.io"
-    SEC_BASE_URL = "https://www.sec.gov"
+    # env overrides let load tests point at local stand-ins (worker_py/loadtest/fake_services.py)
+    BASE_API_URL = os.getenv("SEC_API_URL", "https://api.sec-api.io")
+    SEC_BASE_URL = os.getenv("SEC_BASE_URL", "https://www.sec.gov")
 
     _ALLOWED_FORMS = {"10-K", "10-Q"}
 
@@ -91,22 +95,37 @@ class SECFetchHTM:
         Now accepts ticker OR CIK in the 'ticker' parameter.
         If numeric → query by cik:, else → ticker:
         """
-        ident = str(ticker).strip()
-        if ident.isdigit():
-            q_id = f"cik:{int(ident)}"
-        else:
-            q_id = f"ticker:{ident.upper()}"
-
         payload = {
-            "query": f'{q_id} AND formType:"{form_type}" AND filedAt:[{start_date} TO {end_date}]',
+            "query": f'{self._query_id(ticker)} AND formType:"{form_type}" AND filedAt:[{start_date} TO {end_date}]',
             "from": from_index,
             "size": size,
             "sort": [{ "filedAt": { "order": sort_order } }]
         }
-        resp = self.session.post(self.BASE_API_URL, json=payload, timeout=self.timeout)
-        self._raise_for_status(resp)
+        with span("search") as s:
+            resp = self.session.post(self.BASE_API_URL, json=payload, timeout=self.timeout)
+            self._raise_for_status(resp)
+            s["bytes"] = len(resp.content)
         return resp.json()
 
+    def search_by_period(self, ticker: str, form_type: str, period_start: str, period_end: str,
+                         *, size: int = 10) -> List[Dict]:
+        """
+        Filings whose periodOfReport (the fiscal period end date) falls in [period_start, period_end],
+        latest period first. Nothing is downloaded, so callers can pick the exact document first.
+        """
+        payload = {
+            "query": (f'{self._query_id(ticker)} AND formType:"{self._validate_form(form_type)}" '
+                      f'AND periodOfReport:[{period_start} TO {period_end}]'),
+            "from": "0",
+            "size": str(size),
+            "sort": [{ "periodOfReport": { "order": "desc" } }]
+        }
+        with span("search") as s:
+            resp = self.session.post(self.BASE_API_URL, json=payload, timeout=self.timeout)
+            self._raise_for_status(resp)
+            s["bytes"] = len(resp.content)
+        return resp.json().get("filings", []) or []
+
     def download_filing(self, filing_url: str, filename: str) -> str:
         """
         Download a filing (HTML) and save to `download_folder/filename`.
@@ -121,8 +140,10 @@ class SECFetchHTM:
             return file_path
 
         self.log.debug("GET %s -> %s", url, file_path)
-        resp = self.session.get(url, timeout=self.timeout)
-        self._raise_for_status(resp)
+        with span("download") as s:
+            resp = self.session.get(url, timeout=self.timeout)
+            self._raise_for_status(resp)
+            s["bytes"] = len(resp.content)
 
         with open(file_path, "wb") as f:
             f.write(resp.content)
@@ -155,15 +176,23 @@ class SECFetchHTM:
         """
         paths: List[str] = []
         for filing in self.iter_filings(ticker, form_type, start_date, end_date, batch_size=batch_size):
-            filing_url = filing.get("linkToFilingDetails")
-            if not filing_url:
-                continue
-            filing_date = filing.get("filedAt", "unknown_date")
-            filename = self._default_filename(ticker, form_type, filing_date)
-            path = self.download_filing(filing_url, filename)
-            paths.append(path)
+            path = self.download_record(ticker, form_type, filing)
+            if path:
+                paths.append(path)
         return paths
 
+    def download_record(self, ticker: str, form_type: str, filing: Dict) -> Optional[str]:
+        """
+        Download one filing dict as returned by iter_filings/search_filings.
+        Returns the local path, or None if the search hit has no document link.
+        """
+        filing_url = filing.get("linkToFilingDetails")
+        if not filing_url:
+            return None
+        filing_date = filing.get("filedAt", "unknown_date")
+        filename = self._default_filename(ticker, form_type, filing_date)
+        return self.download_filing(filing_url, filename)
+
 
     def iter_filings(
         self, ticker: str, form_type: str, start_date: str, end_date: str, *, batch_size: int = 100
@@ -209,6 +238,14 @@ class SECFetchHTM:
         name = re.sub(r"_{2,}", "_", name)
         return name[:255]  # filesystem-friendly
 
+    @staticmethod
+    def _query_id(ticker: str) -> str:
+        # accepts ticker OR CIK: numeric -> cik:, else -> ticker:
+        ident = str(ticker).strip()
+        if ident.isdigit():
+            return f"cik:{int(ident)}"
+        return f"ticker:{ident.upper()}"
+
     @staticmethod
     def _normalize_ticker(ticker: str) -> str:
         if not ticker or not isinstance(ticker, str):
@@ -0,0 +1,271 @@
+# index_store.py
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+from answer_cache import index_version
+from tracing import span
+
+if TYPE_CHECKING:
+    from llama_index.core import StorageContext, VectorStoreIndex
+    from vector_codec import VectorCodec
+
+try:
+    import fcntl  # POSIX only
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class SnapshotStore:
+    """
+    Versioned, single-writer layout for the persisted vector index:
+
+        store10k10q/
+          CURRENT              -> name of the live snapshot, swapped atomically (os.replace)
+          snapshots/v000001/   -> immutable llama_index persist dirs
+          snapshots/v000002/
+          .writer.lock         -> flock held by whoever is committing
+
+    Readers load whatever CURRENT points at and keep serving from it; they call
+    `current_version()` to notice a newer snapshot and reload. Writers embed their nodes
+    outside the lock, then under it load the latest snapshot, insert, persist to a fresh
+    directory and flip CURRENT, so concurrent writers never drop each other's nodes and
+    readers never see a half-written store.
+
+    A pre-existing flat store (docstore.json etc. directly in `root`) is read as the base
+    for the first commit.
+
+    Vectors are kept in a QuantizedVectorStore with `codec` (see vector_codec.py; default float32);
+    an existing snapshot is read with the codec it was written with until recode() rewrites it.
+    llama_index and the codec are only imported once a snapshot is loaded or written, so
+    current_version() (the answer cache's check) stays cheap.
+
+    evict() drops nodes (retention.py); llama_index keeps their ids in the index struct, which
+    compact() rewrites away together with old snapshots and abandoned .tmp-* directories.
+    """
+
+    POINTER = "CURRENT"
+    SNAPSHOTS = "snapshots"
+    LOCK = ".writer.lock"
+
+    def __init__(self, root: str, embed_model=None, index_id: str = "10k10q", keep: int = 3,
+                 min_age_seconds: float = 600.0, codec: Optional[VectorCodec] = None) -> None:
+        self.root = root
+        self.embed_model = embed_model
+        self.codec = codec
+        self.index_id = index_id
+        self.keep = keep
+        # old snapshots are only deleted once they're this old, so a reader mid-load isn't pulled from under
+        self.min_age_seconds = min_age_seconds
+        os.makedirs(os.path.join(self.root, self.SNAPSHOTS), exist_ok=True)
+
+    # -------------------------------
+    # Reading
+    # -------------------------------
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, self.POINTER), "r") as f:
+                return f.read().strip() or None
+        except OSError:
+            if os.path.exists(os.path.join(self.root, "docstore.json")):
+                # a flat store is just the files in root: shards/ and snapshots/ below it are other stores
+                return "legacy-" + index_version(self.root, recursive=False, exclude=(self.POINTER,))
+            return None
+
+    def _snapshot_dir(self, version: Optional[str]) -> Optional[str]:
+        if version is None:
+            return None
+        if version.startswith("legacy-"):
+            return self.root
+        return os.path.join(self.root, self.SNAPSHOTS, version)
+
+    def load(self) -> Tuple[Optional[str], StorageContext, VectorStoreIndex]:
+        """Load the live snapshot (or an empty index if there is none). Returns (version, storage, index)."""
+        from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+        from vector_codec import QuantizedVectorStore
+
+        version = self.current_version()
+        path = self._snapshot_dir(version)
+        if path is not None:
+            vector_store = QuantizedVectorStore.from_persist_dir(path, codec=self.codec)
+            storage_context = StorageContext.from_defaults(persist_dir=path, vector_store=vector_store)
+            index = load_index_from_storage(storage_context, index_id=self.index_id)
+            print(f"Loaded index snapshot {version}")
+            return version, storage_context, index
+        print("No index snapshot found, starting an empty index.")
+        storage_context = StorageContext.from_defaults(vector_store=QuantizedVectorStore(codec=self.codec))
+        index = VectorStoreIndex([], storage_context=storage_context, embed_model=self.embed_model)
+        index.set_index_id(self.index_id)
+        return None, index.storage_context, index
+
+    # -------------------------------
+    # Writing
+    # -------------------------------
+    @contextmanager
+    def write_lock(self):
+        with open(os.path.join(self.root, self.LOCK), "a+") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def commit(self, nodes: List, replace_ids: Optional[List[str]] = None) -> Tuple[str, StorageContext, VectorStoreIndex]:
+        """
+        Add nodes to the latest snapshot and publish the result as a new version.
+        `replace_ids` are node ids to drop in the same snapshot (e.g. a filing being re-parsed).
+        Embeddings are computed before taking the writer lock so the critical section is only
+        load + insert + persist.
+        """
+        missing = [n for n in nodes if n.embedding is None]
+        if missing and self.embed_model is not None:
+            with span("embed", nodes=len(missing)):
+                embeddings = self.embed_model.get_text_embedding_batch(
+                    [n.get_content(metadata_mode="embed") for n in missing]
+                )
+            for node, emb in zip(missing, embeddings):
+                node.embedding = emb
+
+        with span("persist", nodes=len(nodes)), self.write_lock():
+            _, storage_context, index = self.load()
+            stale = [i for i in replace_ids or [] if index.docstore.document_exists(i)]
+            if stale:
+                index.delete_nodes(stale, delete_from_docstore=True)
+            index.insert_nodes(nodes)
+            version = self._publish(storage_context)
+        self._prune()
+        return version, storage_context, index
+
+    def recode(self, codec: VectorCodec) -> dict:
+        """
+        Republish the live snapshot with its vectors in `codec` (vector_codec.py); nodes and
+        metadata are unchanged and nothing is re-embedded. Returns the before/after sizes.
+        """
+        from vector_codec import snapshot_bytes
+
+        with span("recode"), self.write_lock():
+            version, storage_context, _ = self.load()
+            if version is None:
+                return {"version": None}
+            old = storage_context.vector_store
+            new = old.recoded(codec)
+            storage_context.vector_stores["default"] = new
+            before = snapshot_bytes(self._snapshot_dir(version))
+            published = self._publish(storage_context)
+            after = snapshot_bytes(self._snapshot_dir(published))
+        self._prune()
+        return {"version": published, "nodes": new.count, "codec": str(new.codec),
+                "bytes_before": before, "bytes_after": after,
+                "vector_bytes_before": old.count * old.codec.bytes_per_vector(old.dims or 0),
+                "vector_bytes_after": new.count * new.codec.bytes_per_vector(new.dims or 0)}
+
+    def evict(self, node_ids: Iterable[str] = (), filenames: Iterable[str] = ()) -> Tuple[Optional[str], List[str]]:
+        """
+        Drop nodes by id and/or by their "filename" metadata (compared by basename, so "./10k10q/x.htm"
+        matches "10k10q/x.htm"), publishing a new version if anything was removed. Returns (version, removed ids).
+        """
+        names = {os.path.basename(f) for f in filenames if f}
+        with span("evict") as s, self.write_lock():
+            version, storage_context, index = self.load()
+            if version is None:
+                return None, []
+            docstore = storage_context.docstore
+            doomed = {i for i in node_ids if docstore.document_exists(i)}
+            if names:
+                doomed.update(i for i, node in docstore.docs.items()
+                              if os.path.basename(str((node.metadata or {}).get("filename") or "")) in names)
+            s["nodes"] = len(doomed)
+            if not doomed:
+                return version, []
+            index.delete_nodes(sorted(doomed), delete_from_docstore=True)
+            version = self._publish(storage_context)
+        self._prune()
+        return version, sorted(doomed)
+
+    def compact(self, drop_old: bool = False) -> dict:
+        """
+        Republish the live snapshot rebuilt from its live nodes only: no ids of deleted nodes in
+        the index struct, no dangling vector rows. Embeddings are reused, not recomputed.
+        `drop_old` also removes every older snapshot regardless of age; only do that while no
+        reader can be loading one (the offline `retention.py --compact`).
+        """
+        from llama_index.core import StorageContext, VectorStoreIndex
+        from vector_codec import QuantizedVectorStore, VectorCodec, snapshot_bytes
+
+        with span("compact") as s, self.write_lock():
+            version, storage_context, index = self.load()
+            if version is None:
+                return {"version": None}
+            before = snapshot_bytes(self._snapshot_dir(version))
+            old = storage_context.vector_store
+            docstore = storage_context.docstore
+            listed = len(index.index_struct.nodes_dict)
+            live = []
+            for row in old.live_rows():
+                node_id = old.node_id(row)
+                if not docstore.document_exists(node_id):
+                    continue
+                node = docstore.get_node(node_id)
+                node.embedding = old.full_vectors([row])[0].tolist()
+                live.append(node)
+            codec = VectorCodec(dims=old.dims, dtype=old.codec.dtype, rescore=old.codec.rescore)
+            fresh = StorageContext.from_defaults(vector_store=QuantizedVectorStore(codec=codec))
+            rebuilt = VectorStoreIndex(live, storage_context=fresh, embed_model=self.embed_model)
+            rebuilt.set_index_id(self.index_id)
+            published = self._publish(fresh)
+            after = snapshot_bytes(self._snapshot_dir(published))
+            s["nodes"] = len(live)
+        removed = self._prune(keep=1, min_age_seconds=0) if drop_old else self._prune()
+        return {"version": published, "nodes": len(live), "tombstones": listed - len(live),
+                "dropped": len(docstore.docs) - len(live), "bytes_before": before, "bytes_after": after,
+                "snapshots_removed": removed}
+
+    def _next_version(self) -> str:
+        existing = [d for d in os.listdir(os.path.join(self.root, self.SNAPSHOTS)) if d.startswith("v")]
+        latest = max((int(d[1:]) for d in existing if d[1:].isdigit()), default=0)
+        return f"v{latest + 1:06d}"
+
+    def _publish(self, storage_context: StorageContext) -> str:
+        # caller holds the writer lock
+        version = self._next_version()
+        final_dir = os.path.join(self.root, self.SNAPSHOTS, version)
+        tmp_dir = os.path.join(self.root, self.SNAPSHOTS, f".tmp-{version}-{os.getpid()}")
+        storage_context.persist(persist_dir=tmp_dir)
+        os.rename(tmp_dir, final_dir)
+
+        pointer_tmp = os.path.join(self.root, f".{self.POINTER}.{os.getpid()}.tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_tmp, os.path.join(self.root, self.POINTER))
+        print(f"Published index snapshot {version}")
+        return version
+
+    def _prune(self, keep: Optional[int] = None, min_age_seconds: Optional[float] = None) -> int:
+        """Delete old snapshots (and .tmp-* dirs of writers that died mid-persist); returns how many went."""
+        keep = self.keep if keep is None else keep
+        min_age = self.min_age_seconds if min_age_seconds is None else min_age_seconds
+        current = self.current_version()
+        snap_root = os.path.join(self.root, self.SNAPSHOTS)
+        now = time.time()
+
+        def age(name: str) -> float:
+            try:
+                return now - os.path.getmtime(os.path.join(snap_root, name))
+            except OSError:  # renamed or removed by another writer meanwhile
+                return -1.0
+
+        versions = sorted(d for d in os.listdir(snap_root) if d.startswith("v") and d != current)
+        doomed = [d for d in versions[: max(0, len(versions) - (keep - 1))] if age(d) >= min_age]
+        # a .tmp dir is only abandoned once it's older than any persist could take
+        doomed += [d for d in os.listdir(snap_root) if d.startswith(".tmp-") and age(d) >= max(min_age, 3600)]
+        for old in doomed:
+            shutil.rmtree(os.path.join(snap_root, old), ignore_errors=True)
+        return len(doomed)
@@ -0,0 +1,172 @@
+# worker_py/app/ingest_bulk.py
+"""
+Batch pre-ingestion, e.g. a nightly warm-up so interactive queries hit a pre-built index.
+
+    python3 app/ingest_bulk.py --tickers AAPL,MSFT --forms 10-K --years 2020-2023
+    python3 app/ingest_bulk.py --top 500 --forms 10-K 10-Q --years 2022-2023 --workers 4
+
+Progress goes to stderr. Completed (ticker, form, period) jobs are recorded in a checkpoint
+file, so re-running the same command resumes where it stopped.
+"""
+import os, json, sys, argparse, time
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from dotenv import load_dotenv
+
+from InitialQueryAgent import QueryCoordinatorAgent
+from tracing import tracer
+
+
+def parse_years(spec: str):
+    if "-" in spec:
+        start, end = spec.split("-", 1)
+        return list(range(int(start), int(end) + 1))
+    return [int(spec)]
+
+
+def build_jobs(tickers, forms, years):
+    jobs = []
+    for ticker in tickers:
+        for form in forms:
+            for year in years:
+                if form == "10-Q":
+                    # one job per quarter; each resolves to exactly one filing. Q4 is covered by the 10-K
+                    jobs.extend((ticker, form, f"{year} Q{q}") for q in range(1, 4))
+                else:
+                    jobs.append((ticker, form, str(year)))
+    return jobs
+
+
+class Checkpoint:
+    """JSON file of finished job keys, rewritten atomically after every job."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {"done": {}, "failed": {}}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.state = json.load(f)
+
+    @staticmethod
+    def key(job):
+        return "|".join(job)
+
+    def is_done(self, job) -> bool:
+        return self.key(job) in self.state["done"]
+
+    def record(self, job, ok: bool, info) -> None:
+        with self.lock:
+            bucket = "done" if ok else "failed"
+            self.state[bucket][self.key(job)] = info
+            if ok:
+                self.state["failed"].pop(self.key(job), None)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.state, f, indent=1)
+            os.replace(tmp, self.path)
+
+
+def main():
+    env_path = Path(__file__).resolve().parents[1] / ".env"
+    load_dotenv(dotenv_path=env_path, override=True)
+
+    parser = argparse.ArgumentParser(description="Pre-ingest SEC filings into the vector index")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--tickers", help="comma-separated tickers or CIKs")
+    src.add_argument("--tickers-file", help="file with one ticker or CIK per line")
+    src.add_argument("--top", type=int, help="first N companies of SEC's ticker list (largest first)")
+    parser.add_argument("--forms", nargs="+", default=["10-K"], choices=["10-K", "10-Q"])
+    parser.add_argument("--years", required=True, help="fiscal year or range, e.g. 2022 or 2019-2023")
+    parser.add_argument("--workers", type=int, default=4, help="filings ingested in parallel")
+    parser.add_argument("--checkpoint", default="./.ingest_checkpoint.json")
+    parser.add_argument("--retry-failed", action="store_true", help="also re-run jobs that failed last time")
+    args = parser.parse_args()
+
+    SEC_API_KEY = os.getenv("SEC_API_KEY", "")
+    EDGAR_IDENTITY = os.getenv("EDGAR_IDENTITY", "")
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+    if not (SEC_API_KEY and EDGAR_IDENTITY and OPENAI_API_KEY):
+        print("Missing required env vars", file=sys.stderr)
+        sys.exit(1)
+
+    # downstream code prints a lot; progress goes to stderr and the summary to the real stdout
+    real_stdout = sys.stdout
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        summary, failed = ingest(args)
+    print(json.dumps(summary), file=real_stdout)
+    sys.exit(1 if failed else 0)
+
+
+def ingest(args):
+    agent = QueryCoordinatorAgent(
+        sec_api_key=os.getenv("SEC_API_KEY", ""),
+        edgar_identity=os.getenv("EDGAR_IDENTITY", ""),
+        download_folder="./10k10q",
+        persist_dir="./store10k10q",
+        openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+        answer_cache_path=None,
+        prefetch=False
+    )
+
+    if args.tickers:
+        tickers = [t.strip() for t in args.tickers.split(",") if t.strip()]
+    elif args.tickers_file:
+        with open(args.tickers_file, "r") as f:
+            tickers = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    else:
+        tickers = agent.resolver.tickers(limit=args.top)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    jobs = build_jobs(tickers, args.forms, parse_years(args.years))
+    pending = [
+        j for j in jobs
+        if not checkpoint.is_done(j) and (args.retry_failed or Checkpoint.key(j) not in checkpoint.state["failed"])
+    ]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done/failed, {len(pending)} to run "
+          f"with {args.workers} workers", file=sys.stderr)
+
+    def run_job(job):
+        ticker, form, period = job
+        nodes_before = agent.ingest_stats["nodes"]
+        agent.process_filings([{"ticker": ticker, "formType": form, "filing_date_range": period}])
+        return agent.ingest_stats["nodes"] - nodes_before  # approximate when jobs overlap
+
+    started = time.time()
+    finished = failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(run_job, job): job for job in pending}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            try:
+                nodes = fut.result()
+                checkpoint.record(job, True, {"nodes": nodes, "at": time.time()})
+                status = f"ok ({nodes} nodes)"
+            except Exception as e:
+                failed += 1
+                checkpoint.record(job, False, {"error": str(e), "at": time.time()})
+                status = f"FAILED: {e}"
+            finished += 1
+            minutes = max(time.time() - started, 1e-6) / 60
+            print(f"[{finished}/{len(pending)}] {' '.join(job)} {status} | "
+                  f"{agent.ingest_stats['filings'] / minutes:.1f} filings/min, "
+                  f"{agent.ingest_stats['nodes'] / minutes:.0f} nodes/min", file=sys.stderr)
+
+    elapsed = time.time() - started
+    summary = {
+        "jobs": len(pending),
+        "failed": failed,
+        "filings": agent.ingest_stats["filings"],
+        "nodes": agent.ingest_stats["nodes"],
+        "seconds": round(elapsed, 1),
+        "filings_per_min": round(agent.ingest_stats["filings"] / max(elapsed / 60, 1e-6), 2),
+        "nodes_per_min": round(agent.ingest_stats["nodes"] / max(elapsed / 60, 1e-6), 1),
+        "timings": tracer.summary()["stages"],
+    }
+    return summary, failed
+
+
+if __name__ == "__main__":
+    main()
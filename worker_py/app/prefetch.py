@@ -0,0 +1,148 @@
+# worker_py/app/prefetch.py
+"""
+Speculative ingestion of the filings a user is likely to ask about next.
+
+After answering, QueryCoordinatorAgent queues the neighbouring fiscal periods of every
+(company, form, period) it touched (Apple 10-K 2022 -> 2021 and 2023) in the filing catalog.
+There is no fourth-quarter 10-Q, so a 10-Q's neighbours wrap to 10-Ks: Q3 2023 -> 10-K 2023,
+Q1 2023 -> 10-K 2022.
+The queue is drained by this script, which the API launches only while its worker pool is idle
+and stops (SIGTERM) as soon as interactive work arrives:
+
+    python3 app/prefetch.py --budget 4
+    python3 app/prefetch.py --stats
+
+A prefetched filing counts as a hit when a later request is served from it by the catalog; jobs
+whose filing was already embedded when the queue got to them are marked "present" and never count.
+"""
+import os, json, sys, argparse, signal, datetime
+from pathlib import Path
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Tuple
+
+from constants import PARSE_VERSION
+from filing_catalog import FilingCatalog
+
+
+def neighbours(form_type: str, period: str, today: datetime.date = None) -> List[Tuple[str, str]]:
+    """(form, period) of the filings adjacent to a request, skipping ones that can't have been filed yet."""
+    today = today or datetime.date.today()
+    parts = str(period).upper().split()
+    try:
+        year = int(parts[0])
+    except (IndexError, ValueError):
+        return []
+    if form_type.upper() == "10-Q":
+        if len(parts) != 2 or parts[1] not in ("Q1", "Q2", "Q3"):
+            return []
+        q = int(parts[1][1])
+        out = []
+        for n in (q - 1, q + 1):
+            if n == 0:
+                if year - 1 <= today.year:
+                    out.append(("10-K", str(year - 1)))
+            elif n == 4:
+                if year <= today.year:
+                    out.append(("10-K", str(year)))
+            elif datetime.date(year, 3 * n - 2, 1) <= today:
+                out.append(("10-Q", f"{year} Q{n}"))
+        return out
+    return [(form_type, str(y)) for y in (year - 1, year + 1) if y <= today.year]
+
+
+class Prefetcher:
+    """Queues and drains speculative ingestion jobs for a QueryCoordinatorAgent."""
+
+    def __init__(self, agent, catalog: FilingCatalog) -> None:
+        self.agent = agent
+        self.catalog = catalog
+
+    def enqueue(self, companies: List[Dict]) -> int:
+        """Queue the neighbours of the extracted companies; returns how many were new."""
+        queued = 0
+        for c in companies or []:
+            ticker, form, period = c.get("ticker"), c.get("formType"), c.get("filing_date_range")
+            if not (ticker and form and period):
+                continue
+            cik = self.agent.company_identifier(c)
+            for f, p in neighbours(form, period):
+                if self.catalog.queue_prefetch(cik, ticker, f, p):
+                    queued += 1
+        if queued:
+            print(f"Queued {queued} filings for prefetch")
+        return queued
+
+    def drain(self, budget: int, should_yield: Callable[[], bool] = lambda: False) -> Dict:
+        """
+        Ingest up to `budget` queued filings, newest requests first. Checks should_yield()
+        before each one so interactive work never waits behind more than one filing.
+        A job is "done" only if this run embedded its filing: "present" if something else already
+        had, "failed" if ingestion raised or found nothing.
+        """
+        ran = failed = 0
+        for job in self.catalog.next_prefetch(budget):
+            if should_yield():
+                break
+            key = (job["cik"], job["form_type"], job["fiscal_period"])
+            if self.catalog.embedded_for_request(*key, PARSE_VERSION):
+                self.catalog.finish_prefetch(*key, "present")
+                continue
+            company = {"ticker": job["ticker"] or job["cik"], "formType": job["form_type"],
+                       "filing_date_range": job["fiscal_period"]}
+            try:
+                self.agent.process_filings([company])
+                status = "done" if self.catalog.embedded_for_request(*key, PARSE_VERSION) else "failed"
+            except Exception as e:
+                print(f"Prefetch of {company} failed: {e}", file=sys.stderr)
+                status = "failed"
+            failed += status == "failed"
+            self.catalog.finish_prefetch(*key, status)
+            ran += 1
+        return {"ran": ran, "failed": failed, "yielded": should_yield(), **self.catalog.prefetch_stats()}
+
+
+def main():
+    from dotenv import load_dotenv
+    env_path = Path(__file__).resolve().parents[1] / ".env"
+    load_dotenv(dotenv_path=env_path, override=True)
+
+    parser = argparse.ArgumentParser(description="Drain the speculative prefetch queue")
+    parser.add_argument("--budget", type=int, default=4, help="max filings to ingest in this run")
+    parser.add_argument("--stats", action="store_true", help="print prefetch hit rates and exit")
+    parser.add_argument("--persist-dir", default="./store10k10q")
+    args = parser.parse_args()
+
+    if args.stats:
+        catalog = FilingCatalog(os.path.join(args.persist_dir, ".catalog.sqlite"))
+        print(json.dumps(catalog.prefetch_stats()))
+        return
+
+    SEC_API_KEY = os.getenv("SEC_API_KEY", "")
+    EDGAR_IDENTITY = os.getenv("EDGAR_IDENTITY", "")
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+    if not (SEC_API_KEY and EDGAR_IDENTITY and OPENAI_API_KEY):
+        print(json.dumps({"ok": False, "error": "Missing required env vars"}))
+        sys.exit(1)
+
+    # SIGTERM means "interactive work arrived": finish the current filing, then stop
+    stop = {"requested": False}
+    signal.signal(signal.SIGTERM, lambda *_: stop.update(requested=True))
+
+    real_stdout = sys.stdout
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        from InitialQueryAgent import QueryCoordinatorAgent
+        agent = QueryCoordinatorAgent(
+            sec_api_key=SEC_API_KEY,
+            edgar_identity=EDGAR_IDENTITY,
+            download_folder="./10k10q",
+            persist_dir=args.persist_dir,
+            openai_api_key=OPENAI_API_KEY,
+            answer_cache_path=None,
+            prefetch=False
+        )
+        summary = Prefetcher(agent, agent.catalog).drain(args.budget, lambda: stop["requested"])
+    print(json.dumps({"ok": True, **summary}), file=real_stdout, flush=True)
+
+
+if __name__ == "__main__":
+    main()
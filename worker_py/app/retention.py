@@ -0,0 +1,304 @@
+# retention.py
+"""
+Size budgets for the filing cache and the vector index.
+
+Every filing ever asked about stays on disk twice: the raw .htm in the download folder and its
+nodes in a company shard (shard_store.py), so both grow without bound. RetentionManager keeps
+them under two budgets, evicting the coldest filings first:
+
+  - RETENTION_MAX_HTML_MB   raw filings in the download folder. Files the catalog doesn't know
+                            go first (oldest first); then catalogued filings. The nodes stay
+                            embedded; a re-parse just downloads the file again.
+  - RETENTION_MAX_NODES     nodes across all shards (counted from the catalog). An evicted
+                            filing's nodes are deleted from the shard it was ingested into (the
+                            catalog's "shard"; by node id and "filename" metadata) and its catalog
+                            row is marked "evicted", so the next request for it re-ingests it like
+                            a new filing. A row whose nodes weren't found there is left as it is.
+
+"Coldest" follows RETENTION_POLICY:
+
+  - lru (default)  oldest last access (filings.last_access, see FilingCatalog.touch); ties go to
+                   the company queried least recently (cik_access)
+  - lfu            fewest accesses, then fewest queries about the company, then oldest access
+
+Filings the current request uses, filings still being ingested and uncatalogued files younger
+than GRACE_SECONDS (a download not yet recorded) are never evicted. Budgets are soft: a worker
+that loaded a shard before an eviction keeps answering from it until it reloads. A new shard
+version also invalidates cached answers (answer_cache.py keys on it).
+
+Deleting nodes leaves their ids in each snapshot's index struct and leaves old snapshots behind;
+`--compact` rewrites every shard from its live nodes (SnapshotStore.compact), deletes shards left
+empty and removes the legacy index files once migrated. Run it while no worker is loading shards:
+
+    python3 app/retention.py --stats
+    python3 app/retention.py --evict --max-html-mb 2048 --max-nodes 500000 --dry-run
+    python3 app/retention.py --compact
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from shard_store import LEGACY, ShardedStore, shard_key
+from filing_catalog import FilingCatalog
+from index_store import SnapshotStore
+from tracing import span
+
+POLICIES = ("lru", "lfu")
+# files and rows touched this recently may belong to an ingestion still in progress
+GRACE_SECONDS = 3600
+MB = 1024 * 1024
+
+
+def _name(path: Optional[str]) -> str:
+    # node "filename" metadata and catalog paths differ in prefix ("./10k10q/x.htm" vs "10k10q/x.htm")
+    return os.path.basename(path or "")
+
+
+class RetentionManager:
+    def __init__(self, store: ShardedStore, catalog: FilingCatalog, download_folder: str,
+                 max_html_bytes: Optional[int] = None, max_nodes: Optional[int] = None,
+                 policy: str = "lru") -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"unknown retention policy {policy!r} (expected one of {POLICIES})")
+        self.store = store
+        self.catalog = catalog
+        self.download_folder = download_folder
+        self.max_html_bytes = max_html_bytes
+        self.max_nodes = max_nodes
+        self.policy = policy
+        # one enforce() at a time per process; ingest_batch threads skip it while another runs
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, store: ShardedStore, catalog: FilingCatalog, download_folder: str) -> Optional["RetentionManager"]:
+        """RetentionManager from RETENTION_* env vars, or None when no budget is set."""
+        html_mb = float(os.getenv("RETENTION_MAX_HTML_MB") or 0)
+        max_nodes = int(os.getenv("RETENTION_MAX_NODES") or 0)
+        if not (html_mb or max_nodes):
+            return None
+        return cls(store, catalog, download_folder, max_html_bytes=int(html_mb * MB) if html_mb else None,
+                   max_nodes=max_nodes or None, policy=os.getenv("RETENTION_POLICY", "lru").lower())
+
+    # -------------------------------
+    # What's on disk
+    # -------------------------------
+    def html_files(self) -> Dict[str, dict]:
+        """Basename -> {"path", "bytes", "mtime"} for every file in the download folder."""
+        out = {}
+        if not os.path.isdir(self.download_folder):
+            return out
+        for entry in os.scandir(self.download_folder):
+            if entry.is_file():
+                st = entry.stat()
+                out[entry.name] = {"path": entry.path, "bytes": st.st_size, "mtime": st.st_mtime}
+        return out
+
+    def ranked(self, rows: List[Dict]) -> List[Dict]:
+        """Catalog rows coldest first, per self.policy."""
+        def recency(r):
+            return r.get("last_access") or r.get("updated_at") or 0.0
+
+        if self.policy == "lfu":
+            key = lambda r: (r.get("access_count") or 0, r.get("cik_access_count") or 0, recency(r))
+        else:
+            key = lambda r: (recency(r), r.get("cik_last_access") or 0.0)
+        return sorted(rows, key=key)
+
+    @staticmethod
+    def _node_count(row: Dict) -> int:
+        return len(row.get("node_ids") or []) if row.get("embed_status") == "embedded" else 0
+
+    def usage(self) -> dict:
+        files = self.html_files()
+        rows = self.catalog.retention_rows()
+        return {"html_bytes": sum(f["bytes"] for f in files.values()), "html_files": len(files),
+                "nodes": sum(self._node_count(r) for r in rows),
+                "filings_embedded": sum(1 for r in rows if r.get("embed_status") == "embedded"),
+                "filings_evicted": sum(1 for r in rows if r.get("embed_status") == "evicted")}
+
+    def _protected(self, rows: List[Dict], protect: Iterable[str]) -> set:
+        """Basenames that mustn't be evicted: `protect` paths and ingestions in progress."""
+        now = time.time()
+        names = {_name(p) for p in protect if p}
+        # a row still "pending" after GRACE_SECONDS is a crashed ingestion: fair game
+        names.update(_name(r.get("path")) for r in rows
+                     if r.get("embed_status") == "pending" and now - (r.get("updated_at") or 0) < GRACE_SECONDS)
+        return names
+
+    # -------------------------------
+    # Eviction
+    # -------------------------------
+    def evict_html(self, protect: Iterable[str] = (), dry_run: bool = False) -> dict:
+        """Delete raw filings, coldest first, until the download folder fits max_html_bytes."""
+        report = {"files": 0, "bytes": 0}
+        if self.max_html_bytes is None:
+            return report
+        files = self.html_files()
+        total = sum(f["bytes"] for f in files.values())
+        if total <= self.max_html_bytes:
+            return report
+        rows = self.catalog.retention_rows()
+        keep = self._protected(rows, protect)
+        known = {_name(r.get("path")) for r in rows}
+        now = time.time()
+        # files no catalog row points at (failed ingestions, old layouts) first, oldest first
+        order = sorted((n for n in files if n not in known and now - files[n]["mtime"] >= GRACE_SECONDS),
+                       key=lambda n: files[n]["mtime"])
+        order += [_name(r.get("path")) for r in self.ranked(rows)]
+        for name in order:
+            if total <= self.max_html_bytes:
+                break
+            f = files.pop(name, None)
+            if f is None or name in keep:
+                continue
+            if not dry_run:
+                try:
+                    os.remove(f["path"])
+                except OSError as e:
+                    print(f"Couldn't evict {f['path']}: {e}")
+                    continue
+            total -= f["bytes"]
+            report["files"] += 1
+            report["bytes"] += f["bytes"]
+        return report
+
+    def evict_nodes(self, protect: Iterable[str] = (), dry_run: bool = False) -> dict:
+        """Delete the nodes of the coldest filings until the index holds at most max_nodes."""
+        report = {"filings": 0, "nodes": 0, "shards": 0}
+        if self.max_nodes is None:
+            return report
+        rows = self.catalog.retention_rows()
+        total = sum(self._node_count(r) for r in rows)
+        if total <= self.max_nodes:
+            return report
+        keep = self._protected(rows, protect)
+        # pick the filings first, then evict them with one new snapshot per shard
+        doomed: Dict[str, List[Dict]] = {}
+        for row in self.ranked(r for r in rows if self._node_count(r)):
+            if total <= self.max_nodes:
+                break
+            if _name(row.get("path")) in keep:
+                continue
+            # rows catalogued before the shard column fall back to the CIK
+            doomed.setdefault(row.get("shard") or shard_key(row.get("cik") or row.get("ticker")), []).append(row)
+            total -= self._node_count(row)
+            report["filings"] += 1
+            report["nodes"] += self._node_count(row)
+        report["shards"] = len(doomed)
+        if dry_run:
+            return report
+        report["filings"] = report["nodes"] = 0
+        for key, victims in doomed.items():
+            ids = [i for r in victims for i in r["node_ids"]]
+            paths = [r["path"] for r in victims if r.get("path")]
+            removed = set()
+            # a filing ingested before sharding may still sit in the legacy index
+            for shard in [key] + ([LEGACY] if LEGACY in self.store.keys() else []):
+                removed.update(self.store.evict(shard, node_ids=ids, filenames=paths))
+            evicted = [r for r in victims if removed.intersection(r["node_ids"])]
+            for r in evicted:
+                self.catalog.mark_evicted(r["accession_no"])
+            report["filings"] += len(evicted)
+            report["nodes"] += len(removed)
+            print(f"Evicted {len(evicted)} filings ({len(removed)} nodes) from shard {key}")
+            for r in victims:
+                if r not in evicted:
+                    print(f"Nodes of {r['accession_no']} not found in shard {key}; left in the catalog")
+        return report
+
+    def enforce(self, protect: Iterable[str] = (), dry_run: bool = False) -> Optional[dict]:
+        """Apply both budgets. `protect`: paths of filings in use. None if another thread is already at it."""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            with span("retention") as s:
+                protect = list(protect)
+                report = {"html": self.evict_html(protect, dry_run), "nodes": self.evict_nodes(protect, dry_run)}
+                s["html_files"] = report["html"]["files"]
+                s["nodes"] = report["nodes"]["nodes"]
+            return report
+        finally:
+            self.lock.release()
+
+    # -------------------------------
+    # Compaction (offline)
+    # -------------------------------
+    def compact(self) -> dict:
+        """
+        Rewrite every shard without deleted nodes or old snapshots, drop empty shards and the
+        migrated legacy index, and VACUUM the catalog. Returns the per-shard reports and total bytes.
+        """
+        from vector_codec import snapshot_bytes
+
+        def index_bytes():
+            total = 0
+            for dirpath, _, names in os.walk(self.store.root):
+                if os.path.basename(os.path.dirname(dirpath)) == SnapshotStore.SNAPSHOTS or dirpath == self.store.root:
+                    total += snapshot_bytes(dirpath)
+            return total
+
+        with span("retention_compact"):
+            before = index_bytes()
+            shards = self.store.compact(drop_old=True)
+            self.catalog.vacuum()
+            after = index_bytes()
+        return {"shards": shards, "bytes_before": before, "bytes_after": after}
+
+    def stats(self, coldest: int = 10) -> dict:
+        rows = self.catalog.retention_rows()
+        files = self.html_files()
+        cold = []
+        for r in self.ranked(rows)[:coldest]:
+            cold.append({"accession_no": r["accession_no"], "ticker": r.get("ticker"), "status": r.get("embed_status"),
+                         "last_access": r.get("last_access"), "access_count": r.get("access_count"),
+                         "nodes": self._node_count(r), "html_bytes": files.get(_name(r.get("path")), {}).get("bytes", 0)})
+        return {"policy": self.policy, "max_html_bytes": self.max_html_bytes, "max_nodes": self.max_nodes,
+                "usage": self.usage(), "shards": len(self.store.keys()), "coldest": cold}
+
+
+def main():
+    from pathlib import Path
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env", override=True)
+
+    parser = argparse.ArgumentParser(description="Evict cold filings and compact the index to fit size budgets")
+    parser.add_argument("--persist-dir", default="./store10k10q")
+    parser.add_argument("--download-folder", default="./10k10q")
+    parser.add_argument("--stats", action="store_true", help="usage against the budgets and the coldest filings")
+    parser.add_argument("--evict", action="store_true", help="evict until both budgets are met")
+    parser.add_argument("--compact", action="store_true",
+                        help="rewrite shards without deleted nodes and drop old snapshots (no workers running)")
+    parser.add_argument("--dry-run", action="store_true", help="with --evict: report what would go")
+    parser.add_argument("--max-html-mb", type=float, default=float(os.getenv("RETENTION_MAX_HTML_MB") or 0) or None)
+    parser.add_argument("--max-nodes", type=int, default=int(os.getenv("RETENTION_MAX_NODES") or 0) or None)
+    parser.add_argument("--policy", choices=POLICIES, default=os.getenv("RETENTION_POLICY", "lru").lower())
+    args = parser.parse_args()
+    if not (args.stats or args.evict or args.compact):
+        parser.print_help()
+        sys.exit(2)
+
+    store = ShardedStore(args.persist_dir)
+    catalog = FilingCatalog(os.path.join(args.persist_dir, ".catalog.sqlite"))
+    manager = RetentionManager(store, catalog, args.download_folder,
+                               max_html_bytes=int(args.max_html_mb * MB) if args.max_html_mb else None,
+                               max_nodes=args.max_nodes, policy=args.policy)
+    report = {}
+    if args.evict:
+        report["evicted"] = manager.enforce(dry_run=args.dry_run)
+    if args.compact:
+        report["compacted"] = manager.compact()
+    if args.stats or not report:
+        report["stats"] = manager.stats()
+    else:
+        report["usage"] = manager.usage()
+    print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# worker_py/app/run_batch.py
+"""
+Many prompts in one worker process (POST /queries/batch). Prompts are read as a JSON list from
+stdin (or --prompts-file); stdout is JSON lines:
+
+    {"event": "item", "index": 3, "prompt": "...", "ok": true, "answer": "...", "citations": [...], "passing": true}
+    ...                                   one per prompt, in completion order
+    {"event": "result", "ok": true, "items": [...], "timings": {...}}    all items, in prompt order
+
+Filings are ingested once per batch, the prompts are embedded and retrieved together, and LLM
+generation runs --concurrency prompts at a time (see QueryCoordinatorAgent.arun_batch).
+"""
+import os, json, sys, argparse, io
+import asyncio
+from pathlib import Path
+from dotenv import load_dotenv
+from contextlib import redirect_stdout
+
+from tracing import tracer
+
+MAX_PROMPTS = 500
+
+
+def read_prompts(args):
+    raw = open(args.prompts_file).read() if args.prompts_file else sys.stdin.read()
+    prompts = json.loads(raw or "[]")
+    if isinstance(prompts, dict):
+        prompts = prompts.get("prompts", [])
+    if not isinstance(prompts, list) or not all(isinstance(p, str) and p.strip() for p in prompts):
+        raise ValueError("expected a JSON list of non-empty prompt strings")
+    if len(prompts) > MAX_PROMPTS:
+        raise ValueError(f"at most {MAX_PROMPTS} prompts per batch")
+    return prompts
+
+
+def main():
+    env_path = Path(__file__).resolve().parents[1] / ".env"
+    load_dotenv(dotenv_path=env_path, override=True)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts-file", help="JSON list of prompts (default: read it from stdin)")
+    parser.add_argument("--stream", action="store_true", help="emit an \"item\" line per prompt as it completes")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the semantic answer cache")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_LLM_CONCURRENCY", "8")),
+                        help="prompts in rerank/summarize at the same time (bounds concurrent LLM calls)")
+    parser.add_argument("--ingest-workers", type=int, default=int(os.getenv("BATCH_INGEST_WORKERS", "4")))
+    parser.add_argument("--verifier", choices=["numeric", "llm", "both"], default=os.getenv("ANSWER_VERIFIER", "numeric"))
+    args = parser.parse_args()
+
+    real_stdout = sys.stdout
+
+    def emit_line(payload):
+        real_stdout.write(json.dumps(payload) + "\n")
+        real_stdout.flush()
+
+    def emit_result(payload):
+        emit_line({"event": "result", **payload, "timings": tracer.summary()})
+
+    try:
+        prompts = read_prompts(args)
+    except (OSError, ValueError) as e:
+        emit_result({"ok": False, "error": f"Bad batch: {e}"})
+        sys.exit(1)
+
+    SEC_API_KEY = os.getenv("SEC_API_KEY", "")
+    EDGAR_IDENTITY = os.getenv("EDGAR_IDENTITY", "")
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+    if not (SEC_API_KEY and EDGAR_IDENTITY and OPENAI_API_KEY):
+        emit_result({"ok": False, "error": "Missing required env vars"})
+        sys.exit(1)
+
+    def on_item(item):
+        if args.stream:
+            emit_line({"event": "item", **item})
+
+    # Capture any prints from downstream code to avoid corrupting stdout JSON
+    buf = io.StringIO()
+    try:
+        with redirect_stdout(buf):
+            with tracer.span("import"):
+                from InitialQueryAgent import QueryCoordinatorAgent
+            agent = QueryCoordinatorAgent(
+                sec_api_key=SEC_API_KEY,
+                edgar_identity=EDGAR_IDENTITY,
+                download_folder="./10k10q",
+                persist_dir="./store10k10q",
+                openai_api_key=OPENAI_API_KEY,
+                answer_cache_path=None if args.no_cache else "./.answer_cache.sqlite",
+                on_event=emit_line if args.stream else None,
+                verifier=args.verifier,
+            )
+            items = asyncio.run(agent.arun_batch(prompts, on_item=on_item, concurrency=args.concurrency,
+                                                 ingest_workers=args.ingest_workers))
+    except Exception as e:
+        print(buf.getvalue(), file=sys.stderr)
+        emit_result({"ok": False, "error": f"Worker exception: {str(e)}"})
+        sys.exit(1)
+
+    logs = buf.getvalue()
+    if logs:
+        print(logs, file=sys.stderr)
+
+    emit_result({"ok": True, "items": items})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 # worker_py/app/run_query.py
 import os, json, sys, argparse, io
+import asyncio
 from pathlib import Path
 from dotenv import load_dotenv
 from contextlib import redirect_stdout
 
-from InitialQueryAgent import QueryCoordinatorAgent
+# InitialQueryAgent (llama_index, openai, the SEC clients) is imported inside main() once the
+# arguments and env vars check out, so --help and config errors answer without loading it
+from tracing import tracer
 
 def main():
     env_path = Path(__file__).resolve().parents[1] / ".env"
@@ -12,33 +15,66 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--prompt", required=True)
+    parser.add_argument("--no-cache", action="store_true", help="bypass the semantic answer cache")
+    parser.add_argument("--stream", action="store_true",
+                        help="emit JSON-lines progress/citation/token events before the final result")
+    parser.add_argument("--verifier", choices=["numeric", "llm", "both"], default=os.getenv("ANSWER_VERIFIER", "numeric"),
+                        help="answer check before returning: numeric grounding (no LLM call), the LLM judge, or both")
+    parser.add_argument("--audit-rate", type=float, default=float(os.getenv("FAITHFULNESS_AUDIT_RATE", "0.05")),
+                        help="share of answers also sent to the LLM faithfulness judge after the result is written")
+    parser.add_argument("--no-decompose", action="store_true", default=os.getenv("QUERY_DECOMPOSE", "1") == "0",
+                        help="answer comparisons with one retrieval across all companies instead of one per company/period")
     args = parser.parse_args()
 
+    # In stream mode stdout is JSON lines: stage/citations/token/retry events, then the
+    # usual result object tagged with "event": "result". Keep a handle on the real stdout
+    # since downstream prints get redirected below.
+    real_stdout = sys.stdout
+
+    def emit_event(event):
+        real_stdout.write(json.dumps(event) + "\n")
+        real_stdout.flush()
+
+    def emit_result(payload):
+        # per-stage durations, bytes, node and token counts (see tracing.py)
+        payload = {**payload, "timings": tracer.summary()}
+        if args.stream:
+            payload = {"event": "result", **payload}
+        print(json.dumps(payload), file=real_stdout, flush=True)
+
     SEC_API_KEY = os.getenv("SEC_API_KEY", "")
     EDGAR_IDENTITY = os.getenv("EDGAR_IDENTITY", "")
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
     if not (SEC_API_KEY and EDGAR_IDENTITY and OPENAI_API_KEY):
         # Print ONLY JSON on stdout
-        print(json.dumps({"ok": False, "error": "Missing required env vars"}))
+        emit_result({"ok": False, "error": "Missing required env vars"})
         sys.exit(1)
 
     # Capture any prints from downstream code to avoid corrupting stdout JSON
     buf = io.StringIO()
     try:
         with redirect_stdout(buf):
+            with tracer.span("import"):
+                from InitialQueryAgent import QueryCoordinatorAgent
             agent = QueryCoordinatorAgent(
                 sec_api_key=SEC_API_KEY,
                 edgar_identity=EDGAR_IDENTITY,
                 download_folder="./10k10q",
                 persist_dir="./store10k10q",
-                openai_api_key=OPENAI_API_KEY
+                openai_api_key=OPENAI_API_KEY,
+                answer_cache_path=None if args.no_cache else "./.answer_cache.sqlite",
+                on_event=emit_event if args.stream else None,
+                verifier=args.verifier,
+                audit_rate=args.audit_rate,
+                decompose=not args.no_decompose
             )
-            answer, citations = agent.run(args.prompt)
+            # async path: retrieval/rerank branches run concurrently
+            answer, citations = asyncio.run(agent.arun(args.prompt))
     except Exception as e:
         # Send debug logs to stderr so API can still parse stdout JSON
         print(buf.getvalue(), file=sys.stderr)
-        print(json.dumps({"ok": False, "error": f"Worker exception: {str(e)}"}))
+        emit_result({"ok": False, "error": f"Worker exception: {str(e)}"})
         sys.exit(1)
 
     # Dump captured logs to stderr for visibility
@@ -47,11 +83,19 @@ def main():
         print(logs, file=sys.stderr)
 
     # Print ONLY the JSON result on stdout
-    print(json.dumps({
+    emit_result({
         "ok": True,
         "answer": getattr(answer, "response", answer),
         "citations": citations
-    }))
+    })
+
+    # Sampled faithfulness audits run after the result: detach stdout first so the API sees EOF
+    # and returns the answer now; the verdicts only go to stderr.
+    if agent.audits_pending():
+        real_stdout.flush()
+        os.dup2(os.open(os.devnull, os.O_WRONLY), real_stdout.fileno())
+        with redirect_stdout(sys.stderr):
+            agent.run_audits()
 
 if __name__ == "__main__":
     main()
@@ -3,7 +3,8 @@ from __future__ import annotations
 import os, json, time, sys, re
 import requests
 
-SEC_TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
+# overridable so load tests can point at a local stand-in (worker_py/loadtest/fake_services.py)
+SEC_TICKERS_URL = os.getenv("SEC_TICKERS_URL", "https://www.sec.gov/files/company_tickers.json")
 
 def _normalize_variants(ticker: str) -> list[str]:
     """Generate common variants for class tickers (dot, hyphen, none)."""
@@ -67,6 +68,22 @@ class TickerResolver:
                 return rec["cik"]
         return None
 
+    def tickers(self, limit: int | None = None) -> list[str]:
+        """
+        Canonical tickers in the order of SEC's company_tickers.json, which lists the largest
+        companies first, so tickers(500) is a reasonable large-cap universe. One ticker per CIK.
+        """
+        out: list[str] = []
+        seen: set[str] = set()
+        for rec in self._map.values():
+            if rec["cik"] in seen:
+                continue
+            seen.add(rec["cik"])
+            out.append(rec["canonical"])
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
     def info_for(self, ticker_or_cik: str | None) -> dict | None:
         """Return dict with cik/title/canonical (useful for printing)."""
         if not ticker_or_cik:
@@ -0,0 +1,288 @@
+# shard_store.py
+"""
+Per-company index shards on top of SnapshotStore:
+
+    store10k10q/
+      shards/320193/CURRENT, snapshots/...     -> one versioned SnapshotStore per CIK
+      shards/789019/...
+      CURRENT, snapshots/ (or docstore.json)   -> pre-shard monolithic index, read as "_legacy"
+
+Only the shards of the companies a query mentions are loaded, and at most `max_resident` stay in
+memory (least recently used are dropped), so load time and memory follow the query rather than
+everything ever ingested. Each shard commits and publishes independently, under its own writer lock.
+
+    python3 app/shard_store.py --stats
+    python3 app/shard_store.py --migrate      # split the legacy index into shards (no re-embedding)
+
+Eviction and compaction under a size budget are driven by retention.py.
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import shutil
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from index_store import SnapshotStore
+from filing_catalog import normalize_cik
+from tracing import span
+
+if TYPE_CHECKING:
+    from vector_codec import VectorCodec
+
+LEGACY = "_legacy"
+UNKNOWN = "_unknown"
+LEGACY_FILES = ("docstore.json", "index_store.json", "graph_store.json")
+
+
+def shard_key(cik) -> str:
+    """Directory-safe shard name for a CIK (or a ticker, when the CIK couldn't be resolved)."""
+    key = re.sub(r"[^A-Za-z0-9_-]", "_", normalize_cik(cik))
+    return key or UNKNOWN
+
+
+class ShardedStore:
+    SHARDS = "shards"
+    MIGRATED = ".legacy_migrated"
+
+    def __init__(self, root: str, embed_model=None, index_id: str = "10k10q", max_resident: int = 8,
+                 codec: Optional[VectorCodec] = None, **store_kwargs) -> None:
+        self.root = root
+        self.embed_model = embed_model
+        self.index_id = index_id
+        self.max_resident = max(1, max_resident)
+        # None: EMBED_DTYPE/EMBED_DIMENSIONS (VectorCodec.from_env), read when the first shard is opened
+        self.codec = codec
+        self.store_kwargs = store_kwargs
+        self.lock = threading.Lock()
+        self._stores: Dict[str, SnapshotStore] = {}
+        # key -> (version, storage_context, index), most recently used last
+        self._resident: "OrderedDict[str, Tuple]" = OrderedDict()
+        os.makedirs(os.path.join(self.root, self.SHARDS), exist_ok=True)
+
+    # -------------------------------
+    # Layout
+    # -------------------------------
+    def _legacy_store(self) -> Optional[SnapshotStore]:
+        if os.path.exists(os.path.join(self.root, self.MIGRATED)):
+            return None
+        if not (os.path.exists(os.path.join(self.root, SnapshotStore.POINTER))
+                or os.path.exists(os.path.join(self.root, "docstore.json"))):
+            return None
+        return self._store(LEGACY)
+
+    def _store(self, key: str) -> SnapshotStore:
+        with self.lock:
+            if key not in self._stores:
+                if self.codec is None:
+                    from vector_codec import VectorCodec
+                    self.codec = VectorCodec.from_env()
+                path = self.root if key == LEGACY else os.path.join(self.root, self.SHARDS, key)
+                self._stores[key] = SnapshotStore(path, embed_model=self.embed_model, index_id=self.index_id,
+                                                  codec=self.codec, **self.store_kwargs)
+            return self._stores[key]
+
+    def keys(self) -> List[str]:
+        """Every shard on disk (plus the legacy index while it hasn't been migrated)."""
+        shard_root = os.path.join(self.root, self.SHARDS)
+        keys = sorted(d for d in os.listdir(shard_root)
+                      if os.path.exists(os.path.join(shard_root, d, SnapshotStore.POINTER)))
+        return keys + ([LEGACY] if self._legacy_store() is not None else [])
+
+    def keys_for(self, ciks: Optional[List]) -> List[str]:
+        """Shards a query about `ciks` has to read: theirs, plus legacy if present. No CIKs -> all shards."""
+        if not ciks:
+            return self.keys()
+        keys = list(dict.fromkeys(shard_key(c) for c in ciks))
+        return keys + ([LEGACY] if self._legacy_store() is not None else [])
+
+    def shard_version(self, key: str) -> Optional[str]:
+        if key == LEGACY:
+            legacy = self._legacy_store()
+            return legacy.current_version() if legacy else None
+        if not os.path.isdir(os.path.join(self.root, self.SHARDS, key)):
+            return None
+        return self._store(key).current_version()
+
+    def current_version(self) -> Optional[str]:
+        """One version for the whole store: changes whenever any shard publishes."""
+        return self.version_for(self.keys())
+
+    def version_for(self, keys: List[str]) -> Optional[str]:
+        """
+        Version of what a query over `keys` reads (see keys_for): changes only when one of those
+        shards publishes, so answers cached for one company survive ingestion into another.
+        """
+        versions = [(k, self.shard_version(k)) for k in keys]
+        if not versions:
+            return None
+        return "s" + hashlib.sha1(json.dumps(versions).encode()).hexdigest()[:16]
+
+    # -------------------------------
+    # Loading (LRU of resident shards)
+    # -------------------------------
+    def _remember(self, key: str, entry: Tuple, pinned=()) -> None:
+        # caller holds self.lock
+        self._resident[key] = entry
+        self._resident.move_to_end(key)
+        for old in list(self._resident):
+            if len(self._resident) <= self.max_resident:
+                break
+            if old not in pinned:
+                del self._resident[old]
+                print(f"Evicted index shard {old}")
+
+    def get(self, key: str, pinned=()) -> Optional[Tuple]:
+        """(version, storage_context, index) of a shard, loading or reloading it as needed; None if it doesn't exist."""
+        version = self.shard_version(key)
+        if version is None:
+            return None
+        with self.lock:
+            entry = self._resident.get(key)
+            if entry is not None and entry[0] == version:
+                self._resident.move_to_end(key)
+                return entry
+        entry = self._store(key).load()
+        with self.lock:
+            self._remember(key, entry, pinned)
+        return entry
+
+    def indexes(self, keys: List[str]) -> Dict[str, object]:
+        """key -> index for the shards that exist among `keys`; those stay resident even past max_resident."""
+        out = {}
+        with span("shard_load") as s:
+            for key in keys:
+                entry = self.get(key, pinned=set(keys))
+                if entry is not None:
+                    out[key] = entry[2]
+            s["shards"] = len(out)
+            s["resident"] = len(self._resident)
+        return out
+
+    def resident(self) -> List[str]:
+        with self.lock:
+            return list(self._resident)
+
+    # -------------------------------
+    # Writing
+    # -------------------------------
+    def commit(self, cik, nodes: List, replace_ids: Optional[List[str]] = None) -> Tuple[str, str, object, object]:
+        """
+        Publish nodes to the company's shard. `replace_ids` are also dropped from the other shards
+        a query for the company reads (the unmigrated legacy index), so an old copy of a re-parsed
+        filing isn't retrieved next to the new one. Returns (key, version, storage_context, index).
+        """
+        key = shard_key(cik)
+        version, storage_context, index = self._store(key).commit(nodes, replace_ids=replace_ids)
+        with self.lock:
+            self._remember(key, (version, storage_context, index))
+        if replace_ids:
+            for other in self.keys_for([cik]):
+                if other != key:
+                    self.evict(other, node_ids=replace_ids)
+        return key, version, storage_context, index
+
+    def evict(self, key: str, node_ids: Iterable[str] = (), filenames: Iterable[str] = ()) -> List[str]:
+        """Drop nodes from one shard (see SnapshotStore.evict); returns the removed ids. Resident copies reload on next use."""
+        if self.shard_version(key) is None:
+            return []
+        _, removed = self._store(key).evict(node_ids=node_ids, filenames=filenames)
+        return removed
+
+    def compact(self, drop_old: bool = False) -> Dict[str, dict]:
+        """
+        Compact every shard (SnapshotStore.compact). Shards left without nodes are deleted, and once
+        the legacy index has been migrated its files are too. Returns key -> report.
+        """
+        report = {}
+        for key in self.keys():
+            report[key] = self._store(key).compact(drop_old=drop_old)
+            if key != LEGACY and report[key].get("nodes") == 0:
+                with self.lock:
+                    self._stores.pop(key, None)
+                    self._resident.pop(key, None)
+                shutil.rmtree(os.path.join(self.root, self.SHARDS, key), ignore_errors=True)
+                report[key]["removed"] = True
+                print(f"Removed empty index shard {key}")
+        if os.path.exists(os.path.join(self.root, self.MIGRATED)):
+            removed = self._remove_legacy_files()
+            if removed:
+                report[LEGACY] = {"removed": True, "files": removed}
+        return report
+
+    def _remove_legacy_files(self) -> int:
+        # the pre-shard index left in the root after migrate(): its snapshots, pointer and flat store files
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name == SnapshotStore.SNAPSHOTS and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name == SnapshotStore.POINTER or name in LEGACY_FILES or (
+                    "__vector_store" in name and name.endswith((".json", ".npy"))):
+                os.remove(path)
+            else:
+                continue
+            removed += 1
+        return removed
+
+    def migrate(self, node_owners: Dict[str, str]) -> Dict[str, int]:
+        """
+        Split the legacy index into shards, reusing its stored embeddings. Nodes are assigned by
+        `node_owners` (node id -> CIK, from the filing catalog), else by their "cik" metadata.
+        The legacy files are left in place and skipped from then on.
+        """
+        legacy = self._legacy_store()
+        if legacy is None:
+            return {}
+        _, storage_context, index = legacy.load()
+        groups: Dict[str, List] = {}
+        for node_id, node in storage_context.docstore.docs.items():
+            try:
+                node.embedding = storage_context.vector_store.get(node_id)
+            except Exception:
+                node.embedding = None  # re-embedded by commit
+            owner = node_owners.get(node_id) or (node.metadata or {}).get("cik") or UNKNOWN
+            groups.setdefault(shard_key(owner), []).append(node)
+        counts = {}
+        for key, nodes in sorted(groups.items()):
+            self.commit(key, nodes)
+            counts[key] = len(nodes)
+            print(f"Migrated {len(nodes)} nodes to shard {key}")
+        with open(os.path.join(self.root, self.MIGRATED), "w") as f:
+            json.dump(counts, f)
+        with self.lock:
+            self._resident.pop(LEGACY, None)
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or migrate the per-company index shards")
+    parser.add_argument("--persist-dir", default="./store10k10q")
+    parser.add_argument("--migrate", action="store_true", help="split a pre-shard index into per-CIK shards")
+    parser.add_argument("--stats", action="store_true", help="list shards and their snapshot versions")
+    args = parser.parse_args()
+
+    store = ShardedStore(args.persist_dir)
+    if args.migrate:
+        from pathlib import Path
+        from dotenv import load_dotenv
+        from filing_catalog import FilingCatalog
+        load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env", override=True)
+        catalog = FilingCatalog(os.path.join(args.persist_dir, ".catalog.sqlite"))
+        print(json.dumps({"migrated": store.migrate(catalog.node_owners())}))
+    elif args.stats:
+        print(json.dumps({"shards": {k: store.shard_version(k) for k in store.keys()},
+                          "version": store.current_version()}, indent=1))
+    else:
+        parser.print_help()
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# single_flight.py
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    import fcntl  # POSIX only; on Windows we fall back to in-process coalescing
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls within one process: while a call for `key` is running,
+    other callers with the same key wait for it and get its result (or its exception).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared); shared is True if the result came from another caller's run."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class FileSingleFlight:
+    """
+    Coalesces calls across worker processes sharing `folder`. Each key gets an flock'd lock file;
+    the holder runs `fn` and writes its JSON-serializable result next to it. A process that had to
+    wait for the lock reuses that result if it was written within `window` seconds, i.e. it joins
+    the flight that was running instead of repeating the work.
+    Threads in the same process are coalesced first through SingleFlight.
+    """
+
+    def __init__(self, folder: str, window: float = 600.0) -> None:
+        self.folder = folder
+        self.window = window
+        self.local = SingleFlight()
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _paths(self, key: Hashable) -> Tuple[str, str]:
+        digest = hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()
+        base = os.path.join(self.folder, digest)
+        return base + ".lock", base + ".done"
+
+    def _recent_result(self, done_path: str):
+        try:
+            with open(done_path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("finished_at", 0) > self.window:
+            return None
+        return entry
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared); shared is True if another thread or process did the work."""
+        (result, shared), joined_thread = self.local.do(key, lambda: self._do_locked(key, fn))
+        return result, shared or joined_thread
+
+    def _do_locked(self, key: Hashable, fn: Callable[[], Any]):
+        lock_path, done_path = self._paths(key)
+        with open(lock_path, "a+") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    waited = False
+                except BlockingIOError:
+                    # someone else is ingesting this key right now; wait for them
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    waited = True
+            else:
+                waited = False
+            try:
+                if waited:
+                    entry = self._recent_result(done_path)
+                    if entry is not None:
+                        return entry.get("result"), True
+                result = fn()
+                tmp = f"{done_path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump({"key": key, "result": result, "finished_at": time.time()}, f, default=str)
+                os.replace(tmp, done_path)
+                return result, False
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
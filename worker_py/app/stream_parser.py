@@ -0,0 +1,248 @@
+# stream_parser.py
+"""
+Bounded-memory filing parser (FilingParserAgent(low_memory=True)).
+
+parse_10k_financial_tables holds the raw bytes, the decoded string, a BeautifulSoup tree,
+soup.get_text() twice and a re-serialized copy of every section at the same time, and runs
+chardet over the whole file, so peak memory is many times the filing size. parse_filing instead:
+
+  - sniffs the encoding from a BOM, a <meta charset>/<?xml encoding> or chardet on the first 64 KB
+  - decodes and feeds the file to an event-based HTMLParser in fixed-size chunks
+  - hands each table to on_table(entry) as soon as its </table> closes, with the "Item N" section
+    and "Note N" it sits under; the cells are all that is kept of it
+  - keeps only the narrative text of each section (one line per block element), outside tables
+
+so memory tracks the parsed output, not the document. Section keys are the "Item N." heading line.
+"""
+from __future__ import annotations
+
+import re
+import codecs
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Tuple
+
+from table_format import clean_text
+
+SNIFF_BYTES = 64 * 1024
+READ_BYTES = 256 * 1024
+# longer lines starting with "Item 7" are prose referring to the item, not its heading
+MAX_HEADING_CHARS = 200
+
+ITEM_RE = re.compile(r"Item[\s\xa0]+(\d+[A-Z]?)\s*[\.\-:–—]?\s*(.*)", re.IGNORECASE)
+NOTE_RE = re.compile(r"Note\s+(\d+)", re.IGNORECASE)
+META_PATTERNS = {
+    "form_type": re.compile(r"Form\s+(10-K|10-Q)"),
+    "filing_date": re.compile(r"FILED AS OF DATE:\s*(\d{8})"),
+    "cik": re.compile(r"CENTRAL INDEX KEY:\s*(\d+)"),
+}
+CHARSET_RE = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)|<\?xml[^>]+encoding\s*=\s*["']([A-Za-z0-9_.:-]+)""",
+    re.IGNORECASE,
+)
+# a new line of text starts at each of these
+BLOCK_TAGS = {"p", "div", "br", "tr", "li", "ul", "ol", "table", "title", "body",
+              "h1", "h2", "h3", "h4", "h5", "h6", "center", "hr"}
+SKIP_TAGS = {"script", "style"}
+
+
+def _cp1252_fallback(err: UnicodeDecodeError):
+    # EDGAR "UTF-8" often carries stray Windows-1252 bytes (curly quotes, dashes); keep them readable
+    return err.object[err.start:err.end].decode("cp1252", errors="replace"), err.end
+
+
+codecs.register_error("cp1252fallback", _cp1252_fallback)
+
+
+def _codec(name) -> Optional[str]:
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def sniff_encoding(prefix: bytes) -> str:
+    """Encoding from a BOM, a declared charset, or chardet on `prefix`; ASCII-looking input reads as UTF-8."""
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"),
+                          (codecs.BOM_UTF16_BE, "utf-16")):
+        if prefix.startswith(bom):
+            return encoding
+    m = CHARSET_RE.search(prefix)
+    declared = _codec((m.group(1) or m.group(2)).decode("ascii")) if m else None
+    if declared:
+        return declared
+    try:
+        import chardet
+        guessed = _codec(chardet.detect(prefix).get("encoding"))
+    except ImportError:
+        guessed = None
+    if guessed in (None, "ascii"):
+        return "utf-8"
+    return guessed
+
+
+class FilingStreamParser(HTMLParser):
+    """HTMLParser callbacks that track section/note headings and collect tables until they close."""
+
+    def __init__(self, on_table: Callable[[Dict], None], keep_text: bool = True) -> None:
+        super().__init__(convert_charrefs=True)
+        self.on_table = on_table
+        self.keep_text = keep_text
+        self.meta: Dict[str, Optional[str]] = {k: None for k in META_PATTERNS}
+        # section key -> narrative lines
+        self.sections: Dict[str, List[str]] = {}
+        self.section: Optional[str] = None
+        self.note: Optional[int] = None
+        self.line: List[str] = []
+        # True while text events continue one text node (a chunk boundary can split it in two)
+        self.in_text = False
+        self.skip = 0
+        self.tables = 0
+        self.dropped = 0  # tables before the first "Item" heading (cover page, table of contents)
+        # the table being read: depth > 1 inside nested tables, whose text joins the outer cell
+        self.depth = 0
+        self.rows: List[List[Tuple[str, int]]] = []
+        self.row: Optional[List[Tuple[str, int]]] = None
+        self.cell: Optional[List[str]] = None
+        self.colspan = 1
+
+    # -------------------------------
+    # Text lines (outside tables)
+    # -------------------------------
+    def end_line(self) -> None:
+        if not self.line:
+            return
+        text = clean_text(" ".join(p.strip() for p in self.line if p.strip()))
+        self.line = []
+        if not text:
+            return
+        for key, pattern in META_PATTERNS.items():
+            if self.meta[key] is None:
+                m = pattern.search(text)
+                if m:
+                    self.meta[key] = m.group(1)
+        if len(text) <= MAX_HEADING_CHARS and ITEM_RE.match(text):
+            self.section, self.note = text, None
+            self.sections.setdefault(text, [])
+            return
+        m = NOTE_RE.match(text)
+        if m:
+            self.note = int(m.group(1))
+        if self.section is not None and self.keep_text:
+            self.sections[self.section].append(text)
+
+    # -------------------------------
+    # Tables
+    # -------------------------------
+    def end_cell(self) -> None:
+        if self.cell is not None:
+            if self.row is None:
+                self.row = []
+            self.row.append((clean_text(" ".join(p.strip() for p in self.cell if p.strip())), self.colspan))
+            self.cell = None
+
+    def end_row(self) -> None:
+        self.end_cell()
+        if self.row is not None:
+            self.rows.append(self.row)
+            self.row = None
+
+    def end_table(self) -> None:
+        self.end_row()
+        rows, self.rows = self.rows, []
+        if self.section is None:
+            self.dropped += 1
+            return
+        self.tables += 1
+        self.on_table({
+            "section": self.section,
+            "note_number": self.note,
+            "cells": rows,
+            "parsed": [[text for text, _ in row] for row in rows],
+        })
+
+    # -------------------------------
+    # HTMLParser events
+    # -------------------------------
+    def handle_starttag(self, tag, attrs):
+        self.in_text = False
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag == "table":
+            if self.depth == 0:
+                self.end_line()
+            self.depth += 1
+        elif self.depth == 1 and tag == "tr":
+            self.end_row()
+            self.row = []
+        elif self.depth == 1 and tag in ("td", "th"):
+            self.end_cell()
+            self.cell = []
+            try:
+                self.colspan = max(1, int(dict(attrs).get("colspan") or 1))
+            except ValueError:
+                self.colspan = 1
+        elif self.depth == 0 and tag in BLOCK_TAGS:
+            self.end_line()
+
+    def handle_endtag(self, tag):
+        self.in_text = False
+        if tag in SKIP_TAGS:
+            self.skip = max(0, self.skip - 1)
+        elif tag == "table":
+            if self.depth == 1:
+                self.end_table()
+            self.depth = max(0, self.depth - 1)
+        elif self.depth == 1 and tag in ("td", "th"):
+            self.end_cell()
+        elif self.depth == 1 and tag == "tr":
+            self.end_row()
+        elif self.depth == 0 and tag in BLOCK_TAGS:
+            self.end_line()
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        target = self.line if not self.depth else self.cell
+        if target is None:
+            return
+        if self.in_text and target:
+            target[-1] += data
+        else:
+            target.append(data)
+        self.in_text = True
+
+    def finish(self) -> None:
+        self.close()
+        if self.depth:
+            self.end_table()
+            self.depth = 0
+        self.end_line()
+
+
+def parse_filing(path: str, on_table: Callable[[Dict], None], keep_text: bool = True,
+                 read_bytes: int = READ_BYTES) -> Dict:
+    """
+    Stream the filing at `path` through FilingStreamParser, calling on_table for every table inside
+    an "Item" section. Returns {"sections": {key: text}, "meta", "encoding", "bytes", "tables", "dropped"}.
+    """
+    size = 0
+    with open(path, "rb") as f:
+        chunk = f.read(SNIFF_BYTES)
+        encoding = sniff_encoding(chunk)
+        errors = "cp1252fallback" if encoding in ("utf-8", "utf-8-sig") else "replace"
+        decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        parser = FilingStreamParser(on_table, keep_text=keep_text)
+        while chunk:
+            size += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            chunk = f.read(read_bytes)
+        parser.feed(decoder.decode(b"", final=True))
+    parser.finish()
+    return {
+        "sections": {key: "\n".join(lines) for key, lines in parser.sections.items()},
+        "meta": parser.meta,
+        "encoding": encoding,
+        "bytes": size,
+        "tables": parser.tables,
+        "dropped": parser.dropped,
+    }
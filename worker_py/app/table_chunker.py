@@ -0,0 +1,127 @@
+# table_chunker.py
+"""
+Node parser for the markdown tables FilingParserAgent produces.
+
+SentenceSplitter cuts tables wherever its sentence heuristics land: mid-row, with the year
+columns left behind in the first chunk. TableNodeParser splits only between rows, repeats the
+header block (column titles, period headings, "(in millions)") at the top of every chunk, and
+records which rows a chunk holds and which periods its columns cover:
+
+    table_rows     "12-24 of 40"         data rows in this chunk
+    periods        "2023, 2022, 2021"    years in the header, left to right
+    period_label   "Years Ended"         e.g. "Three Months Ended", when the header says so
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, List, Optional, Sequence
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode
+from llama_index.core.utils import get_tokenizer
+
+from grounding import extract_numbers, YEAR_RE
+
+SEPARATOR_RE = re.compile(r"^\|(\s*:?-{3,}:?\s*\|)+\s*$")
+PERIOD_LABEL_RE = re.compile(
+    r"\b((?:three|six|nine|twelve)\s+months\s+ended|(?:fiscal\s+)?years?\s+ended|quarters?\s+ended)\b",
+    re.IGNORECASE,
+)
+# leading rows without figures (titles, period headings, units) are treated as header, up to this many
+MAX_HEADER_ROWS = 4
+# kept out of the embedding text: they locate the chunk but say nothing about its content
+LOCATION_KEYS = ["table_rows", "table_chunk"]
+
+
+def split_table(text: str):
+    """(preamble lines, header lines, data rows) of a markdown table; header includes the |---| line."""
+    lines = [l for l in text.splitlines() if l.strip()]
+    preamble = []
+    while lines and not lines[0].lstrip().startswith("|"):
+        preamble.append(lines.pop(0))
+    header = []
+    if lines and not SEPARATOR_RE.match(lines[0].strip()):
+        header.append(lines.pop(0))
+    if lines and SEPARATOR_RE.match(lines[0].strip()):
+        header.append(lines.pop(0))
+    # period headings and units often sit in the first body rows
+    while lines and len(header) < MAX_HEADER_ROWS + 2 and not extract_numbers(lines[0]):
+        header.append(lines.pop(0))
+    return preamble, header, lines
+
+
+def header_periods(header: List[str]):
+    text = " ".join(header)
+    years = list(dict.fromkeys(YEAR_RE.findall(text)))
+    label = PERIOD_LABEL_RE.search(text)
+    return years, (" ".join(label.group(1).split()).title() if label else None)
+
+
+class TableNodeParser(NodeParser):
+    """Row-boundary chunks of markdown tables, each with the table's header rows repeated."""
+
+    chunk_size: int = Field(default=1024, description="Token budget per chunk, header included.")
+    chunk_overlap: int = Field(default=0, description="Tokens of trailing rows repeated in the next chunk.")
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(self, tokenizer: Optional[Callable] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TableNodeParser"
+
+    def _tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def chunk_rows(self, head: str, rows: List[str]) -> List[tuple]:
+        """Greedy row packing: [(first_row, last_row_exclusive)] so head + rows fits chunk_size."""
+        budget = max(self.chunk_size - self._tokens(head), 1)
+        sizes = [self._tokens(r) + 1 for r in rows]
+        ranges, start = [], 0
+        while start < len(rows):
+            end, used = start, 0
+            # always take at least one row, even if it alone is over budget
+            while end < len(rows) and (end == start or used + sizes[end] <= budget):
+                used += sizes[end]
+                end += 1
+            ranges.append((start, end))
+            if end >= len(rows):
+                break
+            # step back over up to chunk_overlap tokens of rows, but always make progress
+            back, carried = end, 0
+            while back - 1 > start and carried + sizes[back - 1] <= self.chunk_overlap:
+                back -= 1
+                carried += sizes[back]
+            start = back
+        return ranges
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        out = []
+        for node in nodes:
+            text = node.get_content()
+            preamble, header, rows = split_table(text)
+            if not rows:
+                # nothing but a header (or not a table at all): keep it whole
+                out.extend(build_nodes_from_splits([text], node, id_func=self.id_func))
+                continue
+            head = "\n".join(preamble + header)
+            years, label = header_periods(header)
+            ranges = self.chunk_rows(head, rows)
+            splits = [head + "\n" + "\n".join(rows[a:b]) for a, b in ranges]
+            chunk_nodes = build_nodes_from_splits(splits, node, id_func=self.id_func)
+            for i, (chunk_node, (a, b)) in enumerate(zip(chunk_nodes, ranges)):
+                chunk_node.metadata.update({
+                    "table_rows": f"{a + 1}-{b} of {len(rows)}",
+                    "table_chunk": f"{i + 1}/{len(ranges)}",
+                })
+                if years:
+                    chunk_node.metadata["periods"] = ", ".join(years)
+                if label:
+                    chunk_node.metadata["period_label"] = label
+                chunk_node.excluded_embed_metadata_keys = [*chunk_node.excluded_embed_metadata_keys, *LOCATION_KEYS]
+                out.append(chunk_node)
+        return out
@@ -0,0 +1,141 @@
+# table_format.py
+"""
+Compact markdown for SEC financial tables.
+
+EDGAR HTML lays a table out on a grid of narrow cells: spacer columns between figures, the "$"
+and the closing ")" of a negative number in cells of their own, and period headings spread over
+two or three header rows with colspans. Rendered cell-for-cell (to_markdown_from_table) most of
+the markdown is pipes and blanks, and every one of those tokens is paid for again in embedding,
+LLMRerank and TreeSummarize. compact_table:
+
+  - merges "$", ")" and "%" cells into the figure next to them and writes negatives as "-1,234"
+  - drops columns that are empty in every data row (spacers, the emptied "$"/")" columns)
+  - collapses the header rows into one row per column ("Years Ended December 31, 2023"), hoisting
+    a heading shared by every figure column into a caption line above the table
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Sequence, Tuple
+
+from grounding import extract_numbers
+
+# leading rows without figures are header rows (titles, period headings, units), at most this many
+MAX_HEADER_ROWS = 4
+_SPAN = object()  # grid slot covered by a colspan to its left
+_WS_RE = re.compile(r"\s+")
+_PAREN_RE = re.compile(r"^(\$?)\((\$?)([\d,.]+)\)(%?)$")
+_FIGURE_RE = re.compile(r"^[$()\d,.%\s]*\d[$()\d,.%\s]*$")
+_FIGURE_GAP_RE = re.compile(r"(?<=[$(])\s+|\s+(?=[)%])")
+
+
+def clean_text(text: str) -> str:
+    return _WS_RE.sub(" ", (text or "").replace("\xa0", " ")).strip()
+
+
+def table_cells(table) -> List[List[Tuple[str, int]]]:
+    """(text, colspan) for every cell of a BeautifulSoup <table>, row by row. Strings inside a cell are space-joined."""
+    rows = []
+    for tr in table.find_all("tr"):
+        row = []
+        for td in tr.find_all(["td", "th"]):
+            try:
+                span = max(1, int(td.get("colspan", 1)))
+            except (TypeError, ValueError):
+                span = 1
+            row.append((clean_text(" ".join(td.stripped_strings)), span))
+        rows.append(row)
+    return rows
+
+
+def _grid(cell_rows: Sequence[Sequence]) -> List[list]:
+    grid = []
+    for row in cell_rows:
+        out = []
+        for cell in row:
+            text, span = cell if isinstance(cell, tuple) else (cell, 1)
+            out.append(clean_text(str(text)))
+            out.extend([_SPAN] * (min(span, 50) - 1))
+        grid.append(out)
+    width = max((len(r) for r in grid), default=0)
+    return [r + [""] * (width - len(r)) for r in grid]
+
+
+def _signed(cell: str) -> str:
+    if _FIGURE_RE.match(cell):
+        cell = _FIGURE_GAP_RE.sub("", cell)  # "$ ( 1,234 )" from space-joined cell strings
+    m = _PAREN_RE.match(cell)
+    if not m:
+        return cell
+    return f"-{m.group(1) or m.group(2)}{m.group(3)}{m.group(4)}"
+
+
+def _merge_figures(row: list) -> list:
+    """Fold "$" into the next figure and ")"/"%" into the previous one, then sign parenthesised negatives."""
+    row = ["" if c is _SPAN else c for c in row]
+    for j, cell in enumerate(row):
+        if cell == "$":
+            nxt = next((k for k in range(j + 1, len(row)) if row[k]), None)
+            if nxt is not None:
+                row[nxt] = "$" + row[nxt]
+                row[j] = ""
+        elif cell in (")", "%", ")%"):
+            prev = next((k for k in range(j - 1, -1, -1) if row[k]), None)
+            if prev is not None:
+                row[prev] = row[prev] + cell
+                row[j] = ""
+    return [_signed(c) for c in row]
+
+
+def compact_table(cell_rows: Sequence[Sequence]) -> Tuple[List[str], List[List[str]]]:
+    """
+    (caption lines, rows) where rows[0] is the collapsed header. Accepts table_cells() output or
+    plain lists of strings (parse_table).
+    """
+    grid = [r for r in _grid(cell_rows) if any(c for c in r if c is not _SPAN)]
+    if not grid:
+        return [], []
+    n_header = 0
+    while (n_header < min(MAX_HEADER_ROWS, len(grid) - 1)
+           and not extract_numbers(" ".join(c for c in grid[n_header] if c is not _SPAN))):
+        n_header += 1
+    header, body = grid[:n_header], [_merge_figures(r) for r in grid[n_header:]]
+
+    # a colspan heading covers every column under it
+    for row in header:
+        for j in range(1, len(row)):
+            if row[j] is _SPAN:
+                row[j] = row[j - 1]
+
+    width = len(grid[0])
+    keep = [j for j in range(width) if j == 0 or any(r[j] for r in body)]
+    if not body:
+        keep = [j for j in range(width) if j == 0 or any(r[j] for r in header)]
+
+    captions, titles = [], {j: [] for j in keep}
+    for row in header:
+        figure_cols = [row[j] for j in keep[1:] if row[j]]
+        if len(keep) > 2 and len(figure_cols) == len(keep) - 1 and len(set(figure_cols)) == 1:
+            # same heading over every figure column: say it once
+            captions.append(figure_cols[0])
+            if row[0]:
+                titles[0].append(row[0])
+            continue
+        for j in keep:
+            if row[j] and row[j] not in titles[j]:
+                titles[j].append(row[j])
+    head = [" ".join(titles[j]) for j in keep]
+    rows = [[r[j] for j in keep] for r in body]
+    return captions, [head] + [r for r in rows if any(r)]
+
+
+def to_compact_markdown(cell_rows: Sequence[Sequence]) -> str:
+    captions, rows = compact_table(cell_rows)
+    if not rows:
+        return "⚠️ Table is empty or malformed."
+    md = "".join(c + "\n" for c in captions)
+    md += "| " + " | ".join(rows[0]) + " |\n"
+    md += "|" + "---|" * len(rows[0]) + "\n"
+    for row in rows[1:]:
+        md += "| " + " | ".join(row) + " |\n"
+    return md
@@ -0,0 +1,139 @@
+# tracing.py
+from __future__ import annotations
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class Tracer:
+    """
+    Process-wide collector of timed spans. Each span has a name (the pipeline stage), a duration
+    and numeric attributes such as bytes, nodes or LLM/embedding token counts.
+
+        with span("download", url=url) as s:
+            ...
+            s["bytes"] = len(resp.content)
+
+    When llama_index callbacks are installed (install_llama_callbacks), every span also records
+    the prompt/completion/embedding tokens spent while it was open; spans that overlap (the
+    concurrent retrieval branches) each see the combined count.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.spans: List[Dict] = []
+        self.started = time.perf_counter()
+        self.token_counter = None  # llama_index TokenCountingHandler
+
+    def reset(self) -> None:
+        with self.lock:
+            self.spans = []
+            self.started = time.perf_counter()
+
+    def _tokens(self) -> Dict[str, int]:
+        c = self.token_counter
+        if c is None:
+            return {}
+        return {
+            "prompt_tokens": c.prompt_llm_token_count,
+            "completion_tokens": c.completion_llm_token_count,
+            "embedding_tokens": c.total_embedding_token_count,
+        }
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        attrs = dict(attrs)
+        before = self._tokens()
+        t0 = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, time.perf_counter() - t0, before, **attrs)
+
+    def record(self, name: str, seconds: float, tokens_before: Optional[Dict[str, int]] = None, **attrs) -> None:
+        if tokens_before is not None:
+            for k, v in self._tokens().items():
+                if v - tokens_before.get(k, v):
+                    attrs[k] = attrs.get(k, 0) + v - tokens_before[k]
+        with self.lock:
+            self.spans.append({"name": name, "ms": round(seconds * 1000, 1), **attrs})
+
+    def summary(self) -> Dict:
+        """Per-stage totals: {"total_ms", "stages": {name: {count, ms, max_ms, <summed numeric attrs>}}}."""
+        with self.lock:
+            spans = list(self.spans)
+            total_ms = round((time.perf_counter() - self.started) * 1000, 1)
+        stages: Dict[str, Dict] = {}
+        for s in spans:
+            st = stages.setdefault(s["name"], {"count": 0, "ms": 0.0, "max_ms": 0.0})
+            st["count"] += 1
+            st["ms"] = round(st["ms"] + s["ms"], 1)
+            st["max_ms"] = max(st["max_ms"], s["ms"])
+            for k, v in s.items():
+                if k in ("name", "ms") or isinstance(v, bool) or not isinstance(v, (int, float)):
+                    continue
+                st[k] = st.get(k, 0) + v
+        return {"total_ms": total_ms, "stages": stages}
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attrs):
+    return tracer.span(name, **attrs)
+
+
+def install_llama_callbacks():
+    """
+    Route llama_index callback events into the tracer (retrieve, rerank, summarize, llm, embed
+    spans) and count tokens. Returns the CallbackManager, which is also set on Settings.
+    """
+    from llama_index.core.callbacks import CallbackManager, CBEventType, EventPayload, TokenCountingHandler
+    from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+    from llama_index.core.settings import Settings
+
+    names = {
+        CBEventType.RETRIEVE: "retrieve",
+        CBEventType.RERANKING: "rerank",
+        CBEventType.SYNTHESIZE: "summarize",
+        CBEventType.LLM: "llm_call",
+        CBEventType.EMBEDDING: "embed_call",
+    }
+
+    class SpanHandler(BaseCallbackHandler):
+        def __init__(self) -> None:
+            super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+            self.open: Dict[str, tuple] = {}
+
+        def on_event_start(self, event_type, payload=None, event_id="", parent_id="", **kwargs) -> str:
+            if event_type in names:
+                self.open[event_id] = (time.perf_counter(), tracer._tokens())
+            return event_id
+
+        def on_event_end(self, event_type, payload=None, event_id="", **kwargs) -> None:
+            started = self.open.pop(event_id, None)
+            if started is None:
+                return
+            t0, before = started
+            attrs = {}
+            nodes = (payload or {}).get(EventPayload.NODES)
+            if nodes is not None:
+                attrs["nodes"] = len(nodes)
+            tracer.record(names[event_type], time.perf_counter() - t0, before, **attrs)
+
+        def start_trace(self, trace_id=None) -> None:
+            pass
+
+        def end_trace(self, trace_id=None, trace_map=None) -> None:
+            pass
+
+    # the token counter goes first so its totals are already updated when SpanHandler closes a span
+    counter = TokenCountingHandler()
+    tracer.token_counter = counter
+    Settings.callback_manager = CallbackManager([counter, SpanHandler()])
+    return Settings.callback_manager
@@ -0,0 +1,440 @@
+# vector_codec.py
+"""
+Compact vector storage for the index snapshots (SnapshotStore's vector store).
+
+SimpleVectorStore keeps every embedding as a list of Python floats and persists it as JSON:
+a 3072-dim text-embedding-3-large vector is ~100 KB resident (a float object plus a list slot
+per dimension) and ~60 KB on disk, and every query walks those lists. QuantizedVectorStore
+keeps the same metadata/ref-doc bookkeeping but holds the vectors in numpy:
+
+    codes    (n, dims) float32 | float16 | int8, resident; int8 adds one float32 scale per row
+    full     (n, dims) float32 on disk, memory-mapped; only read for the top candidates
+
+Vectors are cut to `dims` and renormalized (text-embedding-3 models are trained so a prefix
+of the embedding is itself a usable embedding; the API's `dimensions` parameter does the same),
+queries too. A query scores every row against the compact codes, then rescores the best
+k * rescore candidates against the full-precision rows, so int8 keeps float32 ranking at the top.
+
+    default__vector_store.json            metadata, ref doc ids, row -> node id, codec header
+    default__vector_store.codes.npy
+    default__vector_store.scales.npy      int8 only
+    default__vector_store.full.npy        float16/int8 only
+
+Configured by EMBED_DIMENSIONS (default: the model's full size) and EMBED_DTYPE (float32, float16
+or int8; default float32) and EMBED_RESCORE (default 4). A snapshot keeps the codec it was written
+with; a pre-codec JSON snapshot is converted on load. To rewrite every shard with the configured codec:
+
+    python3 app/vector_codec.py --persist-dir ./store10k10q --dtype int8 --dimensions 1024
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import argparse
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import (
+    SimpleVectorStore, SimpleVectorStoreData, _build_metadata_filter_fn,
+)
+from llama_index.core.vector_stores.types import (
+    DEFAULT_PERSIST_FNAME, VectorStoreQuery, VectorStoreQueryMode, VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# rows scored per step, so the float32 copy of an int8/float16 block stays small at 3072 dims
+SCAN_ROWS = 4096
+
+
+@dataclass(frozen=True)
+class VectorCodec:
+    dims: Optional[int] = None  # None: keep whatever size the embedding model returns
+    dtype: str = "float32"
+    rescore: int = 4  # candidates rescored at full precision, as a multiple of top k
+
+    def __post_init__(self) -> None:
+        if self.dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {tuple(DTYPES)}, got {self.dtype!r}")
+        if self.dims is not None and self.dims < 1:
+            raise ValueError(f"dims must be positive, got {self.dims}")
+
+    @classmethod
+    def from_env(cls) -> "VectorCodec":
+        dims = os.getenv("EMBED_DIMENSIONS", "")
+        return cls(dims=int(dims) if dims else None, dtype=os.getenv("EMBED_DTYPE", "float32"),
+                   rescore=int(os.getenv("EMBED_RESCORE", "4")))
+
+    @property
+    def exact(self) -> bool:
+        return self.dtype == "float32"
+
+    def bytes_per_vector(self, dims: int) -> int:
+        """Resident bytes per stored vector (the memory-mapped full-precision copy isn't counted)."""
+        return dims * np.dtype(DTYPES[self.dtype]).itemsize + (4 if self.dtype == "int8" else 0)
+
+    def __str__(self) -> str:
+        return f"{self.dtype}x{self.dims or 'full'}"
+
+
+def unit_rows(vectors, dims: Optional[int] = None) -> np.ndarray:
+    """float32 rows cut to `dims` and scaled to unit length."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix = matrix.reshape(len(matrix), -1) if matrix.ndim != 2 else matrix
+    if dims is not None:
+        if matrix.shape[1] < dims:
+            raise ValueError(f"embeddings have {matrix.shape[1]} dims, the index stores {dims}; "
+                             f"re-embed or migrate the index (vector_codec.py)")
+        matrix = matrix[:, :dims]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def quantize(unit: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(codes, per-row scales) for unit rows; scales only for int8 (symmetric, max |x| -> 127)."""
+    if dtype != "int8":
+        return unit.astype(DTYPES[dtype]), None
+    scales = np.abs(unit).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(unit / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column positions of the k best scores per row, best first."""
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class QuantizedVectorStore(SimpleVectorStore):
+    """
+    SimpleVectorStore with numpy rows instead of the JSON embedding_dict (which stays empty).
+    Deleted rows are only marked dead; persist writes the live ones.
+    """
+
+    _codec: VectorCodec = PrivateAttr()
+    _dims: Optional[int] = PrivateAttr(default=None)
+    _ids: List[Optional[str]] = PrivateAttr(default_factory=list)
+    _row: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _live: np.ndarray = PrivateAttr(default=None)
+    _codes: np.ndarray = PrivateAttr(default=None)
+    _scales: Optional[np.ndarray] = PrivateAttr(default=None)
+    # full-precision rows: the first len(_full_disk) memory-mapped from the snapshot, the rest added since
+    _full_disk: Optional[np.ndarray] = PrivateAttr(default=None)
+    _full_new: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def __init__(self, codec: Optional[VectorCodec] = None, data: Optional[SimpleVectorStoreData] = None,
+                 **kwargs: Any) -> None:
+        super().__init__(data=data, **kwargs)
+        self._codec = codec or VectorCodec()
+        self._dims = self._codec.dims
+        self._reset()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QuantizedVectorStore"
+
+    def _reset(self) -> None:
+        dims = self._dims or 0
+        self._ids, self._row = [], {}
+        self._live = np.zeros(0, dtype=bool)
+        self._codes = np.zeros((0, dims), dtype=DTYPES[self._codec.dtype])
+        self._scales = np.zeros(0, dtype=np.float32) if self._codec.dtype == "int8" else None
+        self._full_disk = None
+        self._full_new = None if self._codec.exact else np.zeros((0, dims), dtype=np.float32)
+
+    # -------------------------------
+    # Rows
+    # -------------------------------
+    @property
+    def codec(self) -> VectorCodec:
+        return self._codec
+
+    @property
+    def dims(self) -> Optional[int]:
+        return self._dims
+
+    @property
+    def count(self) -> int:
+        return int(self._live.sum())
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self._live)
+
+    def row_of(self, node_id: str) -> Optional[int]:
+        return self._row.get(node_id)
+
+    def node_id(self, row: int) -> Optional[str]:
+        return self._ids[row]
+
+    def resident_bytes(self) -> int:
+        """Memory held by the vectors (codes, scales, rows added since load); the mapped full rows aren't counted."""
+        total = self._codes.nbytes + self._live.nbytes
+        for extra in (self._scales, self._full_new):
+            if extra is not None:
+                total += extra.nbytes
+        return total
+
+    def _append(self, node_ids: Sequence[str], vectors) -> None:
+        if not len(node_ids):
+            return
+        if self._dims is None:
+            self._dims = int(np.asarray(vectors[0]).shape[-1])
+            self._reset()
+        unit = unit_rows(vectors, self._dims)
+        codes, scales = quantize(unit, self._codec.dtype)
+        for node_id in node_ids:
+            old = self._row.get(node_id)
+            if old is not None:
+                self._live[old] = False
+            self._row[node_id] = len(self._ids)
+            self._ids.append(node_id)
+        self._codes = np.concatenate([self._codes, codes])
+        self._live = np.concatenate([self._live, np.ones(len(node_ids), dtype=bool)])
+        if scales is not None:
+            self._scales = np.concatenate([self._scales, scales])
+        if not self._codec.exact:
+            self._full_new = np.concatenate([self._full_new, unit])
+
+    def _drop(self, node_id: str) -> None:
+        row = self._row.pop(node_id, None)
+        if row is not None:
+            self._live[row] = False
+            self._ids[row] = None
+        self.data.text_id_to_ref_doc_id.pop(node_id, None)
+        if self.data.metadata_dict is not None:
+            self.data.metadata_dict.pop(node_id, None)
+
+    def full_vectors(self, rows) -> np.ndarray:
+        """Full-precision (unit, float32) rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if self._codec.exact:
+            return self._codes[rows]
+        on_disk = 0 if self._full_disk is None else len(self._full_disk)
+        out = np.empty((len(rows), self._dims), dtype=np.float32)
+        disk = rows < on_disk
+        if disk.any():
+            # memory-mapped reads are cheaper in file order
+            order = np.argsort(rows[disk])
+            picked = np.asarray(self._full_disk[rows[disk][order]], dtype=np.float32)
+            out[np.flatnonzero(disk)[order]] = picked
+        if (~disk).any():
+            out[~disk] = self._full_new[rows[~disk] - on_disk]
+        return out
+
+    # -------------------------------
+    # Scoring
+    # -------------------------------
+    def prepare_queries(self, queries) -> np.ndarray:
+        return unit_rows(queries, self._dims)
+
+    def approximate_scores(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """(queries x rows) dot products against the stored codes; queries from prepare_queries."""
+        out = np.empty((len(queries), len(rows)), dtype=np.float32)
+        # a run of consecutive rows (no deletions) is sliced instead of copied out
+        contiguous = len(rows) > 0 and rows[-1] - rows[0] + 1 == len(rows)
+        for a in range(0, len(rows), SCAN_ROWS):
+            if contiguous:
+                block = slice(rows[0] + a, rows[0] + min(a + SCAN_ROWS, len(rows)))
+            else:
+                block = rows[a:a + SCAN_ROWS]
+            scores = queries @ self._codes[block].astype(np.float32, copy=False).T
+            if self._scales is not None:
+                scores *= self._scales[block]
+            out[:, a:a + SCAN_ROWS] = scores
+        return out
+
+    def search(self, queries, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top k rows per query by cosine similarity: (rows (queries x k), scores), best first. `rows`
+        restricts the search (default: every live row). Scores are full precision.
+        """
+        queries = self.prepare_queries(queries)
+        rows = self.live_rows() if rows is None else np.asarray(rows, dtype=np.int64)
+        k = min(k, len(rows))
+        if k <= 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        scores = self.approximate_scores(queries, rows)
+        if self._codec.exact:
+            best = _top(scores, k)
+            return rows[best], np.take_along_axis(scores, best, axis=1)
+        candidates = _top(scores, min(len(rows), k * max(1, self._codec.rescore)))
+        unique, inverse = np.unique(rows[candidates], return_inverse=True)
+        exact = np.take_along_axis(queries @ self.full_vectors(unique).T, inverse.reshape(candidates.shape), axis=1)
+        best = _top(exact, k)
+        return rows[np.take_along_axis(candidates, best, axis=1)], np.take_along_axis(exact, best, axis=1)
+
+    # -------------------------------
+    # SimpleVectorStore interface
+    # -------------------------------
+    def get(self, text_id: str) -> List[float]:
+        row = self._row.get(text_id)
+        if row is None:
+            raise KeyError(text_id)
+        return self.full_vectors([row])[0].tolist()
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        nodes = list(nodes)
+        if not nodes:
+            return []
+        self._append([n.node_id for n in nodes], [n.get_embedding() for n in nodes])
+        for node in nodes:
+            self.data.text_id_to_ref_doc_id[node.node_id] = node.ref_doc_id or "None"
+            metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=False)
+            metadata.pop("_node_content", None)
+            self.data.metadata_dict[node.node_id] = metadata
+        return [n.node_id for n in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        for text_id in [t for t, r in self.data.text_id_to_ref_doc_id.items() if r == ref_doc_id]:
+            self._drop(text_id)
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters=None, **delete_kwargs: Any) -> None:
+        filter_fn = _build_metadata_filter_fn(lambda node_id: self.data.metadata_dict[node_id], filters)
+        wanted = set(node_ids) if node_ids is not None else None
+        for node_id in [i for i in self._row if (wanted is None or i in wanted) and filter_fn(i)]:
+            self._drop(node_id)
+
+    def clear(self) -> None:
+        self.data = SimpleVectorStoreData()
+        self._reset()
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"QuantizedVectorStore only supports the default query mode, got {query.mode}")
+        if query.filters is not None and self._row and not self.data.metadata_dict:
+            raise ValueError("Cannot filter stores that were persisted without metadata. "
+                             "Please rebuild the store with metadata to enable filtering.")
+        if not self._row or query.query_embedding is None:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        rows = None
+        if query.filters is not None or query.node_ids is not None:
+            filter_fn = _build_metadata_filter_fn(lambda node_id: self.data.metadata_dict[node_id], query.filters)
+            wanted = set(query.node_ids) if query.node_ids is not None else None
+            rows = np.array(sorted(r for i, r in self._row.items() if (wanted is None or i in wanted) and filter_fn(i)),
+                            dtype=np.int64)
+        best, scores = self.search([query.query_embedding], query.similarity_top_k, rows)
+        return VectorStoreQueryResult(similarities=[float(s) for s in scores[0]],
+                                      ids=[self._ids[r] for r in best[0]])
+
+    # -------------------------------
+    # Persistence
+    # -------------------------------
+    @staticmethod
+    def _sidecar(persist_path: str, part: str) -> str:
+        base = persist_path[:-5] if persist_path.endswith(".json") else persist_path
+        return f"{base}.{part}.npy"
+
+    def persist(self, persist_path: str = os.path.join("./storage", DEFAULT_PERSIST_FNAME), fs=None) -> None:
+        os.makedirs(os.path.dirname(persist_path) or ".", exist_ok=True)
+        live = self.live_rows()
+        np.save(self._sidecar(persist_path, "codes"), self._codes[live])
+        if self._scales is not None:
+            np.save(self._sidecar(persist_path, "scales"), self._scales[live])
+        if not self._codec.exact:
+            full = np.lib.format.open_memmap(self._sidecar(persist_path, "full"), mode="w+", dtype=np.float32,
+                                             shape=(len(live), self._dims or 0))
+            for a in range(0, len(live), SCAN_ROWS):
+                full[a:a + SCAN_ROWS] = self.full_vectors(live[a:a + SCAN_ROWS])
+            full.flush()
+            del full
+        header = {**asdict(self._codec), "dims": self._dims}
+        data = {**self.data.to_dict(), "embedding_dict": {}, "codec": header,
+                "ids": [self._ids[r] for r in live]}
+        with open(persist_path, "w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, fs=None, codec: Optional[VectorCodec] = None) -> "QuantizedVectorStore":
+        """
+        Load a persisted store. One written by this class keeps its own codec (a differing `codec`
+        is only reported); a plain SimpleVectorStore JSON file is converted to `codec`.
+        """
+        if not os.path.exists(persist_path):
+            raise ValueError(f"No existing {__name__} found at {persist_path}, skipping load.")
+        with open(persist_path, "r") as f:
+            raw = json.load(f)
+        header, ids = raw.pop("codec", None), raw.pop("ids", None)
+        embeddings = raw.pop("embedding_dict", None) or {}
+        data = SimpleVectorStoreData.from_dict({**raw, "embedding_dict": {}})
+        if header is None:
+            store = cls(codec=codec, data=data)
+            store._append(list(embeddings), list(embeddings.values()))
+            if embeddings:
+                print(f"Converted {len(embeddings)} JSON embeddings to {store.codec}")
+            return store
+
+        stored = VectorCodec(**header)
+        store = cls(codec=stored, data=data)
+        store._ids = list(ids)
+        store._row = {node_id: row for row, node_id in enumerate(ids)}
+        store._live = np.ones(len(ids), dtype=bool)
+        store._codes = np.load(cls._sidecar(persist_path, "codes"))
+        if stored.dtype == "int8":
+            store._scales = np.load(cls._sidecar(persist_path, "scales"))
+        if not stored.exact:
+            store._full_disk = np.load(cls._sidecar(persist_path, "full"), mmap_mode="r")
+            store._full_new = np.zeros((0, stored.dims or 0), dtype=np.float32)
+        if codec is not None and (codec.dtype != stored.dtype or (codec.dims and codec.dims != stored.dims)):
+            print(f"Index at {os.path.dirname(persist_path)} is stored as {stored}, configured {codec}; "
+                  f"run app/vector_codec.py to convert it")
+        return store
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str = "./storage", namespace: str = "default", fs=None,
+                         codec: Optional[VectorCodec] = None) -> "QuantizedVectorStore":
+        return cls.from_persist_path(os.path.join(persist_dir, f"{namespace}__{DEFAULT_PERSIST_FNAME}"), codec=codec)
+
+    def recoded(self, codec: VectorCodec) -> "QuantizedVectorStore":
+        """A copy of this store's live rows in another codec (dims can only shrink)."""
+        dims = codec.dims or self._dims
+        if self._dims is not None and dims is not None and dims > self._dims:
+            raise ValueError(f"can't widen {self._dims}-dim vectors to {dims}; re-embed the filings instead")
+        out = QuantizedVectorStore(codec=VectorCodec(dims=dims, dtype=codec.dtype, rescore=codec.rescore),
+                                   data=SimpleVectorStoreData.from_dict({**self.data.to_dict(), "embedding_dict": {}}))
+        live = self.live_rows()
+        for a in range(0, len(live), SCAN_ROWS):
+            rows = live[a:a + SCAN_ROWS]
+            out._append([self._ids[r] for r in rows], self.full_vectors(rows))
+        return out
+
+
+def snapshot_bytes(path: str) -> int:
+    """Size of the persisted index files in a snapshot directory (a pre-snapshot root holds other files too)."""
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+               if f.endswith((".json", ".npy")) and os.path.isfile(os.path.join(path, f)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite every index shard with another vector codec")
+    parser.add_argument("--persist-dir", default="./store10k10q")
+    parser.add_argument("--dtype", choices=list(DTYPES), default=os.getenv("EMBED_DTYPE", "float32"))
+    parser.add_argument("--dimensions", type=int, default=int(os.getenv("EMBED_DIMENSIONS") or 0) or None,
+                        help="keep the first N dims of each vector (default: as stored)")
+    parser.add_argument("--rescore", type=int, default=int(os.getenv("EMBED_RESCORE", "4")))
+    args = parser.parse_args()
+
+    from shard_store import ShardedStore
+    codec = VectorCodec(dims=args.dimensions, dtype=args.dtype, rescore=args.rescore)
+    store = ShardedStore(args.persist_dir, codec=codec)
+    report = {}
+    for key in store.keys():
+        report[key] = store._store(key).recode(codec)
+        print(f"Shard {key}: {report[key]}", file=sys.stderr)
+    # a shard with no snapshot yet reports just {"version": None}
+    before = sum(r.get("bytes_before", 0) for r in report.values())
+    after = sum(r.get("bytes_after", 0) for r in report.values())
+    print(json.dumps({"codec": str(codec), "shards": report, "bytes_before": before, "bytes_after": after}, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# worker_py/bench/fake_embedding.py
+import re
+import math
+import hashlib
+from typing import List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+
+def hash_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic bag-of-words embedding: each token adds +/-1 to a hashed bucket, then L2-normalized."""
+    vec = [0.0] * dim
+    for token in re.findall(r"\w+", text.lower()):
+        h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Offline stand-in for OpenAIEmbedding: no network, same vector for the same text,
+    and texts sharing words land close together, so retrieval behaves sensibly.
+    """
+
+    dim: int = 64
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dim)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return hash_embedding(query, self.dim)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
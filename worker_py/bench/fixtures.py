@@ -0,0 +1,110 @@
+# worker_py/bench/fixtures.py
+"""
+Synthetic 10-K/10-Q HTML for the benchmarks. The markup mimics what EDGAR filings look like
+to FilingParserAgent: an SEC header, "Item N." headings, "Note N" blocks and financial tables
+with spacer cells, split "$" cells and parenthesised negatives. Content is generated from a
+fixed seed, so a given size always produces the same bytes.
+
+    python3 bench/fixtures.py            # (re)write bench/fixtures/*.htm
+
+The small fixture is checked in; medium and large are generated on first use.
+"""
+import os
+import random
+from pathlib import Path
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# name -> (items, notes per item, tables per note, rows per table, years per table)
+SIZES = {
+    "small": (4, 3, 2, 12, 3),
+    "medium": (12, 8, 3, 20, 3),
+    "large": (20, 15, 4, 30, 3),
+}
+
+LINE_ITEMS = [
+    "Net sales", "Cost of sales", "Gross margin", "Research and development",
+    "Selling, general and administrative", "Total operating expenses", "Operating income",
+    "Other income/(expense), net", "Income before provision for income taxes",
+    "Provision for income taxes", "Net income", "Earnings per share: Basic", "Earnings per share: Diluted",
+    "Cash and cash equivalents", "Accounts receivable, net", "Inventories", "Total current assets",
+    "Property, plant and equipment, net", "Total assets", "Accounts payable", "Deferred revenue",
+    "Total liabilities", "Retained earnings", "Total shareholders’ equity", "Depreciation and amortization",
+    "Share-based compensation expense", "Cash generated by operating activities",
+]
+
+PROSE = (
+    "The Company designs, manufactures and markets products and services worldwide. "
+    "Results of operations may vary materially due to macroeconomic conditions, competition, "
+    "supply chain constraints and changes in foreign currency exchange rates. "
+    "Management believes its existing balances of cash and marketable securities will be "
+    "sufficient to satisfy its working capital needs and contractual obligations. "
+)
+
+
+def _cell(text, spacer=False):
+    style = ' style="width:1%"' if spacer else ""
+    return f"<td{style}><span>{text}</span></td>"
+
+
+def _number(rng):
+    value = rng.randint(-90_000, 400_000)
+    return f"({abs(value):,}" if value < 0 else f"{value:,}", value < 0
+
+
+def _table(rng, rows, years, fy):
+    head = [_cell("")]
+    for y in range(years):
+        head += [_cell("", spacer=True), _cell(f"<b>{fy - y}</b>"), _cell("", spacer=True)]
+    out = ["<table>", "<tr>" + "".join(head) + "</tr>"]
+    for r in range(rows):
+        label = LINE_ITEMS[(r + rng.randint(0, 5)) % len(LINE_ITEMS)]
+        cells = [_cell(label)]
+        for _ in range(years):
+            num, negative = _number(rng)
+            # EDGAR style: "$" and the closing ")" live in their own cells around the number
+            cells += [_cell("$" if r % 5 == 0 else ""), _cell(num), _cell(")" if negative else "", spacer=True)]
+        out.append("<tr>" + "".join(cells) + "</tr>")
+    out.append("</table>")
+    return "\n".join(out)
+
+
+def make_filing(size: str = "small", form_type: str = "10-K", seed: int = 7) -> str:
+    items, notes, tables, rows, years = SIZES[size]
+    rng = random.Random(f"{size}-{form_type}-{seed}")
+    fy = 2023
+    parts = [
+        "<html><head><title>Synthetic filing</title></head><body>",
+        "<div><p>SEC-HEADER</p><p>CONFORMED SUBMISSION TYPE: %s</p>" % form_type,
+        "<p>FILED AS OF DATE: %d1103</p><p>CENTRAL INDEX KEY: 0000999999</p></div>" % fy,
+        f"<div><p>UNITED STATES SECURITIES AND EXCHANGE COMMISSION</p><p>Form {form_type}</p></div>",
+    ]
+    for i in range(1, items + 1):
+        parts.append(f"<div><p>Item {i}. Section {i} of the synthetic report</p></div>")
+        parts.append(f"<p>{PROSE * rng.randint(2, 6)}</p>")
+        for n in range(1, notes + 1):
+            note_no = (i - 1) * notes + n
+            parts.append(f"<p>Note {note_no} – Supplementary information</p>")
+            parts.append(f"<p>{PROSE * rng.randint(1, 3)}</p>")
+            for _ in range(tables):
+                parts.append(f"<div>{_table(rng, rows, years, fy)}</div>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def fixture_path(size: str, form_type: str = "10-K") -> Path:
+    """Path of the fixture for `size`, generating it if it isn't on disk yet."""
+    path = FIXTURE_DIR / f"synthetic_{form_type}_{size}.htm"
+    if not path.exists():
+        os.makedirs(FIXTURE_DIR, exist_ok=True)
+        path.write_text(make_filing(size, form_type), encoding="utf-8")
+    return path
+
+
+if __name__ == "__main__":
+    for name in SIZES:
+        p = FIXTURE_DIR / f"synthetic_10-K_{name}.htm"
+        if p.exists():
+            p.unlink()
+        p = fixture_path(name)
+        print(f"{p} {p.stat().st_size / 1e6:.2f} MB")
@@ -0,0 +1,559 @@
+# worker_py/bench/run_benchmarks.py
+"""
+Offline micro-benchmarks for the worker: no sec-api.io, no OpenAI (embeddings come from
+HashEmbedding), inputs are the synthetic filings in bench/fixtures.
+
+    python3 bench/run_benchmarks.py                         # everything, default corpus sizes
+    python3 bench/run_benchmarks.py --only parse,nodes
+    python3 bench/run_benchmarks.py --sizes 1000,10000,100000,1000000
+    python3 bench/run_benchmarks.py --baseline bench/results/baseline.json --check
+
+Each run writes {"meta": ..., "metrics": {name: value}} to bench/results/. --check fails
+(exit 1) if a metric crosses its floor/ceiling in bench/thresholds.json, or is more than
+`tolerance` worse than the --baseline run. Metric names ending in _per_s, _reduction and recall
+are higher-is-better; everything else (_ms, _s, _mb, _x) is lower-is-better.
+"""
+import os, re, sys, json, time, random, platform, argparse, tempfile, statistics, subprocess, tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+# FilingParserAgent builds an OpenAIEmbedding handle on construction; it is never called here
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+from fixtures import SIZES, fixture_path
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def percentile(samples: List[float], q: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def timed(fn, repeat: int):
+    """Run fn `repeat` times; returns (median seconds, last result)."""
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), result
+
+
+def make_parser(path: Path, **kwargs):
+    from llama_index.core.settings import Settings
+    from FilingParserAgent import FilingParserAgent
+    from fake_embedding import HashEmbedding
+    parser = FilingParserAgent(file_path=str(path), identity="benchmark bench@example.com", **kwargs)
+    Settings.embed_model = parser.embed_model = HashEmbedding()
+    return parser
+
+
+# -------------------------------
+# Benchmarks
+# -------------------------------
+@benchmark("parse")
+def bench_parse(args) -> Dict[str, float]:
+    """parse_10k_financial_tables throughput per fixture size."""
+    out = {}
+    for size in args.fixtures:
+        path = fixture_path(size)
+        mb = path.stat().st_size / 1e6
+        parser = make_parser(path)
+        seconds, sections = timed(parser.parse_10k_financial_tables, args.repeat)
+        tables = sum(len(s.get("tables", [])) for s in sections.values())
+        out[f"parse.{size}.s"] = round(seconds, 4)
+        out[f"parse.{size}.mb_per_s"] = round(mb / seconds, 3)
+        out[f"parse.{size}.tables_per_s"] = round(tables / seconds, 1)
+        seconds, _ = timed(make_parser(path, low_memory=True).parse_10k_financial_tables, args.repeat)
+        out[f"parse.{size}.low_memory_mb_per_s"] = round(mb / seconds, 3)
+    return out
+
+
+@benchmark("memory")
+def bench_memory(args) -> Dict[str, float]:
+    """
+    tracemalloc peak while parsing, default (BeautifulSoup) vs low_memory (stream_parser.py), in MB
+    and as a multiple of the file size. The parsed sections are still alive at the peak, so the
+    low_memory figure is mostly the output itself.
+    """
+    out = {}
+    for size in args.fixtures:
+        path = fixture_path(size)
+        mb = path.stat().st_size / 1e6
+        peaks = {}
+        for mode, low_memory in (("", False), ("low_memory_", True)):
+            parser = make_parser(path, low_memory=low_memory)
+            tracemalloc.start()
+            try:
+                parser.parse_10k_financial_tables()
+                peaks[mode] = tracemalloc.get_traced_memory()[1] / 1e6
+            finally:
+                tracemalloc.stop()
+            out[f"memory.{size}.{mode}peak_mb"] = round(peaks[mode], 2)
+            out[f"memory.{size}.{mode}peak_x"] = round(peaks[mode] / mb, 2)
+        out[f"memory.{size}.peak_reduction"] = round(1 - peaks["low_memory_"] / peaks[""], 3) if peaks[""] else 0.0
+    return out
+
+
+@benchmark("nodes")
+def bench_nodes(args) -> Dict[str, float]:
+    """build_documents + TableNodeParser (build_nodes), and build_index with the fake embedding."""
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.utils import get_tokenizer
+    from fake_embedding import HashEmbedding
+    tokenizer = get_tokenizer()
+    out = {}
+    for size in args.fixtures:
+        parser = make_parser(fixture_path(size))
+        parser.parse_10k_financial_tables()
+        seconds, nodes = timed(parser.build_nodes, args.repeat)
+        out[f"nodes.{size}.count"] = len(nodes)
+        # what one retrieved chunk costs in rerank/summarize prompts
+        out[f"nodes.{size}.mean_tokens"] = round(
+            sum(len(tokenizer(n.get_content(metadata_mode="llm"))) for n in nodes) / max(len(nodes), 1), 1)
+        out[f"nodes.{size}.build_nodes_per_s"] = round(len(nodes) / seconds, 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            def build():
+                index = VectorStoreIndex([], embed_model=HashEmbedding())
+                parser.storage_context, parser.index, parser.persist_dir = index.storage_context, index, tmp
+                parser.build_index()
+                return index
+            seconds, _ = timed(build, args.repeat)
+        out[f"nodes.{size}.build_index_nodes_per_s"] = round(len(nodes) / seconds, 1)
+    return out
+
+
+@benchmark("tables")
+def bench_tables(args) -> Dict[str, float]:
+    """
+    Tokens per filing for the table markdown: cell-for-cell (to_markdown_from_table) vs the compact
+    serialization (table_format.py) that build_documents uses, and the time to produce it.
+    """
+    from llama_index.core.utils import get_tokenizer
+    from table_format import to_compact_markdown
+    tokenizer = get_tokenizer()
+    out = {}
+    for size in args.fixtures:
+        parser = make_parser(fixture_path(size))
+        sections = parser.parse_10k_financial_tables()
+        entries = [t for s in sections.values() for t in s.get("tables_by_note", [])]
+        raw = sum(len(tokenizer(parser.to_markdown_from_table(t["parsed"]))) for t in entries)
+        seconds, texts = timed(lambda: [to_compact_markdown(t["cells"]) for t in entries], args.repeat)
+        compact = sum(len(tokenizer(t)) for t in texts)
+        out[f"tables.{size}.raw_tokens"] = raw
+        out[f"tables.{size}.compact_tokens"] = compact
+        out[f"tables.{size}.token_reduction"] = round(1 - compact / raw, 3) if raw else 0.0
+        out[f"tables.{size}.tables_per_s"] = round(len(entries) / seconds, 1) if seconds else 0.0
+    return out
+
+
+PRUNE_QUESTIONS = [
+    # (question, fixture row labels that answer it, years asked about)
+    ("What was Apple's revenue in 2022?", ["Net sales"], ["2022"]),
+    ("What was net income in 2021?", ["Net income"], ["2021"]),
+    ("How much was spent on research and development in 2023?", ["Research and development"], ["2023"]),
+    ("What were total assets at the end of 2023?", ["Total assets"], ["2023"]),
+    ("What was diluted EPS in 2022?", ["Earnings per share: Diluted"], ["2022"]),
+    ("How did cost of sales change in 2023?", ["Cost of sales"], ["2023", "2022"]),
+]
+
+
+@benchmark("prune")
+def bench_prune(args) -> Dict[str, float]:
+    """
+    Summarizer input before/after context_pruner.prune_nodes, in tokens, for the top 10 table
+    nodes (by HashEmbedding similarity, standing in for the reranker) of a few questions, and
+    recall: the share of answering cells (row label x year asked) still in the pruned text.
+    """
+    from llama_index.core.schema import NodeWithScore
+    from llama_index.core.utils import get_tokenizer
+    from fake_embedding import HashEmbedding
+    from context_pruner import prune_nodes
+    tokenizer = get_tokenizer()
+    embed = HashEmbedding()
+
+    def answer_cells(text, labels, years):
+        lines = [l for l in text.splitlines() if l.startswith("|")]
+        if not lines:
+            return set()
+        head = [c.strip() for c in lines[0].strip("|").split("|")]
+        cells = set()
+        for line in lines[2:]:
+            row = [c.strip() for c in line.strip("|").split("|")]
+            if row[0] in labels:
+                cells.update((row[0], head[j], row[j]) for j in range(1, min(len(row), len(head))) if head[j] in years)
+        return cells
+
+    out = {}
+    for size in args.fixtures:
+        parser = make_parser(fixture_path(size))
+        parser.parse_10k_financial_tables()
+        tables = [n for n in parser.build_nodes() if n.metadata.get("type") == "table"]
+        vectors = embed.get_text_embedding_batch([n.get_content() for n in tables])
+        before = after = found = wanted = 0
+        samples = []
+        for question, labels, years in PRUNE_QUESTIONS:
+            q = embed.get_query_embedding(question)
+            ranked = sorted(range(len(tables)), key=lambda i: -sum(a * b for a, b in zip(q, vectors[i])))[:10]
+            nodes = [NodeWithScore(node=tables[i], score=1.0) for i in ranked]
+            t0 = time.perf_counter()
+            pruned, _ = prune_nodes(nodes, question)
+            samples.append((time.perf_counter() - t0) * 1000)
+            before += sum(len(tokenizer(n.node.get_content(metadata_mode="llm"))) for n in nodes)
+            after += sum(len(tokenizer(n.node.get_content(metadata_mode="llm"))) for n in pruned)
+            for full, cut in zip(nodes, pruned):
+                cells = answer_cells(full.node.get_content(), labels, years)
+                wanted += len(cells)
+                found += len(cells & answer_cells(cut.node.get_content(), labels, years))
+        out[f"prune.{size}.tokens_before"] = before
+        out[f"prune.{size}.tokens_after"] = after
+        out[f"prune.{size}.token_reduction"] = round(1 - after / before, 3) if before else 0.0
+        out[f"prune.{size}.recall"] = round(found / wanted, 3) if wanted else 1.0
+        out[f"prune.{size}.p50_ms"] = round(percentile(samples, 0.50), 2)
+    return out
+
+
+@benchmark("store")
+def bench_store(args) -> Dict[str, float]:
+    """SnapshotStore commit (embed + persist) and load time for a store10k10q-style directory."""
+    from index_store import SnapshotStore
+    from fake_embedding import HashEmbedding
+    from tracing import tracer
+    out = {}
+    for size in args.fixtures:
+        parser = make_parser(fixture_path(size))
+        parser.parse_10k_financial_tables()
+        nodes = parser.build_nodes()
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp, embed_model=HashEmbedding(), min_age_seconds=0)
+            tracer.reset()
+            store.commit(nodes)
+            stages = tracer.summary()["stages"]
+            out[f"store.{size}.embed_ms"] = stages.get("embed", {}).get("ms", 0.0)
+            out[f"store.{size}.persist_ms"] = stages.get("persist", {}).get("ms", 0.0)
+            seconds, _ = timed(store.load, args.repeat)
+            out[f"store.{size}.load_ms"] = round(seconds * 1000, 1)
+            snap = os.path.join(tmp, "snapshots", store.current_version())
+            out[f"store.{size}.disk_mb"] = round(
+                sum(f.stat().st_size for f in Path(snap).rglob("*") if f.is_file()) / 1e6, 3)
+    return out
+
+
+@benchmark("retrieval")
+def bench_retrieval(args) -> Dict[str, float]:
+    """
+    Top-10 vector query latency against the in-memory SimpleVectorStore at each corpus size,
+    unfiltered and with the planner's cik + type metadata filters. Vectors are random unit vectors.
+    """
+    from llama_index.core.schema import TextNode
+    from llama_index.core.vector_stores import SimpleVectorStore, VectorStoreQuery, MetadataFilters, MetadataFilter
+
+    def unit(rng):
+        v = [rng.gauss(0, 1) for _ in range(args.dim)]
+        n = sum(x * x for x in v) ** 0.5
+        return [x / n for x in v]
+
+    out = {}
+    for n in args.sizes:
+        rng = random.Random(n)
+        store = SimpleVectorStore()
+        t0 = time.perf_counter()
+        batch = []
+        for i in range(n):
+            batch.append(TextNode(id_=f"n{i}", text="", embedding=unit(rng),
+                                  metadata={"cik": str(i % 500), "type": "table" if i % 2 else "narrative"}))
+            if len(batch) == 10_000:
+                store.add(batch)
+                batch = []
+        if batch:
+            store.add(batch)
+        out[f"retrieval.{n}.load_s"] = round(time.perf_counter() - t0, 2)
+
+        filters = MetadataFilters(filters=[MetadataFilter(key="cik", value="42"), MetadataFilter(key="type", value="table")])
+        for label, f in (("", None), ("filtered_", filters)):
+            samples = []
+            for _ in range(args.queries):
+                q = VectorStoreQuery(query_embedding=unit(rng), similarity_top_k=10, filters=f)
+                t0 = time.perf_counter()
+                store.query(q)
+                samples.append((time.perf_counter() - t0) * 1000)
+            out[f"retrieval.{n}.{label}p50_ms"] = round(percentile(samples, 0.50), 2)
+            out[f"retrieval.{n}.{label}p95_ms"] = round(percentile(samples, 0.95), 2)
+        del store
+    return out
+
+
+@benchmark("quantized")
+def bench_quantized(args) -> Dict[str, float]:
+    """
+    Recall vs size for the vector codecs (vector_codec.py). --quant-vectors synthetic embeddings of
+    --quant-dim dims: clustered, with variance falling off along the dimensions like the shortenable
+    text-embedding-3 vectors. Per codec: recall@10 against exact float32 search on the full vectors,
+    resident bytes per vector, the reduction from SimpleVectorStore's lists of floats (measured with
+    tracemalloc on a sample), and single-query latency.
+    """
+    import numpy as np
+    from llama_index.core.schema import TextNode
+    from llama_index.core.vector_stores import SimpleVectorStore
+    from vector_codec import QuantizedVectorStore, VectorCodec, unit_rows
+
+    n, dim, k = args.quant_vectors, args.quant_dim, 10
+    rng = np.random.default_rng(0)
+    spectrum = (np.arange(dim) + 1.0) ** -0.5
+    centers = rng.normal(size=(max(n // 50, 1), dim)) * spectrum
+    vectors = centers[rng.integers(len(centers), size=n)] + 0.6 * rng.normal(size=(n, dim)) * spectrum
+    queries = vectors[rng.integers(n, size=args.queries)] + 0.3 * rng.normal(size=(args.queries, dim)) * spectrum
+    exact = np.argsort(-(unit_rows(queries) @ unit_rows(vectors).T), axis=1)[:, :k]
+    ids = [f"n{i}" for i in range(n)]
+
+    sample = min(n, 2000)
+    tracemalloc.start()
+    try:
+        simple = SimpleVectorStore()
+        simple.add([TextNode(id_=ids[i], text="", embedding=vectors[i].tolist()) for i in range(sample)])
+        simple_bytes = tracemalloc.get_traced_memory()[0] / sample
+    finally:
+        tracemalloc.stop()
+    del simple
+    out = {"quantized.simple_bytes_per_vector": round(simple_bytes)}
+
+    for dims, dtype in ((None, "float32"), (None, "float16"), (None, "int8"),
+                        (dim // 2, "int8"), (dim // 4, "int8"), (dim // 4, "float32")):
+        codec = VectorCodec(dims=dims, dtype=dtype)
+        store = QuantizedVectorStore(codec=codec)
+        for a in range(0, n, 10_000):
+            store._append(ids[a:a + 10_000], vectors[a:a + 10_000])
+        best, _ = store.search(queries, k)
+        hits = [len(set(row.tolist()) & set(truth.tolist())) for row, truth in zip(best, exact)]
+        samples = []
+        for q in queries:
+            t0 = time.perf_counter()
+            store.search(q[None, :], k)
+            samples.append((time.perf_counter() - t0) * 1000)
+        per_vector = codec.bytes_per_vector(store.dims)
+        label = f"quantized.{dtype}x{store.dims}"
+        out[f"{label}.recall"] = round(sum(hits) / (k * len(queries)), 3)
+        out[f"{label}.bytes_per_vector"] = per_vector
+        out[f"{label}.size_reduction"] = round(1 - per_vector / simple_bytes, 4)
+        out[f"{label}.p50_ms"] = round(percentile(samples, 0.50), 2)
+        del store
+    return out
+
+
+@benchmark("retention")
+def bench_retention(args) -> Dict[str, float]:
+    """
+    Eviction under a node budget (retention.py). 40 filings of 25 nodes over 8 company shards get
+    a Zipf-skewed access trace through the catalog, then the index is cut to half its nodes. Per
+    policy: hot_recall (share of the 10 most-accessed filings still embedded) and evict time. Then
+    compaction time, tombstones left in the index structs, and on-disk index reduction.
+    """
+    from llama_index.core.schema import TextNode
+    from shard_store import ShardedStore
+    from filing_catalog import FilingCatalog
+    from retention import RetentionManager
+    from fake_embedding import HashEmbedding
+
+    filings, per_filing, companies = 40, 25, 8
+    rng = random.Random(7)
+    weights = [1.0 / (rank + 1) for rank in range(filings)]
+    order = list(range(filings))
+    rng.shuffle(order)  # hotness independent of ingestion order and company
+    trace = rng.choices(order, weights=weights, k=400)
+    hot = {f"acc{order[r]}" for r in range(10)}
+
+    def index_bytes(root):
+        return sum(f.stat().st_size for f in Path(root, "shards").rglob("*") if f.suffix in (".json", ".npy"))
+
+    out = {}
+    for policy in ("lru", "lfu"):
+        with tempfile.TemporaryDirectory() as tmp:
+            dl = os.path.join(tmp, "10k10q")
+            os.makedirs(dl)
+            store = ShardedStore(os.path.join(tmp, "store"), embed_model=HashEmbedding(), min_age_seconds=0)
+            catalog = FilingCatalog(os.path.join(tmp, "store", ".catalog.sqlite"))
+            for i in range(filings):
+                cik = str(1000 + i % companies)
+                path = os.path.join(dl, f"T{i}_10-K_{2000 + i}.htm")
+                Path(path).write_text("x" * 10_000)
+                nodes = [TextNode(id_=f"f{i}-{j}", text=f"filing {i} node {j}", metadata={"filename": path})
+                         for j in range(per_filing)]
+                store.commit(cik, nodes)
+                catalog.upsert(f"acc{i}", cik=cik, path=path, parse_version=1, embed_status="embedded",
+                               node_ids=[n.node_id for n in nodes])
+            for i in trace:
+                catalog.touch([f"acc{i}"])
+            before = index_bytes(os.path.join(tmp, "store"))
+            manager = RetentionManager(store, catalog, dl, max_nodes=filings * per_filing // 2, policy=policy)
+            t0 = time.perf_counter()
+            manager.enforce()
+            out[f"retention.{policy}.evict_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            kept = {r["accession_no"] for r in catalog.retention_rows() if r["embed_status"] == "embedded"}
+            out[f"retention.{policy}.hot_recall"] = round(len(hot & kept) / len(hot), 3)
+            if policy != "lru":
+                continue
+            t0 = time.perf_counter()
+            manager.compact()
+            out["retention.compact_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            tombstones = 0
+            for key in store.keys():
+                _, _, index = store.get(key)
+                tombstones += len(index.index_struct.nodes_dict) - len(index.docstore.docs)
+            out["retention.tombstones"] = tombstones
+            out["retention.index_reduction"] = round(1 - index_bytes(os.path.join(tmp, "store")) / before, 3)
+    return out
+
+
+IMPORT_TIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(statement: str) -> Dict[str, tuple]:
+    """
+    Run `statement` under `python -X importtime` in app/ and return
+    {module: (cumulative_us, depth)} for every module it loaded.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=APP_DIR,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed: {proc.stderr.strip().splitlines()[-1]}")
+    profile = {}
+    for m in IMPORT_TIME_RE.finditer(proc.stderr):
+        profile[m.group(4)] = (int(m.group(2)), len(m.group(3)) // 2)
+    return profile
+
+
+@benchmark("startup")
+def bench_startup(args) -> Dict[str, float]:
+    """
+    Worker startup cost from -X importtime, each in a fresh interpreter:
+      run_query         what --help and config errors pay before answering
+      coordinator       InitialQueryAgent, paid by every query (cache hits included)
+      final_agent       FinalQueryAgent on top of the coordinator, paid on cache misses
+      ingest_deps       bs4/chardet/edgar on top of the coordinator, paid only when parsing
+    plus the wall time of `run_query.py --help`. The slowest top-level imports are printed.
+    """
+    cases = {
+        "run_query": ("import run_query", "run_query"),
+        "coordinator": ("import InitialQueryAgent", "InitialQueryAgent"),
+        "final_agent": ("import InitialQueryAgent, FinalQueryAgent", "FinalQueryAgent"),
+        "ingest_deps": ("import InitialQueryAgent, bs4, chardet, edgar", ("bs4", "chardet", "edgar")),
+    }
+    out, slowest = {}, None
+    for label, (statement, targets) in cases.items():
+        targets = targets if isinstance(targets, tuple) else (targets,)
+        samples = []
+        for _ in range(args.repeat):
+            profile = import_profile(statement)
+            samples.append(sum(profile[t][0] for t in targets if t in profile) / 1000)
+            if label == "coordinator":
+                slowest = profile
+        out[f"startup.{label}_import_ms"] = round(statistics.median(samples), 1)
+
+    if slowest:
+        top = sorted(((us, name) for name, (us, depth) in slowest.items() if depth == 0), reverse=True)[:8]
+        print("  slowest top-level imports under InitialQueryAgent:", file=sys.stderr)
+        for us, name in top:
+            print(f"    {us / 1000:8.1f} ms  {name}", file=sys.stderr)
+
+    seconds, _ = timed(lambda: subprocess.run([sys.executable, "run_query.py", "--help"], cwd=APP_DIR,
+                                              capture_output=True), args.repeat)
+    out["startup.help_ms"] = round(seconds * 1000, 1)
+    return out
+
+
+# -------------------------------
+# Thresholds
+# -------------------------------
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s") or metric.endswith("_reduction") or metric.endswith("recall")
+
+
+def check(metrics: Dict[str, float], thresholds: Dict, baseline: Dict[str, float] = None) -> List[str]:
+    failures = []
+    for name, limit in thresholds.get("metrics", {}).items():
+        value = metrics.get(name)
+        if value is None:
+            continue
+        if "min" in limit and value < limit["min"]:
+            failures.append(f"{name}={value} below floor {limit['min']}")
+        if "max" in limit and value > limit["max"]:
+            failures.append(f"{name}={value} above ceiling {limit['max']}")
+    tolerance = thresholds.get("tolerance", 0.25)
+    for name, old in (baseline or {}).items():
+        new = metrics.get(name)
+        if new is None or not isinstance(old, (int, float)) or old == 0 or name.endswith(".count"):
+            continue
+        change = (new - old) / abs(old)
+        worse = -change if higher_is_better(name) else change
+        if worse > tolerance:
+            failures.append(f"{name}: {old} -> {new} ({worse:+.0%} worse, tolerance {tolerance:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline worker micro-benchmarks")
+    parser.add_argument("--only", help=f"comma-separated subset of: {','.join(BENCHMARKS)}")
+    parser.add_argument("--fixtures", default=",".join(SIZES), help="fixture sizes to use")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="retrieval corpus sizes (up to 1000000)")
+    parser.add_argument("--dim", type=int, default=64, help="vector size for the retrieval benchmark")
+    parser.add_argument("--queries", type=int, default=50, help="queries per retrieval measurement")
+    parser.add_argument("--quant-vectors", type=int, default=20000, help="corpus size for the quantized benchmark")
+    parser.add_argument("--quant-dim", type=int, default=1024, help="full vector size for the quantized benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing (median is reported)")
+    parser.add_argument("--out", help="results file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--thresholds", default=str(BENCH_DIR / "thresholds.json"))
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--check", action="store_true", help="exit 1 on any regression")
+    args = parser.parse_args()
+    args.fixtures = [s for s in args.fixtures.split(",") if s]
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    metrics: Dict[str, float] = {}
+    for name in selected:
+        print(f"== {name}", file=sys.stderr)
+        t0 = time.perf_counter()
+        result = BENCHMARKS[name](args)
+        for k, v in result.items():
+            print(f"  {k:<48} {v}", file=sys.stderr)
+        metrics.update(result)
+        print(f"  ({time.perf_counter() - t0:.1f}s)", file=sys.stderr)
+
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    results = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": rev,
+                 "python": platform.python_version(), "platform": platform.platform(), "benchmarks": selected},
+        "metrics": metrics,
+    }
+    out = Path(args.out) if args.out else BENCH_DIR / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=1))
+    print(f"wrote {out}", file=sys.stderr)
+
+    thresholds = json.loads(Path(args.thresholds).read_text()) if Path(args.thresholds).exists() else {}
+    baseline = json.loads(Path(args.baseline).read_text())["metrics"] if args.baseline else None
+    failures = check(metrics, thresholds, baseline)
+    for f in failures:
+        print(f"REGRESSION {f}", file=sys.stderr)
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# worker_py/loadtest/fake_services.py
+"""
+Local stand-ins for everything the worker calls over the network, on one port:
+
+    POST /                            sec-api.io full-text search (query string parsed for cik/form/period)
+    GET  /Archives/edgar/data/...     sec.gov filing download (synthetic HTML from bench/fixtures.py)
+    GET  /files/company_tickers.json  sec.gov ticker -> CIK table
+    POST /v1/chat/completions         OpenAI chat, incl. streaming (entity extraction, rerank, summarize, faithfulness)
+    POST /v1/embeddings               OpenAI embeddings (deterministic hash vectors, float or base64)
+
+    python3 loadtest/fake_services.py --port 8900 --llm-latency-ms 800 --error-rate 0.02
+
+Point the worker at it with the environment printed on startup (the API passes its environment
+on to the worker processes). Every route sleeps for its configured latency (+/- jitter) and fails
+with a 500 for --error-rate and a 429 for --throttle-rate of requests.
+"""
+import re
+import sys
+import json
+import time
+import base64
+import random
+import struct
+import hashlib
+import argparse
+import datetime
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "bench"))
+from fixtures import make_filing
+from fake_embedding import hash_embedding
+
+COMPANIES = {
+    "AAPL": (320193, "Apple Inc.", ["apple"]),
+    "MSFT": (789019, "MICROSOFT CORP", ["microsoft"]),
+    "GOOGL": (1652044, "Alphabet Inc.", ["google", "alphabet"]),
+    "AMZN": (1018724, "AMAZON COM INC", ["amazon"]),
+    "NVDA": (1045810, "NVIDIA CORP", ["nvidia"]),
+    "META": (1326801, "Meta Platforms, Inc.", ["meta", "facebook"]),
+    "TSLA": (1318605, "Tesla, Inc.", ["tesla"]),
+    "WMT": (104169, "Walmart Inc.", ["walmart"]),
+    "JPM": (19617, "JPMORGAN CHASE & CO", ["jpmorgan"]),
+    "KO": (21344, "COCA COLA CO", ["coca-cola", "coca cola"]),
+}
+BY_CIK = {cik: t for t, (cik, _, _) in COMPANIES.items()}
+
+STATS = {"requests": 0, "errors": 0, "by_route": {}}
+STATS_LOCK = threading.Lock()
+FILING_CACHE = {}
+
+
+def quarter_ends(start: str, end: str):
+    """Calendar quarter-end dates within [start, end] (ISO dates)."""
+    out = []
+    for year in range(int(start[:4]), int(end[:4]) + 1):
+        for md in ("03-31", "06-30", "09-30", "12-31"):
+            d = f"{year}-{md}"
+            if start <= d <= end:
+                out.append(d)
+    return out
+
+
+def search_hits(query: str, size: int, base_url: str):
+    """Fake sec-api.io hits for a Lucene-style query like the ones SECFetchHTM builds."""
+    cik_m = re.search(r"cik:(\d+)", query)
+    ticker_m = re.search(r"ticker:([\w.\-]+)", query)
+    form = (re.search(r'formType:"([^"]+)"', query) or [None, "10-K"])[1]
+    if cik_m:
+        cik = int(cik_m.group(1))
+        ticker = BY_CIK.get(cik, f"C{cik}")
+    else:
+        ticker = ticker_m.group(1).upper() if ticker_m else "AAPL"
+        cik = COMPANIES.get(ticker, (abs(hash(ticker)) % 10**7,))[0]
+
+    period_m = re.search(r"periodOfReport:\[(\S+) TO (\S+)\]", query)
+    filed_m = re.search(r"filedAt:\[(\S+) TO (\S+)\]", query)
+    if period_m:
+        start, end = period_m.groups()
+    elif filed_m:
+        # filed in the window -> period ended roughly a quarter earlier
+        start, end = filed_m.groups()
+    else:
+        start, end = "2022-01-01", "2022-12-31"
+    ends = quarter_ends(start, end)
+    if form == "10-K":
+        ends = [d for d in ends if d.endswith("12-31")] or ends[-1:]
+    else:
+        ends = [d for d in ends if not d.endswith("12-31")] or ends[-1:]
+
+    hits = []
+    for period in sorted(ends, reverse=True)[:size]:
+        acc = hashlib.sha1(f"{cik}-{form}-{period}".encode()).hexdigest()[:8]
+        accession = f"{cik:010d}-{period[2:4]}-{int(acc, 16) % 10**6:06d}"
+        filed = datetime.date.fromisoformat(period) + datetime.timedelta(days=60 if form == "10-K" else 40)
+        hits.append({
+            "id": accession,
+            "accessionNo": accession,
+            "cik": str(cik),
+            "ticker": ticker,
+            "companyName": COMPANIES.get(ticker, (0, ticker))[1],
+            "formType": form,
+            "periodOfReport": period,
+            "filedAt": f"{filed.isoformat()}T16:30:00-05:00",
+            "linkToFilingDetails": f"{base_url}/Archives/edgar/data/{cik}/{accession}.htm",
+        })
+    return {"total": {"value": len(hits), "relation": "eq"}, "filings": hits}
+
+
+def extract_companies(prompt: str):
+    """Answer the entity-extraction prompt the way the real model would, from the query text."""
+    query = prompt.split("Query:", 1)[-1].split("\n")[0]
+    lowered = query.lower()
+    found = [t for t, (_, _, names) in COMPANIES.items()
+             if re.search(rf"\b{t}\b", query) or any(n in lowered for n in names)] or ["AAPL"]
+    years = re.findall(r"\b(?:19|20)\d{2}\b", query) or ["2022"]
+    quarter = re.search(r"\bQ([1-4])\b", query, re.IGNORECASE)
+    form = "10-Q" if quarter or "quarter" in lowered else "10-K"
+    out = []
+    for t in found:
+        for y in years:
+            period = f"{y} Q{quarter.group(1)}" if quarter else y
+            out.append({"company_name": COMPANIES[t][1], "ticker": t, "CIK": str(COMPANIES[t][0]).zfill(10),
+                        "formType": form, "filing_date_range": period})
+    return json.dumps(out)
+
+
+def chat_answer(messages) -> str:
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    if "extract a list of companies" in prompt:
+        return extract_companies(prompt)
+    if "Relevance:" in prompt and "Doc:" in prompt:
+        # LLMRerank choice-select prompt: rate the first documents of the batch
+        n = len(re.findall(r"^Document \d+:", prompt, re.MULTILINE)) or 2
+        return "\n".join(f"Doc: {i}, Relevance: {10 - i}" for i in range(1, min(n, 5) + 1))
+    if "YES or NO" in prompt or "YES/NO" in prompt:
+        return "YES"
+    numbers = re.findall(r"\$?\(?\d[\d,]{3,}\)?", prompt)[:3]
+    return ("Based on the filing, the reported figures are " + ", ".join(numbers or ["not available"]) +
+            ". This answer was produced by the load-test stand-in.")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None  # argparse namespace, set in main()
+
+    def log_message(self, fmt, *args):
+        if self.config.verbose:
+            super().log_message(fmt, *args)
+
+    # -------------------------------
+    # plumbing
+    # -------------------------------
+    def _route(self):
+        p = self.path.split("?")[0]
+        if p.startswith("/v1/chat"):
+            return "chat"
+        if p.startswith("/v1/embeddings"):
+            return "embeddings"
+        if p.startswith("/Archives/"):
+            return "download"
+        if p.startswith("/files/company_tickers"):
+            return "tickers"
+        if p.startswith("/stats"):
+            return "stats"
+        return "search"
+
+    def _delay_and_maybe_fail(self, route) -> bool:
+        cfg = self.config
+        latency = {"search": cfg.sec_latency_ms, "download": cfg.download_latency_ms,
+                   "chat": cfg.llm_latency_ms, "embeddings": cfg.embed_latency_ms}.get(route, 0)
+        if latency:
+            time.sleep(max(0.0, latency * (1 + random.uniform(-cfg.jitter, cfg.jitter))) / 1000)
+        with STATS_LOCK:
+            STATS["requests"] += 1
+            STATS["by_route"][route] = STATS["by_route"].get(route, 0) + 1
+        if route in ("tickers", "stats"):
+            return False
+        roll = random.random()
+        if roll < cfg.error_rate:
+            self._json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+        elif roll < cfg.error_rate + cfg.throttle_rate:
+            self._json(429, {"error": {"message": "injected rate limit", "type": "rate_limit_error"}},
+                       headers={"Retry-After": "1"})
+        else:
+            return False
+        with STATS_LOCK:
+            STATS["errors"] += 1
+        return True
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw or b"{}")
+
+    def _send(self, status, body: bytes, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, obj, headers=None):
+        self._send(status, json.dumps(obj).encode(), "application/json", headers)
+
+    # -------------------------------
+    # routes
+    # -------------------------------
+    def do_GET(self):
+        route = self._route()
+        if self._delay_and_maybe_fail(route):
+            return
+        if route == "tickers":
+            table = {str(i): {"cik_str": cik, "ticker": t, "title": title}
+                     for i, (t, (cik, title, _)) in enumerate(COMPANIES.items())}
+            return self._json(200, table)
+        if route == "stats":
+            with STATS_LOCK:
+                return self._json(200, STATS)
+        if route == "download":
+            m = re.search(r"/data/(\d+)/([\w\-]+)\.htm", self.path)
+            cik = m.group(1) if m else "999999"
+            key = (cik, self.config.filing_size)
+            if key not in FILING_CACHE:
+                html = make_filing(self.config.filing_size).replace("0000999999", cik.zfill(10))
+                FILING_CACHE[key] = html.encode("utf-8")
+            return self._send(200, FILING_CACHE[key], "text/html; charset=utf-8")
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        route = self._route()
+        if self._delay_and_maybe_fail(route):
+            return
+        body = self._body()
+        if route == "search":
+            base = f"http://{self.headers.get('Host')}"
+            return self._json(200, search_hits(body.get("query", ""), int(body.get("size", 1)), base))
+        if route == "embeddings":
+            return self._embeddings(body)
+        if route == "chat":
+            return self._chat(body)
+        self._json(404, {"error": "not found"})
+
+    def _embeddings(self, body):
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        dim = int(body.get("dimensions") or self.config.embed_dim)
+        data = []
+        for i, text in enumerate(inputs):
+            vec = hash_embedding(text if isinstance(text, str) else " ".join(map(str, text)), dim)
+            if body.get("encoding_format") == "base64":
+                vec = base64.b64encode(struct.pack(f"<{dim}f", *vec)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vec})
+        tokens = sum(len(str(t).split()) for t in inputs)
+        self._json(200, {"object": "list", "data": data, "model": body.get("model"),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat(self, body):
+        answer = chat_answer(body.get("messages", []))
+        created = int(time.time())
+        model = body.get("model", "gpt-4-turbo")
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        if not body.get("stream"):
+            return self._json(200, {
+                "id": f"chatcmpl-{created}", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(answer.split()),
+                          "total_tokens": prompt_tokens + len(answer.split())},
+            })
+        # server-sent chunks, one word at a time
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = re.findall(r"\S+\s*", answer)
+        for i, word in enumerate(words):
+            delta = {"role": "assistant", "content": word} if i == 0 else {"content": word}
+            chunk = {"id": f"chatcmpl-{created}", "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            if self.config.token_latency_ms:
+                time.sleep(self.config.token_latency_ms / 1000)
+        done = {"id": f"chatcmpl-{created}", "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-ins for sec-api.io, sec.gov and OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--sec-latency-ms", type=float, default=150)
+    parser.add_argument("--download-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-latency-ms", type=float, default=1200, help="time to first token / full reply")
+    parser.add_argument("--token-latency-ms", type=float, default=15, help="per streamed word")
+    parser.add_argument("--embed-latency-ms", type=float, default=250)
+    parser.add_argument("--jitter", type=float, default=0.3, help="+/- fraction applied to every latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--filing-size", default="medium", choices=["small", "medium", "large"])
+    parser.add_argument("--embed-dim", type=int, default=3072, help="text-embedding-3-large size")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    Handler.config = args
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    base = f"http://{args.host}:{args.port}"
+    print("Stand-ins listening on " + base + ". Start the API (or the worker) with:", file=sys.stderr)
+    for k, v in (("SEC_API_URL", base), ("SEC_BASE_URL", base), ("SEC_TICKERS_URL", base + "/files/company_tickers.json"),
+                 ("OPENAI_API_BASE", base + "/v1"), ("OPENAI_BASE_URL", base + "/v1"),
+                 ("OPENAI_API_KEY", "sk-loadtest"), ("SEC_API_KEY", "loadtest"),
+                 ("EDGAR_IDENTITY", "'Load Test loadtest@example.com'")):
+        print(f"  export {k}={v}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
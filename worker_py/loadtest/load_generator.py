@@ -0,0 +1,202 @@
+# worker_py/loadtest/load_generator.py
+"""
+Open-loop load generator for the API (POST /queries): sends requests at a fixed rate regardless
+of how fast they complete, so queueing and 429s show up the way they would in production.
+
+    python3 loadtest/load_generator.py --url http://localhost:8000 --rps 0.5 --duration 300
+    python3 loadtest/load_generator.py --rps 2 --duration 120 --prompts prompts.txt --out run.json
+
+Reports latency percentiles (p50/p95/p99), throughput, error and 429 rates, the API's job queue
+(GET /queries/jobs/stats), per-stage worker timings from the result JSON, and the CPU/RSS of
+the run_query.py worker processes on this machine (Linux /proc).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PROMPTS = [
+    "What was Apple's net income in 2022?",
+    "What was Microsoft's revenue in 2021?",
+    "Compare Google and Amazon operating income in 2022.",
+    "What were NVIDIA's total assets in 2023?",
+    "What was Tesla's gross margin in Q2 2023?",
+    "How much cash did Walmart have at the end of 2022?",
+    "What was Meta's research and development expense in 2021?",
+    "What was Coca-Cola's net income in Q3 2022?",
+]
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    s = sorted(samples)
+    return round(s[min(len(s) - 1, int(round(q * (len(s) - 1))))], 1)
+
+
+def post_query(url: str, prompt: str, timeout: float):
+    req = urllib.request.Request(url.rstrip("/") + "/queries", data=json.dumps({"prompt": prompt}).encode(),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = json.loads(resp.read() or b"{}")
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        body, status = {}, e.code
+    except Exception as e:  # connection refused, timeout
+        body, status = {"error": str(e)}, 0
+    return status, body, (time.perf_counter() - t0) * 1000
+
+
+class WorkerSampler(threading.Thread):
+    """Samples run_query.py processes from /proc: count, total RSS and CPU% (of one core)."""
+
+    def __init__(self, stats_url: str, interval: float = 1.0):
+        super().__init__(daemon=True)
+        self.stats_url = stats_url
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.clk = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _workers(self):
+        procs = {}
+        if not os.path.isdir("/proc"):
+            return procs
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    cmd = f.read().replace(b"\0", b" ")
+                if b"run_query.py" not in cmd and b"prefetch.py" not in cmd:
+                    continue
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                cpu = (int(fields[11]) + int(fields[12])) / self.clk   # utime + stime
+                rss = int(fields[21]) * self.page
+                procs[pid] = (cpu, rss)
+            except (OSError, IndexError, ValueError):
+                continue
+        return procs
+
+    def _queue(self):
+        try:
+            with urllib.request.urlopen(self.stats_url, timeout=2) as resp:
+                return json.loads(resp.read())
+        except Exception:
+            return {}
+
+    def run(self):
+        prev, prev_t = self._workers(), time.time()
+        while not self.stopped.wait(self.interval):
+            cur, now = self._workers(), time.time()
+            cpu = sum(c - prev.get(pid, (c, 0))[0] for pid, (c, _) in cur.items()) / max(now - prev_t, 1e-6)
+            q = self._queue()
+            self.samples.append({"workers": len(cur), "rss_mb": sum(r for _, r in cur.values()) / 1e6,
+                                 "cpu_pct": 100 * cpu, "running": q.get("running"), "queued": q.get("queued")})
+            prev, prev_t = cur, now
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        def peak(k):
+            vals = [s[k] for s in self.samples if s.get(k) is not None]
+            return round(max(vals), 1) if vals else None
+        def mean(k):
+            vals = [s[k] for s in self.samples if s.get(k) is not None]
+            return round(sum(vals) / len(vals), 1) if vals else None
+        return {"peak_workers": peak("workers"), "peak_rss_mb": peak("rss_mb"), "mean_rss_mb": mean("rss_mb"),
+                "peak_cpu_pct": peak("cpu_pct"), "mean_cpu_pct": mean("cpu_pct"),
+                "peak_queued": peak("queued"), "mean_running": mean("running")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive POST /queries at a target request rate")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rps", type=float, default=0.5, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=120, help="seconds to send requests for")
+    parser.add_argument("--prompts", help="file with one prompt per line (default: built-in mix)")
+    parser.add_argument("--unique", action="store_true",
+                        help="append a counter to every prompt so answer caching/coalescing can't absorb load")
+    parser.add_argument("--timeout", type=float, default=480, help="per-request timeout (seconds)")
+    parser.add_argument("--max-inflight", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts) as f:
+            prompts = [l.strip() for l in f if l.strip() and not l.startswith("#")]
+    rng = random.Random(args.seed)
+
+    sampler = WorkerSampler(args.url.rstrip("/") + "/queries/jobs/stats")
+    sampler.start()
+
+    results = []
+    lock = threading.Lock()
+    total = int(args.rps * args.duration)
+
+    def fire(i):
+        prompt = rng.choice(prompts) + (f" (run {i})" if args.unique else "")
+        status, body, ms = post_query(args.url, prompt, args.timeout)
+        with lock:
+            results.append({"status": status, "ok": bool(body.get("ok")), "ms": ms,
+                            "timings": body.get("timings"), "error": body.get("error")})
+            done = len(results)
+        print(f"[{done}/{total}] {status} {'ok' if body.get('ok') else 'ERR'} {ms:.0f} ms", file=sys.stderr)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+        for i in range(total):
+            # open loop: request i goes out at i/rps regardless of earlier responses
+            delay = started + i / args.rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, i)
+    elapsed = time.perf_counter() - started
+    sampler.stopped.set()
+
+    ok = [r["ms"] for r in results if r["status"] == 200 and r["ok"]]
+    stages = defaultdict(list)
+    for r in results:
+        for name, st in ((r.get("timings") or {}).get("stages") or {}).items():
+            stages[name].append(st.get("ms", 0))
+    errors = defaultdict(int)
+    for r in results:
+        if not (r["status"] == 200 and r["ok"]):
+            errors[str(r["status"]) if r["status"] != 200 else (r["error"] or "ok=false")[:60]] += 1
+
+    report = {
+        "target_rps": args.rps,
+        "duration_s": round(elapsed, 1),
+        "requests": len(results),
+        "succeeded": len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "error_rate": round(1 - len(ok) / len(results), 3) if results else None,
+        "rejected_429": sum(1 for r in results if r["status"] == 429),
+        "latency_ms": {"p50": percentile(ok, 0.50), "p95": percentile(ok, 0.95), "p99": percentile(ok, 0.99),
+                       "max": round(max(ok), 1) if ok else None},
+        "stage_p50_ms": {k: percentile(v, 0.50) for k, v in sorted(stages.items())},
+        "errors": dict(errors),
+        "workers": sampler.summary(),
+    }
+    text = json.dumps(report, indent=1)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# worker_py/tests/conftest.py
+# The worker's modules import each other flat (run as `python3 app/x.py`), so put app/ on the
+# path the same way; bench/ holds HashEmbedding, the offline stand-in for OpenAI embeddings.
+import os
+import sys
+from pathlib import Path
+
+WORKER_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(WORKER_DIR / "app"))
+sys.path.insert(0, str(WORKER_DIR / "bench"))
+# modules that build an OpenAI client handle at import/construction time; nothing here calls it
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-tests")
@@ -0,0 +1,77 @@
+import multiprocessing
+import sqlite3
+
+from answer_cache import AnswerCache, normalize_entities
+
+AAPL = normalize_entities([{"ticker": "AAPL", "CIK": "0000320193", "formType": "10-K", "filing_date_range": "2023"}])
+MSFT = normalize_entities([{"ticker": "MSFT", "formType": "10-K", "filing_date_range": "2023"}])
+
+
+def test_exact_hit_ignores_case_and_punctuation(tmp_path):
+    cache = AnswerCache(str(tmp_path / "cache.sqlite"))
+    cache.store("What was Apple's revenue in 2023?", None, AAPL, "v1", "$383.3 billion", ["10k10q/a.htm"])
+    answer, citations, match = cache.lookup("what was apple s revenue in 2023", None, AAPL, "v1")
+    assert (answer, citations, match) == ("$383.3 billion", ["10k10q/a.htm"], "exact")
+
+
+def test_semantic_hit_needs_same_entities_and_close_embedding(tmp_path):
+    cache = AnswerCache(str(tmp_path / "cache.sqlite"), similarity_threshold=0.9)
+    cache.store("Apple revenue 2023", [1.0, 0.0, 0.1], AAPL, "v1", "$383.3 billion", [])
+    assert cache.lookup("How much did Apple sell in 2023", [0.99, 0.05, 0.1], AAPL, "v1")[2] == "semantic"
+    assert cache.lookup("How much did Apple sell in 2023", [0.0, 1.0, 0.0], AAPL, "v1") is None
+    assert cache.lookup("How much did Microsoft sell in 2023", [0.99, 0.05, 0.1], MSFT, "v1") is None
+
+
+def test_new_version_invalidates_only_that_query(tmp_path):
+    cache = AnswerCache(str(tmp_path / "cache.sqlite"))
+    cache.store("Apple revenue 2023", None, AAPL, "aapl-v1", "old", [])
+    cache.store("Microsoft revenue 2023", None, MSFT, "msft-v1", "msft", [])
+    assert cache.lookup("Apple revenue 2023", None, AAPL, "aapl-v2") is None
+    assert cache.lookup("Apple revenue 2023", None, AAPL, "aapl-v1") is None  # superseded entry was dropped
+    assert cache.lookup("Microsoft revenue 2023", None, MSFT, "msft-v1")[0] == "msft"
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = AnswerCache(str(tmp_path / "cache.sqlite"), ttl_seconds=-1)
+    cache.store("Apple revenue 2023", None, AAPL, "v1", "$383.3 billion", [])
+    assert cache.lookup("Apple revenue 2023", None, AAPL, "v1") is None
+
+
+def test_plain_miss_writes_nothing(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = AnswerCache(path)
+    cache.store("Apple revenue 2023", [1.0, 0.0], AAPL, "v1", "$383.3 billion", [])
+    before = sqlite3.connect(path).execute("SELECT key, last_access FROM answers").fetchall()
+    assert cache.lookup("Microsoft revenue 2023", [1.0, 0.0], MSFT, "v1") is None
+    assert cache.lookup("Apple profit 2023", [0.0, 1.0], AAPL, "v1") is None
+    assert sqlite3.connect(path).execute("SELECT key, last_access FROM answers").fetchall() == before
+    assert cache.lookup("Apple revenue 2023", None, AAPL, "v1")
+    after = sqlite3.connect(path).execute("SELECT key, last_access FROM answers").fetchall()
+    assert after[0][1] > before[0][1]  # a hit only restamps its own row
+
+
+def test_max_entries_evicts_least_recently_used(tmp_path):
+    cache = AnswerCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.store("q1", None, AAPL, "v1", "a1", [])
+    cache.store("q2", None, AAPL, "v1", "a2", [])
+    assert cache.lookup("q1", None, AAPL, "v1")
+    cache.store("q3", None, AAPL, "v1", "a3", [])
+    assert cache.lookup("q2", None, AAPL, "v1") is None
+    assert cache.lookup("q1", None, AAPL, "v1") and cache.lookup("q3", None, AAPL, "v1")
+
+
+def _store_many(path, worker, n):
+    cache = AnswerCache(path)
+    for i in range(n):
+        cache.store(f"question {worker} {i}", None, AAPL, "v1", f"answer {worker} {i}", [])
+
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    procs = [multiprocessing.Process(target=_store_many, args=(path, w, 20)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    cache = AnswerCache(path)
+    assert all(cache.lookup(f"question {w} {i}", None, AAPL, "v1") for w in range(4) for i in range(20))
@@ -0,0 +1,79 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from context_pruner import prune_nodes, prune_table, query_focus
+
+TABLE = "\n".join([
+    "CONSOLIDATED STATEMENTS OF OPERATIONS",
+    "| | 2023 | 2022 | 2021 |",
+    "|---|---|---|---|",
+    "| (In millions, except per-share amounts) | | | |",
+    "| Net sales: | | | |",
+    "| Products | 298,085 | 316,199 | 297,392 |",
+    "| Services | 85,200 | 78,129 | 68,425 |",
+    "| Total net sales | 383,285 | 394,328 | 365,817 |",
+    "| Operating expenses: | | | |",
+    "| Research and development | 29,915 | 26,251 | 21,914 |",
+    "| Selling, general and administrative | 24,932 | 25,094 | 21,973 |",
+    "| Total operating expenses | 54,847 | 51,345 | 43,887 |",
+    "| Net income | 96,995 | 99,803 | 94,680 |",
+])
+
+
+def table_node(text=TABLE, node_id="aapl-10k-2023-t3"):
+    metadata = {"type": "table", "filename": "AAPL_10-K_2023.htm", "section": "Item 8", "periods": "2023, 2022, 2021"}
+    return NodeWithScore(node=TextNode(id_=node_id, text=text, metadata=metadata), score=0.82)
+
+
+def lines(text):
+    # empty cells come back as "|  |"; compare with runs of spaces collapsed
+    return [" ".join(l.split()) for l in text.splitlines()]
+
+
+def test_synonyms_keep_the_asked_line_item_and_year():
+    pruned = lines(prune_table(TABLE, query_focus("What were Apple's revenues in 2022?")))
+    # "revenues" matches "Total net sales"
+    assert pruned[-1] == "| Total net sales | 394,328 |"
+    assert not any("Net income" in l or "Research" in l or "316,199" in l for l in pruned)
+
+
+def test_growth_question_keeps_the_prior_year_and_range_every_year():
+    pruned = lines(prune_table(TABLE, query_focus("How did R&D grow in 2023?")))
+    assert pruned[-2:] == ["| Operating expenses: | | |", "| Research and development | 29,915 | 26,251 |"]
+
+    pruned = lines(prune_table(TABLE, query_focus("Net earnings from 2021 to 2023")))
+    assert pruned[-1] == "| Net income | 96,995 | 99,803 | 94,680 |"
+
+
+def test_header_rows_survive():
+    pruned = lines(prune_table(TABLE, query_focus("net income in 2021")))
+    # title, period row, separator, unit row and the label-only rows split_table counts as header
+    assert pruned == ["CONSOLIDATED STATEMENTS OF OPERATIONS", "| | 2021 |", "|---|---|",
+                      "| (In millions, except per-share amounts) | |", "| Net sales: | |",
+                      "| Net income | 94,680 |"]
+
+
+def test_unmatched_axes_are_left_whole():
+    # no matching line item and no requested year: nothing to cut
+    assert prune_table(TABLE, query_focus("Summarize the iPhone business")) is None
+    # the year isn't a column: every column stays, only the row is cut
+    pruned = lines(prune_table(TABLE, query_focus("net income in 2019")))
+    assert pruned[1] == "| | 2023 | 2022 | 2021 |"
+    assert pruned[-1] == "| Net income | 96,995 | 99,803 | 94,680 |"
+
+
+def test_pruned_copies_keep_id_and_metadata():
+    narrative = NodeWithScore(node=TextNode(id_="aapl-10k-2023-n7", text="Net sales decreased 3% in 2023.",
+                                            metadata={"type": "narrative", "filename": "AAPL_10-K_2023.htm"}), score=0.7)
+    original = table_node()
+    out, stats = prune_nodes([original, narrative], "What was net income in 2023?")
+
+    assert out[1] is narrative
+    node = out[0].node
+    assert node is not original.node and out[0].score == 0.82
+    assert node.node_id == "aapl-10k-2023-t3"
+    assert node.metadata["filename"] == "AAPL_10-K_2023.htm" and node.metadata["section"] == "Item 8"
+    assert node.metadata["periods"] == "2023"
+    assert node.get_content().splitlines()[-1] == "| Net income | 96,995 |"
+    # the retrieved node itself is untouched
+    assert original.node.get_content() == TABLE and original.node.metadata["periods"] == "2023, 2022, 2021"
+    assert stats["pruned"] == 1 and stats["chars_out"] < stats["chars_in"]
@@ -0,0 +1,99 @@
+import sqlite3
+import time
+
+from filing_catalog import FilingCatalog
+from retention import RetentionManager
+
+# the filings/requests tables as the first release created them
+V1_SCHEMA = """
+CREATE TABLE filings (
+    accession_no     TEXT PRIMARY KEY,
+    cik              TEXT,
+    ticker           TEXT,
+    form_type        TEXT,
+    fiscal_period    TEXT,
+    period_of_report TEXT,
+    filed_at         TEXT,
+    path             TEXT,
+    content_hash     TEXT,
+    parse_version    INTEGER,
+    embed_status     TEXT NOT NULL DEFAULT 'pending',
+    node_ids         TEXT,
+    updated_at       REAL
+);
+CREATE TABLE requests (
+    cik           TEXT NOT NULL,
+    form_type     TEXT NOT NULL,
+    fiscal_period TEXT NOT NULL,
+    accession_no  TEXT NOT NULL,
+    PRIMARY KEY (cik, form_type, fiscal_period, accession_no)
+);
+"""
+
+
+def test_old_catalog_gets_added_columns(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript(V1_SCHEMA)
+    conn.execute("INSERT INTO filings (accession_no, cik, form_type, fiscal_period, parse_version, embed_status, node_ids) "
+                 "VALUES ('0000320193-23-000106', '320193', '10-K', '2023', 3, 'embedded', '[\"n1\", \"n2\"]')")
+    conn.execute("INSERT INTO requests VALUES ('320193', '10-K', '2023', '0000320193-23-000106')")
+    conn.commit()
+    conn.close()
+
+    catalog = FilingCatalog(path)
+    row = catalog.get("0000320193-23-000106")
+    assert row["node_ids"] == ["n1", "n2"]
+    assert row["access_count"] == 0 and row["last_access"] is None and row["shard"] is None
+
+    # the new columns and tables are usable on the migrated file
+    catalog.touch(["0000320193-23-000106"])
+    catalog.upsert("0000320193-23-000106", shard="0000320193")
+    assert catalog.queue_prefetch("320193", "AAPL", "10-K", "2022")
+    row = catalog.get("0000320193-23-000106")
+    assert row["access_count"] == 1 and row["shard"] == "0000320193"
+    assert [r["accession_no"] for r in catalog.embedded_for_request("320193", "10-K", "2023", 3)] == ["0000320193-23-000106"]
+
+    FilingCatalog(path)  # reopening an up-to-date catalog adds nothing twice
+
+
+def test_embedded_for_request_by_accession(tmp_path):
+    catalog = FilingCatalog(str(tmp_path / "catalog.sqlite"))
+    for accession in ("0000320193-23-000077", "0000320193-23-000064"):
+        catalog.upsert(accession, cik="0000320193", form_type="10-Q")
+        catalog.mark_embedded(accession, [f"{accession}-0"], 3)
+    # CIK and period spelling are normalized on both sides
+    catalog.link_request("0000320193", "10-q", "2023  q3", ["0000320193-23-000077", "0000320193-23-000064"])
+    catalog.link_request(320193, "10-Q", "2023 Q3", ["0000320193-23-000077"])  # re-linking doesn't duplicate
+
+    rows = catalog.embedded_for_request("320193", "10-Q", "2023 Q3", 3)
+    assert sorted(r["accession_no"] for r in rows) == ["0000320193-23-000064", "0000320193-23-000077"]
+    assert catalog.embedded_for_request("320193", "10-Q", "2023 Q2", 3) == []
+    # any linked filing embedded by an older parser, or evicted, means the request is redone
+    assert catalog.embedded_for_request("320193", "10-Q", "2023 Q3", 4) == []
+    catalog.mark_evicted("0000320193-23-000064")
+    assert catalog.embedded_for_request("320193", "10-Q", "2023 Q3", 3) == []
+    assert catalog.get("0000320193-23-000064")["node_ids"] == []
+
+
+def test_retention_rows_carry_the_access_order(tmp_path):
+    catalog = FilingCatalog(str(tmp_path / "catalog.sqlite"))
+    for accession, cik in (("aapl-1", "320193"), ("aapl-2", "320193"), ("msft-1", "789019"), ("nvda-1", "1045810")):
+        catalog.upsert(accession, cik=cik, embed_status="embedded", node_ids=[accession])
+    catalog.touch(["aapl-1", "aapl-1"])  # one request touching a filing twice counts once
+    time.sleep(0.01)
+    catalog.touch(["msft-1"])
+    catalog.touch(["msft-1"])
+    catalog.touch_ciks(["0000320193", "789019", "789019"])
+    catalog.touch_ciks(["789019"])
+
+    rows = {r["accession_no"]: r for r in catalog.retention_rows()}
+    assert rows["aapl-1"]["access_count"] == 1 and rows["msft-1"]["access_count"] == 2
+    assert rows["aapl-2"]["access_count"] == 0 and rows["aapl-2"]["last_access"] is None
+    assert rows["aapl-1"]["last_access"] < rows["msft-1"]["last_access"]
+    assert rows["aapl-2"]["cik_access_count"] == 1 and rows["msft-1"]["cik_access_count"] == 2
+    assert rows["nvda-1"]["cik_access_count"] == 0 and rows["nvda-1"]["cik_last_access"] is None
+
+    # LFU: filing count, then company count
+    lfu = RetentionManager(None, catalog, str(tmp_path), policy="lfu")
+    assert [r["accession_no"] for r in lfu.ranked(list(rows.values()))] == ["nvda-1", "aapl-2", "aapl-1", "msft-1"]
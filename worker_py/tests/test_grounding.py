@@ -0,0 +1,73 @@
+import random
+
+from grounding import check_grounding, extract_numbers, table_scale
+
+INCOME = """(in millions, except per share amounts)
+| | 2023 | 2022 |
+|---|---|---|
+| Net sales | $383,285 | $394,328 |
+| Cost of sales | 214,137 | 223,546 |
+| Net income | $96,995 | $99,803 |
+| Diluted earnings per share | $6.13 | $6.11 |"""
+
+
+def test_table_scale_from_caption():
+    assert table_scale(INCOME) == 1e6
+    assert table_scale(INCOME.replace("millions", "thousands")) == 1e3
+    assert table_scale("Net income was $99.8 billion, in millions of reasons.") == 1.0
+    assert table_scale("| | 2023 |\n|---|---|\n| Net sales | 383,285 |") == 1.0
+
+
+def test_figure_at_table_scale_is_grounded():
+    assert check_grounding("Net income was $99.8 billion in 2022.", [INCOME])["passing"]
+    assert check_grounding("Net income was $99,803 million in 2022.", [INCOME])["passing"]
+
+
+def test_wrong_magnitude_fails():
+    result = check_grounding("Net income was $99.8 million in 2022.", [INCOME])
+    assert not result["passing"]
+    assert result["unsupported"] == ["$99.8 million"]
+    assert not check_grounding("Net income was $99.8 trillion in 2022.", [INCOME])["passing"]
+
+
+def test_thousands_table_is_not_read_as_millions():
+    thousands = INCOME.replace("millions", "thousands")
+    assert check_grounding("Net income was $99.8 million in 2022.", [thousands])["passing"]
+    assert not check_grounding("Net income was $99.8 billion in 2022.", [thousands])["passing"]
+
+
+def test_per_share_figures_are_unscaled():
+    assert check_grounding("Diluted EPS was $6.11 in 2022.", [INCOME])["passing"]
+
+
+def test_narrative_figures_use_their_own_scale():
+    text = "Net sales were $394.3 billion in 2022."
+    assert check_grounding("Net sales reached $394.3 billion in 2022.", [text])["passing"]
+    assert not check_grounding("Net sales reached $394.3 million in 2022.", [text])["passing"]
+
+
+def test_derived_figures():
+    # difference of two cells on a row, and the percent change of a row the answer names
+    assert check_grounding("Net sales fell $11.0 billion in 2023.", [INCOME])["derived"] == 1
+    assert check_grounding("Net sales fell 2.8% in 2023.", [INCOME])["passing"]
+    assert check_grounding("Net income declined 2.8% to $97.0 billion in 2023.", [INCOME])["passing"]
+
+
+def test_random_percentages_rarely_pass():
+    rng = random.Random(0)
+    rows = "\n".join(f"| Line item {i} | {rng.randint(1000, 99999):,} | {rng.randint(1000, 99999):,} |"
+                     for i in range(200))
+    sources = [INCOME + "\n" + rows]
+    passed = sum(check_grounding(f"Gross margin was {rng.uniform(0, 100):.1f}% in 2023.", sources)["passing"]
+                 for _ in range(200))
+    assert passed <= 4
+
+
+def test_missing_period_fails():
+    result = check_grounding("Net income was $99.8 billion in 2021.", [INCOME])
+    assert result["missing_periods"] == ["2021"]
+    assert not result["passing"]
+
+
+def test_labels_and_years_are_not_figures():
+    assert extract_numbers("See Note 7 and Item 7A of the 10-K for fiscal 2022.") == []
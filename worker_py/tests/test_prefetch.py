@@ -0,0 +1,54 @@
+import datetime
+
+from constants import PARSE_VERSION
+from filing_catalog import FilingCatalog
+from prefetch import Prefetcher, neighbours
+
+TODAY = datetime.date(2024, 6, 1)
+
+
+def test_quarter_neighbours_wrap_to_10k():
+    assert neighbours("10-Q", "2023 Q2", TODAY) == [("10-Q", "2023 Q1"), ("10-Q", "2023 Q3")]
+    assert neighbours("10-Q", "2023 Q3", TODAY) == [("10-Q", "2023 Q2"), ("10-K", "2023")]
+    assert neighbours("10-Q", "2023 Q1", TODAY) == [("10-K", "2022"), ("10-Q", "2023 Q2")]
+    assert neighbours("10-Q", "2024 Q2", TODAY) == [("10-Q", "2024 Q1")]  # Q3 2024 hasn't started
+    assert neighbours("10-Q", "2023 Q4", TODAY) == []
+    assert neighbours("10-K", "2023", TODAY) == [("10-K", "2022"), ("10-K", "2024")]
+
+
+class FakeAgent:
+    """process_filings records the filing in the catalog, as ingestion would."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.ingested = []
+
+    def company_identifier(self, company):
+        return company.get("ticker")
+
+    def process_filings(self, companies):
+        for c in companies:
+            self.ingested.append(c["filing_date_range"])
+            embed(self.catalog, c["formType"], c["filing_date_range"])
+
+
+def embed(catalog, form, period):
+    accession = f"{form}-{period}"
+    catalog.mark_embedded(accession, ["n1"], PARSE_VERSION)
+    catalog.link_request("AAPL", form, period, [accession])
+
+
+def test_only_filings_the_prefetch_embedded_count_as_hits(tmp_path):
+    catalog = FilingCatalog(str(tmp_path / "catalog.sqlite"))
+    agent = FakeAgent(catalog)
+    prefetcher = Prefetcher(agent, catalog)
+    catalog.queue_prefetch("AAPL", "AAPL", "10-K", "2021")
+    catalog.queue_prefetch("AAPL", "AAPL", "10-K", "2022")
+    embed(catalog, "10-K", "2021")  # a user asked for it before the queue got there
+
+    summary = prefetcher.drain(budget=5)
+    assert agent.ingested == ["2022"]
+    assert (summary["done"], summary["present"], summary["failed"]) == (1, 1, 0)
+    assert not catalog.record_prefetch_hit("AAPL", "10-K", "2021")
+    assert catalog.record_prefetch_hit("AAPL", "10-K", "2022")
+    assert catalog.prefetch_stats()["hit_rate"] == 1.0
@@ -0,0 +1,85 @@
+from InitialQueryAgent import QueryCoordinatorAgent
+
+
+class FakeDownloader:
+    """Canned sec-api responses: search_by_period keyed by (form, start, end); every call is recorded."""
+
+    def __init__(self, by_period=None, legacy=None):
+        self.by_period = by_period or {}
+        self.legacy = legacy or []
+        self.calls = []
+
+    def search_by_period(self, identifier, form, start, end, *, size=10):
+        self.calls.append(("period", form, start, end, size))
+        return list(self.by_period.get((form, start, end), []))
+
+    def search_filings(self, identifier, form, start, end, size="1", sort_order="desc"):
+        self.calls.append(("filed", form, start, end, size))
+        return {"total": {"value": len(self.legacy)}, "filings": list(self.legacy)}
+
+
+def agent(downloader):
+    a = QueryCoordinatorAgent.__new__(QueryCoordinatorAgent)
+    a.htmDownloader = downloader
+    return a
+
+
+def hit(accession, period, filed):
+    return {"accessionNo": accession, "periodOfReport": period, "filedAt": filed,
+            "linkToFilingDetails": f"https://www.sec.gov/Archives/{accession}.htm"}
+
+
+def test_10k_calendar_year():
+    fy = hit("0000320193-23-000106", "2023-09-30", "2023-11-03T16:01:36-04:00")
+    sec = FakeDownloader({("10-K", "2023-01-01", "2023-12-31"): [fy]})
+    assert agent(sec).resolve_filings("320193", "10-k", 2023) == [fy]
+    assert len(sec.calls) == 1
+
+
+def test_10k_fiscal_year_ending_in_jan_of_next_year():
+    # a retailer's fiscal 2023 ends 2024-02-03: nothing has a 2023 period end
+    fy = hit("0000104169-24-000056", "2024-02-03", "2024-03-15T16:05:12-04:00")
+    sec = FakeDownloader({("10-K", "2024-01-01", "2024-02-28"): [fy]})
+    assert agent(sec).resolve_filings("104169", "10-K", 2023) == [fy]
+    assert [c[2:4] for c in sec.calls] == [("2023-01-01", "2023-12-31"), ("2024-01-01", "2024-02-28")]
+
+
+def test_late_filer_is_matched_by_period_not_filing_date():
+    late = hit("0001437749-24-019981", "2023-12-31", "2024-06-14T17:30:00-04:00")
+    sec = FakeDownloader({("10-K", "2023-01-01", "2023-12-31"): [late]})
+    assert agent(sec).resolve_filings("1409432", "10-K", 2023) == [late]
+
+    late_q = hit("0001437749-24-003318", "2023-09-30", "2024-02-09T16:00:00-05:00")
+    sec = FakeDownloader({("10-Q", "2023-07-01", "2023-09-30"): [late_q]})
+    assert agent(sec).resolve_filings("1409432", "10-Q", 2023, "Q3") == [late_q]
+    assert sec.calls == [("period", "10-Q", "2023-07-01", "2023-09-30", 1)]
+
+
+def test_10k_falls_back_to_the_filed_at_window():
+    legacy = hit("0000320193-23-000106", None, "2023-11-03T16:01:36-04:00")
+    sec = FakeDownloader(legacy=[legacy, {"accessionNo": "no-link"}])
+    assert agent(sec).resolve_filings("AAPL", "10-K", 2023) == [legacy]
+    assert sec.calls[-1] == ("filed", "10-K", "2023-02-01", "2024-02-28", "1")
+
+
+def test_no_matching_filing():
+    sec = FakeDownloader()
+    assert agent(sec).resolve_filings("AAPL", "10-K", 2030) == []
+    assert agent(sec).resolve_filings("AAPL", "10-Q", 2030, "Q2") == []
+
+
+def test_10q_keeps_only_the_requested_calendar_quarter():
+    ends_jul = hit("0000320193-23-000077", "2023-07-01", "2023-08-04T18:03:51-04:00")
+    ends_apr = hit("0000320193-23-000064", "2023-04-01", "2023-05-05T18:04:32-04:00")
+    # the period end decides the quarter: a hit ending 2023-07-01 is Q3, not Q2
+    sec = FakeDownloader({("10-Q", "2023-04-01", "2023-06-30"): [ends_jul]})
+    assert agent(sec).resolve_filings("AAPL", "10-Q", 2023, "Q2") == []
+    sec = FakeDownloader({("10-Q", "2023-04-01", "2023-06-30"): [ends_apr]})
+    assert agent(sec).resolve_filings("AAPL", "10-Q", 2023, "Q2") == [ends_apr]
+
+    # Q4 covers Oct..Dec; an unknown quarter falls back to the whole year
+    sec = FakeDownloader({("10-Q", "2023-01-01", "2023-12-31"): [ends_jul, ends_apr]})
+    assert agent(sec).resolve_filings("AAPL", "10-Q", 2023, "H1") == [ends_jul, ends_apr]
+    assert sec.calls == [("period", "10-Q", "2023-01-01", "2023-12-31", 4)]
+    agent(sec).resolve_filings("AAPL", "10-Q", 2023, "Q4")
+    assert sec.calls[-1][2:4] == ("2023-10-01", "2023-12-31")
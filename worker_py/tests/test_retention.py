@@ -0,0 +1,107 @@
+import os
+import time
+
+import pytest
+from llama_index.core import Settings
+from llama_index.core.schema import TextNode
+
+from fake_embedding import HashEmbedding
+from filing_catalog import FilingCatalog
+from retention import GRACE_SECONDS, RetentionManager
+from shard_store import ShardedStore
+
+
+@pytest.fixture(autouse=True)
+def offline_embeddings():
+    Settings.embed_model = HashEmbedding()
+
+
+@pytest.fixture
+def env(tmp_path):
+    download = tmp_path / "10k10q"
+    download.mkdir()
+    store = ShardedStore(str(tmp_path / "store"), embed_model=HashEmbedding(), min_age_seconds=0)
+    catalog = FilingCatalog(str(tmp_path / "store" / ".catalog.sqlite"))
+    return store, catalog, download
+
+
+def add_filing(store, catalog, download, name, cik, shard=None, nodes=2, size=100, commit=True):
+    path = download / f"{name}.htm"
+    path.write_text("x" * size)
+    ids = [f"{name}-{j}" for j in range(nodes)]
+    if commit:
+        store.commit(shard or cik, [TextNode(id_=i, text=f"{name} {i}", metadata={"filename": str(path)}) for i in ids])
+    catalog.upsert(name, cik=cik, shard=shard, path=str(path), parse_version=1, embed_status="embedded", node_ids=ids)
+    return str(path)
+
+
+def test_lru_and_lfu_order(env):
+    store, catalog, download = env
+    for name in ("a", "b", "c"):
+        add_filing(store, catalog, download, name, "320193", commit=False)
+    catalog.touch(["a"])
+    time.sleep(0.01)
+    catalog.touch(["b", "b", "b"])
+    catalog.touch(["b"])
+    rows = catalog.retention_rows()
+    lru = RetentionManager(store, catalog, str(download), policy="lru")
+    lfu = RetentionManager(store, catalog, str(download), policy="lfu")
+    assert [r["accession_no"] for r in lru.ranked(rows)][:2] == ["c", "a"]
+    assert [r["accession_no"] for r in lfu.ranked(rows)] == ["c", "a", "b"]
+
+
+def test_html_budget_evicts_unknown_old_files_then_coldest(env):
+    store, catalog, download = env
+    hot = add_filing(store, catalog, download, "hot", "320193", commit=False)
+    cold = add_filing(store, catalog, download, "cold", "320193", commit=False)
+    catalog.touch(["cold"])
+    time.sleep(0.01)
+    catalog.touch(["hot"])
+    stray = download / "stray.htm"
+    stray.write_text("x" * 100)
+    old = time.time() - 2 * GRACE_SECONDS
+    os.utime(stray, (old, old))
+    fresh = download / "downloading.htm"
+    fresh.write_text("x" * 100)
+
+    manager = RetentionManager(store, catalog, str(download), max_html_bytes=250)
+    report = manager.evict_html()
+    assert report == {"files": 2, "bytes": 200}
+    assert sorted(os.listdir(download)) == ["downloading.htm", "hot.htm"]
+    assert os.path.exists(hot) and not os.path.exists(cold)
+
+
+def test_node_budget_evicts_from_the_ingest_shard(env):
+    store, catalog, download = env
+    # sec-api reported a CIK, but the ticker couldn't be resolved at ingest, so the nodes sit in shard AAPL
+    add_filing(store, catalog, download, "old", "320193", shard="AAPL", nodes=3)
+    catalog.touch(["old"])
+    time.sleep(0.01)
+    newest = add_filing(store, catalog, download, "new", "320193", shard="AAPL", nodes=3)
+    catalog.touch(["new"])
+
+    manager = RetentionManager(store, catalog, str(download), max_nodes=3)
+    assert manager.evict_nodes(protect=[newest]) == {"filings": 1, "nodes": 3, "shards": 1}
+    _, _, index = store.get("AAPL")
+    assert sorted(index.docstore.docs) == ["new-0", "new-1", "new-2"]
+    assert catalog.get("old")["embed_status"] == "evicted"
+    assert catalog.get("new")["embed_status"] == "embedded"
+
+
+def test_row_whose_nodes_are_missing_is_not_marked(env):
+    store, catalog, download = env
+    add_filing(store, catalog, download, "ghost", "320193", shard="AAPL", nodes=3, commit=False)
+    manager = RetentionManager(store, catalog, str(download), max_nodes=0)
+    assert manager.evict_nodes()["filings"] == 0
+    assert catalog.get("ghost")["embed_status"] == "embedded"
+
+
+def test_enforce_skips_while_another_thread_runs(env):
+    store, catalog, download = env
+    add_filing(store, catalog, download, "a", "320193", nodes=3)
+    manager = RetentionManager(store, catalog, str(download), max_nodes=0)
+    with manager.lock:
+        assert manager.enforce() is None
+    assert catalog.get("a")["embed_status"] == "embedded"
+    assert manager.enforce()["nodes"]["filings"] == 1
+    assert catalog.get("a")["embed_status"] == "evicted"
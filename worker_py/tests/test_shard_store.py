@@ -0,0 +1,60 @@
+import pytest
+from llama_index.core import Settings
+from llama_index.core.schema import TextNode
+
+from fake_embedding import HashEmbedding
+from index_store import SnapshotStore
+from shard_store import LEGACY, ShardedStore
+
+
+@pytest.fixture(autouse=True)
+def offline_embeddings():
+    # loading a persisted index resolves Settings.embed_model
+    Settings.embed_model = HashEmbedding()
+
+
+def nodes(prefix, n=3):
+    return [TextNode(id_=f"{prefix}-{i}", text=f"{prefix} node {i}") for i in range(n)]
+
+
+def test_version_for_ignores_other_shards(tmp_path):
+    store = ShardedStore(str(tmp_path), embed_model=HashEmbedding(), min_age_seconds=0)
+    store.commit("320193", nodes("aapl"))
+    before = store.version_for(store.keys_for(["320193"]))
+    everything = store.current_version()
+    store.commit("789019", nodes("msft"))
+    assert store.version_for(store.keys_for(["320193"])) == before
+    assert store.current_version() != everything
+    store.commit("320193", nodes("aapl2"))
+    assert store.version_for(store.keys_for(["320193"])) != before
+
+
+def test_replaced_ids_leave_the_legacy_index(tmp_path):
+    legacy = SnapshotStore(str(tmp_path), embed_model=HashEmbedding(), min_age_seconds=0)
+    legacy.commit(nodes("old"))
+    store = ShardedStore(str(tmp_path), embed_model=HashEmbedding(), min_age_seconds=0)
+    assert LEGACY in store.keys_for(["320193"])
+
+    store.commit("320193", nodes("new"), replace_ids=["old-0", "old-1", "old-2"])
+    _, _, index = store.get(LEGACY)
+    assert not index.docstore.docs
+    _, _, index = store.get("320193")
+    assert sorted(index.docstore.docs) == ["new-0", "new-1", "new-2"]
+
+
+def test_shard_commit_keeps_flat_legacy_version(tmp_path):
+    from llama_index.core import StorageContext, VectorStoreIndex
+
+    # pre-snapshot layout: docstore.json etc. directly in the persist dir
+    index = VectorStoreIndex(nodes("flat"), storage_context=StorageContext.from_defaults(),
+                             embed_model=HashEmbedding())
+    index.set_index_id("10k10q")
+    index.storage_context.persist(persist_dir=str(tmp_path))
+    store = ShardedStore(str(tmp_path), embed_model=HashEmbedding(), min_age_seconds=0)
+    legacy = store.shard_version(LEGACY)
+    assert legacy.startswith("legacy-")
+
+    before = store.version_for(store.keys_for(["320193"]))
+    store.commit("789019", nodes("msft"))
+    assert store.shard_version(LEGACY) == legacy
+    assert store.version_for(store.keys_for(["320193"])) == before
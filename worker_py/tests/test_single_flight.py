@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+import types
+
+import pytest
+
+import single_flight
+from single_flight import FileSingleFlight, SingleFlight
+
+fcntl = pytest.importorskip("fcntl")
+
+KEY = ("AAPL", "10-K", "2023")
+
+
+class CountingEvent(threading.Event):
+    """Event that lets the test wait until `n` followers are blocked on the leader's call."""
+
+    def __init__(self):
+        super().__init__()
+        self.waiters = threading.Semaphore(0)
+
+    def wait(self, timeout=None):
+        self.waiters.release()
+        return super().wait(timeout)
+
+    def wait_for_waiters(self, n):
+        for _ in range(n):
+            assert self.waiters.acquire(timeout=5)
+
+
+def run_flight(do, n, fn, calls):
+    """Start a leader running `fn`, then `n` followers once it is in flight. Returns every caller's outcome."""
+    started, release = threading.Event(), threading.Event()
+    outcomes = []
+
+    def leader_fn():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def caller(f):
+        try:
+            outcomes.append(("ok", do(KEY, f)))
+        except Exception as e:
+            outcomes.append(("error", e))
+
+    threads = [threading.Thread(target=caller, args=(leader_fn,))]
+    threads[0].start()
+    assert started.wait(5)
+    done = calls[KEY].done = CountingEvent()
+    threads += [threading.Thread(target=caller, args=(fn,)) for _ in range(n)]
+    for t in threads[1:]:
+        t.start()
+    done.wait_for_waiters(n)
+    release.set()
+    for t in threads:
+        t.join(5)
+    return outcomes
+
+
+def test_concurrent_calls_run_once():
+    sf, runs = SingleFlight(), []
+
+    def fn():
+        runs.append(1)
+        return "result"
+
+    outcomes = run_flight(sf.do, 4, fn, sf._calls)
+    assert len(runs) == 1
+    assert sorted(shared for _, (_, shared) in outcomes) == [False] + [True] * 4
+    assert {result for _, (result, _) in outcomes} == {"result"}
+    assert sf._calls == {}
+    assert sf.do(KEY, fn) == ("result", False)  # the next call after the flight runs again
+    assert len(runs) == 2
+
+
+def test_exception_reaches_every_waiter():
+    sf, runs = SingleFlight(), []
+
+    def fn():
+        runs.append(1)
+        raise RuntimeError("EDGAR timed out")
+
+    outcomes = run_flight(sf.do, 3, fn, sf._calls)
+    assert len(runs) == 1
+    assert len(outcomes) == 4
+    assert all(kind == "error" and str(e) == "EDGAR timed out" for kind, e in outcomes)
+    assert sf._calls == {}
+
+
+def test_file_flight_coalesces_threads(tmp_path):
+    sf, runs = FileSingleFlight(str(tmp_path)), []
+
+    def fn():
+        runs.append(1)
+        return {"accessions": ["0000320193-23-000106"]}
+
+    outcomes = run_flight(sf.do, 3, fn, sf.local._calls)
+    assert len(runs) == 1
+    assert sorted(shared for _, (_, shared) in outcomes) == [False] + [True] * 3
+    _, done_path = sf._paths(KEY)
+    with open(done_path) as f:
+        assert json.load(f)["result"] == {"accessions": ["0000320193-23-000106"]}
+
+
+@pytest.mark.parametrize("age, reused", [(10, True), (700, False)])
+def test_waiter_reuses_done_result_within_window(tmp_path, monkeypatch, age, reused):
+    """A process that waited on the lock takes the holder's .done result unless it is older than 600 s."""
+    sf, runs = FileSingleFlight(str(tmp_path)), []
+    lock_path, done_path = sf._paths(KEY)
+    with open(done_path, "w") as f:
+        json.dump({"key": KEY, "result": "theirs", "finished_at": time.time() - age}, f)
+
+    # note when the worker blocks on the lock held below (i.e. another process is mid-flight)
+    blocked = threading.Event()
+
+    def flock(f, op):
+        if op == fcntl.LOCK_EX:
+            blocked.set()
+        return fcntl.flock(f, op)
+
+    monkeypatch.setattr(single_flight, "fcntl", types.SimpleNamespace(
+        flock=flock, LOCK_EX=fcntl.LOCK_EX, LOCK_NB=fcntl.LOCK_NB, LOCK_UN=fcntl.LOCK_UN))
+
+    def fn():
+        runs.append(1)
+        return "ours"
+
+    out = []
+    with open(lock_path, "a+") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        worker = threading.Thread(target=lambda: out.append(sf.do(KEY, fn)))
+        worker.start()
+        assert blocked.wait(5)
+        fcntl.flock(held, fcntl.LOCK_UN)
+    worker.join(5)
+
+    assert out == ([("theirs", True)] if reused else [("ours", False)])
+    assert len(runs) == (0 if reused else 1)
+    assert os.path.exists(done_path)
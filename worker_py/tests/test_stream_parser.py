@@ -0,0 +1,92 @@
+import codecs
+
+import pytest
+
+from fixtures import fixture_path
+from stream_parser import SNIFF_BYTES, parse_filing, sniff_encoding
+
+READ_SIZES = [7, 64, 1000, 256 * 1024]
+
+# multi-byte UTF-8, a stray Windows-1252 byte (\x92), character references and a colspan, all of
+# which a chunk boundary can cut in half
+FILING = (
+    "<html><body>"
+    "<p>FILED AS OF DATE: 20231103</p><p>CENTRAL INDEX KEY: 0000320193</p>"
+    "<table><tr><td>Table of contents</td></tr></table>"
+    "<div><p>Item 7. Management’s Discussion and Analysis</p></div>"
+    "<p>Net sales fell 3% &mdash; to $383.3 billion &amp; services grew.</p>"
+    "<p>Note 4 – Segment Information</p>"
+    "<table><tr><td colspan=\"2\">Years ended</td><td>2023</td></tr>"
+    "<tr><td>Greater China</td><td>€</td><td>72,559</td></tr></table>"
+    "<div>Item 8. Financial Statements</div><p>See the accompanying notes.</p>"
+    "</body></html>"
+).encode("utf-8").replace("Management’s".encode("utf-8"), b"Management\x92s")
+
+
+def parse(path, read_bytes):
+    tables = []
+    result = parse_filing(str(path), tables.append, read_bytes=read_bytes)
+    return result, tables
+
+
+@pytest.fixture
+def filing(tmp_path):
+    # pad past the sniffed prefix so every read boundary falls inside the filing itself
+    path = tmp_path / "filing.htm"
+    path.write_bytes(b"<!--" + b" " * SNIFF_BYTES + b"-->" + FILING)
+    return path
+
+
+def test_filing_parses_sections_tables_and_meta(filing):
+    result, tables = parse(filing, 256 * 1024)
+    assert result["encoding"] == "utf-8"
+    assert result["meta"]["cik"] == "0000320193" and result["meta"]["filing_date"] == "20231103"
+    assert result["sections"] == {
+        "Item 7. Management’s Discussion and Analysis": (
+            "Net sales fell 3% — to $383.3 billion & services grew.\nNote 4 – Segment Information"),
+        "Item 8. Financial Statements": "See the accompanying notes.",
+    }
+    assert result["dropped"] == 1 and result["tables"] == 1
+    assert tables == [{
+        "section": "Item 7. Management’s Discussion and Analysis",
+        "note_number": 4,
+        "cells": [[("Years ended", 2), ("2023", 1)], [("Greater China", 1), ("€", 1), ("72,559", 1)]],
+        "parsed": [["Years ended", "2023"], ["Greater China", "€", "72,559"]],
+    }]
+
+
+@pytest.mark.parametrize("read_bytes", READ_SIZES)
+def test_chunk_size_does_not_change_the_output(filing, read_bytes):
+    assert parse(filing, read_bytes) == parse(filing, len(FILING) * 2)
+
+
+@pytest.mark.parametrize("read_bytes", READ_SIZES)
+def test_fixture_chunk_size_invariance(read_bytes):
+    path = fixture_path("small")
+    expected, expected_tables = parse(path, 1 << 30)
+    result, tables = parse(path, read_bytes)
+    assert result["sections"] == expected["sections"]
+    assert tables == expected_tables
+    assert (result["tables"], result["dropped"], result["bytes"]) == (expected["tables"], expected["dropped"], expected["bytes"])
+    assert expected["tables"] > 0 and len(expected["sections"]) > 1
+
+
+@pytest.mark.parametrize("prefix, encoding", [
+    (codecs.BOM_UTF8 + b"<html>", "utf-8-sig"),
+    (codecs.BOM_UTF16_LE + "<html>".encode("utf-16-le"), "utf-16"),
+    (codecs.BOM_UTF16_BE + "<html>".encode("utf-16-be"), "utf-16"),
+    (b'<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1252">', "cp1252"),
+    (b"<?xml version='1.0' encoding='ISO-8859-1'?><html>", "iso8859-1"),
+    # an unknown declared charset falls through to detection; plain ASCII reads as UTF-8
+    (b"<meta charset=x-bogus><p>Net sales</p>", "utf-8"),
+    (b"<p>Net sales</p>", "utf-8"),
+    ("<p>Management’s discussion — café</p>".encode("utf-8") * 5, "utf-8"),
+])
+def test_sniff_encoding(prefix, encoding):
+    assert sniff_encoding(prefix) == encoding
+
+
+def test_sniff_encoding_detects_undeclared_latin1():
+    pytest.importorskip("chardet")
+    prefix = "<p>Société Générale, année fiscale, résumé déjà vu. </p>".encode("latin-1") * 20
+    assert sniff_encoding(prefix) in ("iso8859-1", "cp1252")
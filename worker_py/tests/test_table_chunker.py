@@ -0,0 +1,52 @@
+from llama_index.core import Document
+
+from table_chunker import TableNodeParser, split_table
+
+HEADER = [
+    "Consolidated Statements of Operations",
+    "| | Years Ended December 31, 2023 | 2022 |",
+    "|---|---|---|",
+    "| (in millions) | | |",
+]
+ROWS = [f"| Line item {i} | {1000 + i} | {900 + i} |" for i in range(10)]
+TABLE = "\n".join(HEADER + ROWS)
+
+
+def parser(**kwargs):
+    # whitespace tokens keep the budgets easy to reason about
+    return TableNodeParser(tokenizer=str.split, **kwargs)
+
+
+def test_split_table_takes_unit_row_into_header():
+    preamble, header, rows = split_table(TABLE)
+    assert preamble == HEADER[:1]
+    assert header == HEADER[1:]
+    assert rows == ROWS
+
+
+def test_every_chunk_repeats_the_header():
+    nodes = parser(chunk_size=60).get_nodes_from_documents([Document(text=TABLE)])
+    assert len(nodes) > 1
+    body = []
+    for node in nodes:
+        lines = node.get_content().splitlines()
+        assert lines[:len(HEADER)] == HEADER
+        body.extend(lines[len(HEADER):])
+    assert body == ROWS
+    assert nodes[0].metadata["table_rows"].endswith(f"of {len(ROWS)}")
+    assert nodes[-1].metadata["table_chunk"] == f"{len(nodes)}/{len(nodes)}"
+    assert nodes[0].metadata["periods"] == "2023, 2022"
+    assert nodes[0].metadata["period_label"] == "Years Ended"
+    assert "table_rows" not in nodes[0].get_content(metadata_mode="embed")
+
+
+def test_rows_pack_greedily_within_budget():
+    rows = ["a", "b c", "d", "e", "f g h i"]  # 2, 3, 2, 2, 5 tokens with the newline
+    # budget is chunk_size less the one-token head; an oversized row still gets a chunk of its own
+    assert parser(chunk_size=4).chunk_rows("head", rows) == [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+    assert parser(chunk_size=6).chunk_rows("head", rows) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_overlap_repeats_trailing_rows():
+    rows = ["a", "b", "c", "d", "e"]  # 2 tokens each, two rows per chunk
+    assert parser(chunk_size=5, chunk_overlap=2).chunk_rows("head", rows) == [(0, 2), (1, 3), (2, 4), (3, 5)]
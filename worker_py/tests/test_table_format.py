@@ -0,0 +1,43 @@
+from table_format import compact_table, to_compact_markdown
+
+# EDGAR layout: a colspan period heading, "$" and ")"/"%" in cells of their own, spacer columns
+INCOME = [
+    [("", 1), ("Years Ended December 31,", 6)],
+    [("", 1), ("2023", 3), ("2022", 3)],
+    ["(in millions)", "", "", "", "", "", ""],
+    ["Net sales", "$", "383,285", "", "$", "394,328", ""],
+    ["Other expense", "", "(565", ")", "", "(334", ")"],
+    ["Gross margin", "", "44.1", "%", "", "43.3", "%"],
+]
+
+
+def test_currency_and_sign_cells_merge_into_figures():
+    _, rows = compact_table(INCOME)
+    assert rows[1:] == [
+        ["Net sales", "$383,285", "$394,328"],
+        ["Other expense", "-565", "-334"],
+        ["Gross margin", "44.1%", "43.3%"],
+    ]
+
+
+def test_space_joined_negative_is_signed():
+    _, rows = compact_table([["Cash", "$ ( 1,234 )"]])
+    assert rows[-1] == ["Cash", "-$1,234"]
+
+
+def test_shared_heading_becomes_caption():
+    captions, rows = compact_table(INCOME)
+    assert captions == ["Years Ended December 31,"]
+    assert rows[0] == ["(in millions)", "2023", "2022"]
+
+
+def test_compact_markdown():
+    assert to_compact_markdown(INCOME) == (
+        "Years Ended December 31,\n"
+        "| (in millions) | 2023 | 2022 |\n"
+        "|---|---|---|\n"
+        "| Net sales | $383,285 | $394,328 |\n"
+        "| Other expense | -565 | -334 |\n"
+        "| Gross margin | 44.1% | 43.3% |\n"
+    )
+    assert to_compact_markdown([]) == "⚠️ Table is empty or malformed."
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
+from llama_index.core.vector_stores.simple import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from vector_codec import QuantizedVectorStore, VectorCodec, quantize, unit_rows
+
+DIMS = 64
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIMS)).astype(np.float32)
+
+
+def nodes(vecs):
+    return [TextNode(id_=f"n{i}", text=f"node {i}", embedding=v.tolist(), metadata={"cik": str(i % 3)})
+            for i, v in enumerate(vecs)]
+
+
+def exact_top(vecs, queries, k):
+    return np.argsort(-(unit_rows(queries) @ unit_rows(vecs).T), axis=1, kind="stable")[:, :k]
+
+
+def test_int8_codes_are_close():
+    unit = unit_rows(vectors(50))
+    codes, scales = quantize(unit, "int8")
+    assert codes.dtype == np.int8 and scales.shape == (50,)
+    assert np.abs(codes * scales[:, None] - unit).max() <= scales.max() / 2 + 1e-6
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_round_trip_keeps_codec_vectors_and_ranking(tmp_path, dtype):
+    vecs, queries = vectors(300), vectors(5, seed=1)
+    store = QuantizedVectorStore(codec=VectorCodec(dtype=dtype))
+    store.add(nodes(vecs))
+    store.delete_nodes(["n7"])
+    store.persist(str(tmp_path / "default__vector_store.json"))
+
+    loaded = QuantizedVectorStore.from_persist_dir(str(tmp_path))
+    assert loaded.codec == VectorCodec(dims=DIMS, dtype=dtype)
+    assert loaded.count == 299 and loaded.row_of("n7") is None
+    assert np.allclose(loaded.get("n3"), unit_rows(vecs[3:4])[0], atol=1e-6)  # full precision on disk
+
+    live = [i for i in range(300) if i != 7]
+    best, scores = loaded.search(queries, k=5)
+    expected = [[live[j] for j in row] for row in exact_top(vecs[live], queries, 5)]
+    assert [[int(loaded.node_id(r)[1:]) for r in row] for row in best] == expected
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_dims_are_cut_and_query_filters_apply():
+    vecs = vectors(30)
+    store = QuantizedVectorStore(codec=VectorCodec(dims=16, dtype="int8"))
+    store.add(nodes(vecs))
+    assert store.full_vectors([0]).shape == (1, 16)
+    result = store.query(VectorStoreQuery(query_embedding=vecs[4].tolist(), similarity_top_k=3,
+                                          filters=MetadataFilters(filters=[MetadataFilter(key="cik", value="1")])))
+    assert result.ids[0] == "n4"
+    assert all(int(i[1:]) % 3 == 1 for i in result.ids)
+
+
+def test_json_snapshot_converts_on_load(tmp_path):
+    vecs = vectors(10)
+    plain = SimpleVectorStore()
+    plain.add(nodes(vecs))
+    plain.persist(str(tmp_path / "default__vector_store.json"))
+    store = QuantizedVectorStore.from_persist_dir(str(tmp_path), codec=VectorCodec(dtype="float16"))
+    assert store.codec.dtype == "float16" and store.count == 10
+    best, _ = store.search(vecs[2:3], k=1)
+    assert store.node_id(best[0][0]) == "n2"
+
+
+def test_recode_cli_skips_shards_without_a_snapshot(tmp_path, monkeypatch, capsys):
+    import json
+    import os
+    import sys
+    from shard_store import ShardedStore
+    from vector_codec import main
+
+    shard = tmp_path / ShardedStore.SHARDS / "0000000320193"
+    os.makedirs(shard)
+    (shard / "CURRENT").write_text("")  # pointer written, no snapshot published yet
+    monkeypatch.setattr(sys, "argv", ["vector_codec", "--persist-dir", str(tmp_path), "--dtype", "int8"])
+    main()
+    out = capsys.readouterr().out
+    report = json.loads(out[out.index("\n{") + 1:])
+    assert report["shards"] == {"0000000320193": {"version": None}}
+    assert report["bytes_before"] == report["bytes_after"] == 0
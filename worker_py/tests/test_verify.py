@@ -0,0 +1,46 @@
+import asyncio
+
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from FinalQueryAgent import FinalQueryAgent
+from InitialQueryAgent import QueryCoordinatorAgent
+
+TABLE = """(in millions)
+| | 2023 | 2022 |
+|---|---|---|
+| Net sales | $383,285 | $394,328 |"""
+
+
+def response(text):
+    return Response(response=text, source_nodes=[NodeWithScore(node=TextNode(text=TABLE), score=1.0)])
+
+
+def agent(audit_rate=0.0):
+    return FinalQueryAgent(persist_dir="unused", strategy="unused", verifier="numeric", audit_rate=audit_rate)
+
+
+def test_concurrent_verdicts_stay_on_their_responses():
+    final = agent(audit_rate=1.0)
+    good, bad = response("Net sales were $383.3 billion in 2023."), response("Net sales were $383.3 million in 2023.")
+
+    async def both():
+        return await asyncio.gather(final.averify(good), final.averify(bad))
+
+    assert asyncio.run(both()) == [True, False]
+    assert good.metadata["grounding"]["passing"] and not bad.metadata["grounding"]["passing"]
+    assert bad.metadata["grounding"]["unsupported"] == ["$383.3 million"]
+    assert final.audit_sampled(good) and final.audit_sampled(bad)
+    assert not hasattr(final, "pending_audits")
+
+
+def test_coordinator_queues_only_sampled_answers():
+    coordinator = QueryCoordinatorAgent.__new__(QueryCoordinatorAgent)
+    coordinator.pending_audits = []
+    coordinator._final_query_agent = agent(audit_rate=0.0)
+    unsampled = response("Net sales were $383.3 billion in 2023.")
+    assert coordinator._final_query_agent.verify(unsampled)
+    coordinator.queue_audit(unsampled)
+    coordinator.queue_audit(None)
+    assert not coordinator.audits_pending()
+    assert coordinator.run_audits() == []